@@ -0,0 +1,161 @@
+"""
+Benchmark de backup e restauração
+
+Compara, em um banco gerado (100 mil clientes por padrão), o backup antigo
+em JSON (todos os clientes, templates, renovações e configurações montados
+em memória e gravados com json.dump; restauração linha a linha pelo ORM)
+com o serviço de backup atual: completo pela API de backup online do
+SQLite, incremental depois de um lote de alterações e restauração da
+cadeia completo + incremental.
+
+Uso: python benchmarks/backup_restauracao.py [--clientes 100000]
+     [--renovacoes 60000] [--logs 200000] [--memoria]
+
+--memoria mede também o pico de memória de cada etapa (tracemalloc), o que
+deixa todas as etapas mais lentas.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from comum import criar_app, criar_templates_padrao, popular_clientes, popular_renovacoes, popular_logs
+from sqlalchemy import func, update
+from src.models.user import db
+from src.models.cliente import Cliente
+from src.models.configuracao import Configuracao
+from src.models.log_mensagem import LogMensagem
+from src.models.renovacao import Renovacao
+from src.models.template_mensagem import TemplateMensagem
+from src.services import backup
+
+resultados = []
+
+
+def medir(etapa, funcao, memoria):
+    if memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    retorno = funcao()
+    duracao = time.perf_counter() - inicio
+    pico = None
+    if memoria:
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    resultados.append((etapa, duracao, pico))
+    return retorno
+
+
+def backup_json_antigo(caminho):
+    """Dump monolítico como o de data/backup_*.json"""
+    dados = {
+        'backup_info': {'data_criacao': datetime.now().isoformat(), 'versao_sistema': '1.0'},
+        'clientes': [cliente.to_dict() for cliente in Cliente.query.all()],
+        'templates': [template.to_dict() for template in TemplateMensagem.query.all()],
+        'renovacoes': [renovacao.to_dict() for renovacao in Renovacao.query.all()],
+        'configuracoes': [config.to_dict() for config in Configuracao.query.all()]
+    }
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        json.dump(dados, arquivo, ensure_ascii=False, indent=2)
+    db.session.expunge_all()
+
+
+def restaurar_json_antigo(caminho, app_destino):
+    """Reinsere clientes e renovações do dump, uma linha de cada vez pelo ORM"""
+    with open(caminho, encoding='utf-8') as arquivo:
+        dados = json.load(arquivo)
+
+    def data(valor):
+        return datetime.fromisoformat(valor).date() if valor else None
+
+    def horario(valor):
+        return datetime.strptime(valor, '%H:%M').time() if valor else None
+
+    with app_destino.app_context():
+        for item in dados['clientes']:
+            db.session.add(Cliente(
+                id=item['id'], nome_completo=item['nome_completo'], telefone=item['telefone'],
+                telefone_normalizado=item['telefone_normalizado'], tipo_produto=item['tipo_produto'],
+                plano_contratado=item['plano_contratado'], valor_plano=item['valor_plano'],
+                data_vencimento=data(item['data_vencimento']), horario_envio=horario(item['horario_envio']),
+                aviso_ativo=item['aviso_ativo'], dias_aviso_antecedencia=item['dias_aviso_antecedencia'],
+                comentarios=item['comentarios'], ativo=item['ativo']
+            ))
+        for item in dados['renovacoes']:
+            db.session.add(Renovacao(
+                id=item['id'], cliente_id=item['cliente_id'], data_renovacao=data(item['data_renovacao']),
+                data_vencimento_anterior=data(item['data_vencimento_anterior']),
+                data_vencimento_nova=data(item['data_vencimento_nova']),
+                dias_renovados=item['dias_renovados'], valor_pago=item['valor_pago']
+            ))
+        db.session.commit()
+        db.session.remove()
+
+
+def alterar_dados(clientes):
+    """Lote de alterações entre o completo e o incremental"""
+    agora = datetime.utcnow()
+    db.session.execute(
+        update(Cliente).where(Cliente.id % (clientes // 600 or 1) == 0)
+        .values(comentarios='Alterado depois do backup', data_atualizacao=agora)
+    )
+    db.session.execute(
+        update(LogMensagem).where(LogMensagem.status == 'pendente', LogMensagem.id % 500 == 0)
+        .values(status='enviada', data_envio=agora, data_atualizacao=agora)
+    )
+    popular_renovacoes(200, clientes, semente=99)
+    db.session.query(Renovacao).filter(Renovacao.id <= 50).delete()
+    db.session.commit()
+
+
+def contagens():
+    return {
+        modelo.__tablename__: db.session.query(func.count(modelo.id)).scalar()
+        for modelo in (Cliente, Renovacao, LogMensagem, TemplateMensagem, Configuracao)
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--clientes', type=int, default=100000)
+    parser.add_argument('--renovacoes', type=int, default=60000)
+    parser.add_argument('--logs', type=int, default=200000)
+    parser.add_argument('--memoria', action='store_true')
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix='bench-backup-')
+    app = criar_app(diretorio)
+    with app.app_context():
+        criar_templates_padrao()
+        popular_clientes(args.clientes)
+        popular_renovacoes(args.renovacoes, args.clientes)
+        popular_logs(args.logs, args.clientes)
+        # O incremental pega o que mudou a partir do instante do completo
+        time.sleep(0.01)
+
+        caminho_json = os.path.join(diretorio, 'backup_antigo.json')
+        medir('antigo: dump JSON', lambda: backup_json_antigo(caminho_json), args.memoria)
+        destino = criar_app(tempfile.mkdtemp(prefix='bench-backup-json-'))
+        medir('antigo: restauração linha a linha', lambda: restaurar_json_antigo(caminho_json, destino),
+              args.memoria)
+
+        completo = medir('completo', backup.completo, args.memoria)
+        alterar_dados(args.clientes)
+        incremental = medir('incremental', backup.incremental, args.memoria)
+        esperado = contagens()
+
+        medir('restauração do completo', lambda: backup.restaurar(completo['nome']), args.memoria)
+        medir('restauração completo + incremental', lambda: backup.restaurar(incremental['nome']),
+              args.memoria)
+        assert contagens() == esperado, 'restauração não reproduziu o banco'
+
+    print(f'{args.clientes} clientes, {args.renovacoes} renovações, {args.logs} logs')
+    for etapa, duracao, pico in resultados:
+        memoria = f'  pico {pico / 1024 / 1024:7.1f} MB' if pico is not None else ''
+        print(f'{etapa:40s} {duracao:7.2f} s{memoria}')
+    print(f"{'arquivo antigo (JSON, sem logs)':40s} {os.path.getsize(caminho_json) / 1024 / 1024:7.1f} MB")
+    print(f"{'arquivo completo':40s} {completo['tamanho'] / 1024 / 1024:7.1f} MB")
+    print(f"{'arquivo incremental':40s} {incremental['tamanho'] / 1024:7.1f} KB  {incremental['linhas']}")
@@ -0,0 +1,144 @@
+"""
+Apoio dos benchmarks: aplicação Flask sobre um banco SQLite descartável
+
+Os benchmarks não tocam em src/database/app.db; cada um cria o seu banco
+em um diretório temporário e o popula com dados gerados.
+"""
+import os
+import sys
+import random
+from datetime import date, datetime, time, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+from src.models.user import db
+from src.models.cliente import Cliente
+from src.models.renovacao import Renovacao
+from src.models.template_mensagem import TemplateMensagem
+from src.models import log_mensagem, versao_recurso, fila_envio, resumo_diario
+from src.database.migracoes import aplicar_migracoes
+from src.database import perfil_sqlite
+from src.services.escritor_lote import escritor_lote
+from src.services import telefone
+
+PRODUTOS = ['IPTV', 'VPN', 'OUTROS']
+
+
+def criar_app(diretorio, perfil='producao', blueprints=()):
+    """Aplicação com o banco em `diretorio`/app.db e o perfil SQLite informado"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(diretorio, 'app.db')}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['DIRETORIO_ARQUIVO_LOGS'] = os.path.join(diretorio, 'arquivo_logs')
+    app.config['DIRETORIO_BACKUPS'] = os.path.join(diretorio, 'backups')
+    app.config['SQLITE_PERFIL'] = perfil
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = perfil_sqlite.opcoes_engine(app)
+    for blueprint in blueprints:
+        app.register_blueprint(blueprint, url_prefix='/api')
+    db.init_app(app)
+    perfil_sqlite.configurar(app, db)
+    escritor_lote.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        aplicar_migracoes()
+    return app
+
+
+def criar_templates_padrao():
+    """Um template padrão de vencimento por produto"""
+    for produto in PRODUTOS:
+        db.session.add(TemplateMensagem(
+            nome=f'Vencimento {produto}',
+            tipo_produto=produto,
+            tipo_template='vencimento',
+            conteudo='Olá {nome}! Seu plano {plano} ({valor}) vence em {dias} dias. '
+                     'Vencimento: {data_vencimento}. Renove para manter o acesso.',
+            padrao=True,
+            ativo=True
+        ))
+    db.session.commit()
+
+
+def popular_clientes(quantidade, vencimento=None, semente=42, lote=5000):
+    """Insere `quantidade` clientes gerados; com `vencimento`, todos vencem nesse dia"""
+    gerador = random.Random(semente)
+    hoje = date.today()
+    agora = datetime.utcnow()
+
+    for inicio in range(0, quantidade, lote):
+        linhas = []
+        for indice in range(inicio, min(inicio + lote, quantidade)):
+            numero = f'119{indice:08d}'
+            linhas.append({
+                'nome_completo': f'Cliente {indice}',
+                'telefone': numero,
+                'telefone_normalizado': telefone.normalizar(numero),
+                'tipo_produto': gerador.choice(PRODUTOS),
+                'plano_contratado': gerador.choice(['Mensal', 'Trimestral', 'Semestral', 'Anual']),
+                'valor_plano': gerador.choice([25.0, 30.0, 35.0, 80.0, 150.0]),
+                'data_vencimento': vencimento or hoje + timedelta(days=gerador.randint(-60, 120)),
+                'horario_envio': time(gerador.randint(8, 20), 0),
+                'aviso_ativo': True,
+                'dias_aviso_antecedencia': 3,
+                'comentarios': gerador.choice([None, 'Cliente antigo', 'Pagamento via PIX']),
+                'ativo': gerador.random() > 0.1,
+                'data_criacao': agora,
+                'data_atualizacao': agora
+            })
+        db.session.execute(insert(Cliente), linhas)
+    db.session.commit()
+
+
+def popular_renovacoes(quantidade, clientes, semente=42, lote=5000):
+    """Insere `quantidade` renovações distribuídas entre os clientes 1..`clientes`"""
+    gerador = random.Random(semente)
+    hoje = date.today()
+
+    for inicio in range(0, quantidade, lote):
+        linhas = []
+        for _ in range(inicio, min(inicio + lote, quantidade)):
+            dias = gerador.choice([30, 60, 90, 180, 365])
+            data_renovacao = hoje - timedelta(days=gerador.randint(0, 720))
+            linhas.append({
+                'cliente_id': gerador.randint(1, clientes),
+                'data_renovacao': data_renovacao,
+                'data_vencimento_anterior': data_renovacao,
+                'data_vencimento_nova': data_renovacao + timedelta(days=dias),
+                'dias_renovados': dias,
+                'valor_pago': gerador.choice([25.0, 30.0, 80.0, 150.0]),
+                'data_criacao': datetime.combine(data_renovacao, time(12, 0))
+            })
+        db.session.execute(insert(Renovacao), linhas)
+    db.session.commit()
+
+
+def popular_logs(quantidade, clientes, dias=150, semente=42, lote=5000):
+    """Insere `quantidade` logs de mensagem dos últimos `dias` dias para os clientes 1..`clientes`"""
+    gerador = random.Random(semente)
+    agora = datetime.utcnow()
+
+    for inicio in range(0, quantidade, lote):
+        linhas = []
+        for _ in range(inicio, min(inicio + lote, quantidade)):
+            cliente_id = gerador.randint(1, clientes)
+            criacao = agora - timedelta(minutes=gerador.randint(0, dias * 24 * 60))
+            status = gerador.choice(['enviada', 'enviada', 'enviada', 'falha', 'pendente'])
+            linhas.append({
+                'cliente_id': cliente_id,
+                'telefone_destino': f'5511{cliente_id:09d}',
+                'mensagem': f'Olá Cliente {cliente_id}! Seu plano vence em {gerador.randint(0, 7)} dias. '
+                            'Renove para manter o acesso.',
+                'status': status,
+                'tipo_notificacao': gerador.choice(['automatica', 'vencimento', 'manual']),
+                'data_agendamento': criacao,
+                'data_envio': criacao if status == 'enviada' else None,
+                'erro_detalhes': 'HTTP 500: timeout' if status == 'falha' else None,
+                'tentativas': 1,
+                'data_criacao': criacao,
+                'data_atualizacao': criacao
+            })
+        db.session.execute(insert(log_mensagem.LogMensagem), linhas)
+    db.session.commit()
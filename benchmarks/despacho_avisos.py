@@ -0,0 +1,145 @@
+"""
+Benchmark do despacho de avisos: chamadas HTTP à própria API x serviço em processo
+
+Mede o custo por mensagem de gerar os avisos do dia para N clientes até o
+ponto de entrega à ponte do WhatsApp (a ponte não entra na medição):
+
+- antes: o laço antigo de processar_avisos_automaticos, com GET
+  /clientes/avisos-pendentes, um GET /templates/padrao/... por mensagem,
+  o cliente remontado a partir do JSON e um POST
+  /clientes/marcar-mensagem-enviada por mensagem, contra a aplicação
+  servida em uma porta local;
+- depois: WhatsAppService.processar_avisos_automaticos (aviso_service,
+  renderização em lote e fila de envio) e a conclusão dos itens da fila,
+  como fazem os trabalhadores depois de entregar à ponte.
+
+Uso: python benchmarks/despacho_avisos.py [--clientes 1000] [--rodadas 3]
+"""
+import argparse
+import logging
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import requests
+from werkzeug.serving import make_server
+
+from comum import criar_app, criar_templates_padrao, popular_clientes
+from src.models.user import db
+from src.models.cliente import Cliente
+from src.models.configuracao import Configuracao
+from src.models.fila_envio import FilaEnvio
+from src.models.log_mensagem import LogMensagem
+from src.models.template_mensagem import TemplateMensagem
+from src.routes.cliente import cliente_bp
+from src.routes.template_mensagem import template_mensagem_bp
+from src.services import fila_envio
+from src.services.escritor_lote import escritor_lote
+from src.services.whatsapp_service import whatsapp_service
+
+
+def despachar_por_http(base_url):
+    """Laço antigo, sem o envio à ponte; retorna as mensagens geradas"""
+    dados = requests.get(f'{base_url}/clientes/avisos-pendentes').json()
+
+    geradas = 0
+    for aviso in dados['clientes_para_aviso']:
+        cliente_data = aviso['cliente']
+        response = requests.get(
+            f"{base_url}/templates/padrao/{cliente_data['tipo_produto']}/vencimento"
+        )
+        if response.status_code != 200:
+            continue
+
+        class ClienteFicticio:
+            def __init__(self, data):
+                self.nome_completo = data['nome_completo']
+                self.plano_contratado = data['plano_contratado']
+                self.valor_plano = data['valor_plano']
+                self.data_vencimento = datetime.fromisoformat(data['data_vencimento']).date()
+
+        template = TemplateMensagem()
+        template.conteudo = response.json()['template']['conteudo']
+        cliente = ClienteFicticio(cliente_data)
+        dias = (cliente.data_vencimento - datetime.now().date()).days
+        if template.processar_template(cliente, dias):
+            requests.post(f"{base_url}/clientes/marcar-mensagem-enviada/{cliente_data['id']}")
+            geradas += 1
+    return geradas
+
+
+def despachar_em_processo():
+    """Caminho atual: avisos para a fila e itens concluídos em lotes"""
+    geradas = len(whatsapp_service.processar_avisos_automaticos())
+    while True:
+        itens = fila_envio.reivindicar_lote(100)
+        if not itens:
+            break
+        for item in itens:
+            fila_envio.concluir(item)
+        escritor_lote.descarregar()
+    return geradas
+
+
+def reiniciar_envios():
+    db.session.query(FilaEnvio).delete()
+    db.session.query(LogMensagem).delete()
+    db.session.query(Cliente).update({Cliente.ultima_mensagem_enviada: None})
+    db.session.commit()
+
+
+def medir(funcao, rodadas):
+    tempos = []
+    for _ in range(rodadas):
+        with app.app_context():
+            reiniciar_envios()
+        inicio = time.perf_counter()
+        geradas = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return geradas, statistics.median(tempos)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--clientes', type=int, default=1000)
+    parser.add_argument('--rodadas', type=int, default=3)
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix='bench-despacho-')
+    app = criar_app(diretorio, blueprints=[cliente_bp, template_mensagem_bp])
+    whatsapp_service.init_app(app)
+    with app.app_context():
+        criar_templates_padrao()
+        popular_clientes(args.clientes, vencimento=datetime.now().date())
+        # Janela sempre aberta, para o benchmark rodar a qualquer hora
+        Configuracao.set_configuracao('whatsapp_horario_inicio', '00:00')
+        Configuracao.set_configuracao('whatsapp_horario_fim', '23:59')
+        Configuracao.set_configuracao('whatsapp_dias_funcionamento', [
+            'segunda', 'terca', 'quarta', 'quinta', 'sexta', 'sabado', 'domingo'
+        ], tipo='json')
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    servidor = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{servidor.server_port}/api'
+
+    def em_processo():
+        with app.app_context():
+            return despachar_em_processo()
+
+    whatsapp_service.conectado = True
+    try:
+        antes, tempo_antes = medir(lambda: despachar_por_http(base_url), args.rodadas)
+        depois, tempo_depois = medir(em_processo, args.rodadas)
+    finally:
+        whatsapp_service.conectado = False
+        servidor.shutdown()
+
+    print(f'{args.clientes} clientes vencendo hoje, mediana de {args.rodadas} rodadas')
+    print(f'antes  (HTTP):      {antes:6d} mensagens  {tempo_antes:7.2f} s  '
+          f'{tempo_antes / max(antes, 1) * 1000:7.2f} ms/mensagem')
+    print(f'depois (processo):  {depois:6d} mensagens  {tempo_depois:7.2f} s  '
+          f'{tempo_depois / max(depois, 1) * 1000:7.2f} ms/mensagem')
+    print(f'speedup: {tempo_antes / max(tempo_depois, 1e-9):.1f}x')
@@ -0,0 +1,138 @@
+"""
+Benchmark dos perfis do engine SQLite sob leitura e escrita concorrentes
+
+Para cada perfil (padrao = configuração antiga do SQLite, producao e
+seguro), em um banco novo com N clientes:
+
+- commits pequenos em sequência, em uma thread;
+- escritores (PUT /clientes/<id>) e leitores (GET /clientes, percorrendo
+  as páginas de 50 pelo cursor) em paralelo por alguns segundos, contando operações por
+  segundo, latência p50/p99 e erros ("database is locked").
+
+Uso: python benchmarks/perfil_sqlite_concorrencia.py [--clientes 50000]
+     [--escritores 4] [--leitores 4] [--segundos 10]
+"""
+import argparse
+import random
+import tempfile
+import threading
+import time
+
+from comum import criar_app, popular_clientes
+from sqlalchemy import update
+from src.models.user import db
+from src.models.cliente import Cliente
+from src.routes.cliente import cliente_bp
+
+PERFIS = ['padrao', 'producao', 'seguro']
+
+
+def percentil(valores, percentil):
+    if not valores:
+        return 0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(percentil / 100 * (len(valores) - 1))))]
+
+
+def commits_sequenciais(app, clientes, segundos):
+    """Commits de uma linha por vez, por `segundos`; retorna commits/s"""
+    gerador = random.Random(1)
+    total = 0
+    with app.app_context():
+        fim = time.perf_counter() + segundos
+        inicio = time.perf_counter()
+        while time.perf_counter() < fim:
+            db.session.execute(
+                update(Cliente).where(Cliente.id == gerador.randint(1, clientes))
+                .values(valor_plano=gerador.choice([25.0, 30.0, 35.0]))
+            )
+            db.session.commit()
+            total += 1
+        duracao = time.perf_counter() - inicio
+        db.session.remove()
+    return total / duracao
+
+
+def carga_mista(app, clientes, escritores, leitores, segundos):
+    """Escritores e leitores em paralelo; retorna as métricas por tipo"""
+    metricas = {'escrita': [], 'leitura': []}
+    erros = {'escrita': 0, 'leitura': 0}
+    lock = threading.Lock()
+    parar = threading.Event()
+
+    def trabalhar(tipo, semente):
+        gerador = random.Random(semente)
+        cliente_http = app.test_client()
+        latencias = []
+        falhas = 0
+        proximo = ''
+        while not parar.is_set():
+            inicio = time.perf_counter()
+            if tipo == 'escrita':
+                response = cliente_http.put(
+                    f'/api/clientes/{gerador.randint(1, clientes)}',
+                    json={'valor_plano': gerador.choice([25.0, 30.0, 35.0])}
+                )
+            else:
+                response = cliente_http.get('/api/clientes', query_string={
+                    'per_page': 50, 'cursor': proximo
+                })
+            latencias.append(time.perf_counter() - inicio)
+            if response.status_code != 200:
+                falhas += 1
+            elif tipo == 'leitura':
+                proximo = response.get_json()['next_cursor'] or ''
+        with lock:
+            metricas[tipo].extend(latencias)
+            erros[tipo] += falhas
+
+    threads = [threading.Thread(target=trabalhar, args=('escrita', indice)) for indice in range(escritores)]
+    threads += [threading.Thread(target=trabalhar, args=('leitura', 100 + indice)) for indice in range(leitores)]
+    for thread in threads:
+        thread.start()
+    time.sleep(segundos)
+    parar.set()
+    for thread in threads:
+        thread.join()
+
+    return {
+        tipo: {
+            'ops_s': len(latencias) / segundos,
+            'p50_ms': percentil(latencias, 50) * 1000,
+            'p99_ms': percentil(latencias, 99) * 1000,
+            'erros': erros[tipo]
+        }
+        for tipo, latencias in metricas.items()
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--clientes', type=int, default=50000)
+    parser.add_argument('--escritores', type=int, default=4)
+    parser.add_argument('--leitores', type=int, default=4)
+    parser.add_argument('--segundos', type=float, default=10)
+    args = parser.parse_args()
+
+    linhas = []
+    for perfil in PERFIS:
+        app = criar_app(tempfile.mkdtemp(prefix=f'bench-perfil-{perfil}-'), perfil=perfil, blueprints=[cliente_bp])
+        with app.app_context():
+            popular_clientes(args.clientes)
+            db.session.remove()
+
+        commits = commits_sequenciais(app, args.clientes, min(args.segundos, 5))
+        mista = carga_mista(app, args.clientes, args.escritores, args.leitores, args.segundos)
+        linhas.append((perfil, commits, mista))
+        with app.app_context():
+            db.engine.dispose()
+
+    print(f'{args.clientes} clientes; carga mista: {args.escritores} escritores + '
+          f'{args.leitores} leitores por {args.segundos:.0f} s')
+    print(f"{'perfil':10s} {'commits/s':>10s} | {'escritas/s':>10s} {'p50':>7s} {'p99':>7s} {'erros':>5s} | "
+          f"{'leituras/s':>10s} {'p50':>7s} {'p99':>7s} {'erros':>5s}")
+    for perfil, commits, mista in linhas:
+        escrita, leitura = mista['escrita'], mista['leitura']
+        print(f"{perfil:10s} {commits:10.0f} | {escrita['ops_s']:10.1f} {escrita['p50_ms']:6.0f}ms "
+              f"{escrita['p99_ms']:6.0f}ms {escrita['erros']:5d} | {leitura['ops_s']:10.1f} "
+              f"{leitura['p50_ms']:6.0f}ms {leitura['p99_ms']:6.0f}ms {leitura['erros']:5d}")
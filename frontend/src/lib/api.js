@@ -49,6 +49,7 @@ export const clientesAPI = {
   atualizar: (id, dados) => api.put(`/clientes/${id}`, dados),
   deletar: (id) => api.delete(`/clientes/${id}`),
   renovar: (id, dados) => api.post(`/clientes/${id}/renovar`, dados),
+  dashboardGeral: () => api.get('/clientes/dashboard'),
   dashboard: (tipoProduto) => api.get(`/clientes/dashboard/${tipoProduto}`),
   avisosPendentes: () => api.get('/clientes/avisos-pendentes'),
   marcarMensagemEnviada: (id) => api.post(`/clientes/marcar-mensagem-enviada/${id}`),
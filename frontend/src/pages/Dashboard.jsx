@@ -44,20 +44,14 @@ const Dashboard = ({ isMobile = false }) => {
   const [tipoProdutoSelecionado, setTipoProdutoSelecionado] = useState('todos');
 
   // Queries para dados do dashboard
-  const { data: dashboardIPTV } = useQuery({
-    queryKey: ['dashboard', 'IPTV'],
-    queryFn: () => clientesAPI.dashboard('IPTV'),
+  const { data: dashboardGeral } = useQuery({
+    queryKey: ['dashboard'],
+    queryFn: () => clientesAPI.dashboardGeral(),
   });
 
-  const { data: dashboardVPN } = useQuery({
-    queryKey: ['dashboard', 'VPN'],
-    queryFn: () => clientesAPI.dashboard('VPN'),
-  });
-
-  const { data: dashboardOUTROS } = useQuery({
-    queryKey: ['dashboard', 'OUTROS'],
-    queryFn: () => clientesAPI.dashboard('OUTROS'),
-  });
+  const dashboardIPTV = dashboardGeral?.data?.produtos?.IPTV;
+  const dashboardVPN = dashboardGeral?.data?.produtos?.VPN;
+  const dashboardOUTROS = dashboardGeral?.data?.produtos?.OUTROS;
 
   // Dados mockados para demonstração
   const dadosReceita = [
@@ -0,0 +1,284 @@
+"""
+Migrações versionadas do banco SQLite
+
+db.create_all() só cria tabelas novas; alterações em tabelas existentes
+(índices, colunas, backfills) ficam aqui, numeradas e registradas em
+schema_migracoes. As migrações pendentes são aplicadas na inicialização da
+aplicação ou pelo comando `flask migrar`. O comando `flask verificar-indices`
+roda EXPLAIN QUERY PLAN nas consultas mais frequentes e aponta varreduras
+completas de tabela.
+"""
+from datetime import date, datetime, timedelta
+import click
+from sqlalchemy import func, literal, select, tuple_
+from src.models.user import db
+
+
+def _m001_indices_consultas_frequentes(conexao):
+    comandos = [
+        'CREATE INDEX IF NOT EXISTS ix_clientes_ativo_produto_vencimento '
+        'ON clientes (ativo, tipo_produto, data_vencimento)',
+        'CREATE INDEX IF NOT EXISTS ix_clientes_ativo_vencimento ON clientes (ativo, data_vencimento)',
+        'CREATE INDEX IF NOT EXISTS ix_clientes_dias_aviso ON clientes (dias_aviso_antecedencia)',
+        'CREATE INDEX IF NOT EXISTS ix_renovacoes_cliente_data ON renovacoes (cliente_id, data_renovacao)',
+        'CREATE INDEX IF NOT EXISTS ix_renovacoes_data ON renovacoes (data_renovacao)',
+        'CREATE INDEX IF NOT EXISTS ix_logs_mensagem_cliente_criacao ON logs_mensagem (cliente_id, data_criacao)',
+        'CREATE INDEX IF NOT EXISTS ix_logs_mensagem_status_tipo ON logs_mensagem (status, tipo_notificacao)',
+        'CREATE INDEX IF NOT EXISTS ix_logs_mensagem_criacao ON logs_mensagem (data_criacao)',
+        'CREATE INDEX IF NOT EXISTS ix_fila_envio_nao_antes_de ON fila_envio (nao_antes_de)',
+        'CREATE INDEX IF NOT EXISTS ix_fila_envio_cliente ON fila_envio (cliente_id)',
+        'CREATE INDEX IF NOT EXISTS ix_fila_envio_trabalhador ON fila_envio (trabalhador)',
+    ]
+    for comando in comandos:
+        conexao.exec_driver_sql(comando)
+    conexao.exec_driver_sql('ANALYZE')
+
+
+def _m002_resumos_diarios(conexao):
+    # As tabelas são criadas pelo create_all; aqui só o preenchimento inicial
+    from src.services import resumo_diario
+    resumo_diario.reconstruir(conexao)
+
+
+def _m003_indice_vencimento_clientes(conexao):
+    # Ordem da listagem de clientes: (data_vencimento, id), sem filtro de ativo
+    conexao.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_clientes_vencimento ON clientes (data_vencimento)')
+    conexao.exec_driver_sql('ANALYZE clientes')
+
+
+def _m004_data_atualizacao_renovacoes_logs(conexao):
+    # Base do backup incremental: alterações em renovações e logs (status)
+    # passam a ser datadas. Em bancos novos o create_all já criou a coluna.
+    for tabela, indice in (('renovacoes', 'ix_renovacoes_atualizacao'),
+                           ('logs_mensagem', 'ix_logs_mensagem_atualizacao')):
+        colunas = {linha[1] for linha in conexao.exec_driver_sql(f'PRAGMA table_info({tabela})')}
+        if 'data_atualizacao' not in colunas:
+            conexao.exec_driver_sql(f'ALTER TABLE {tabela} ADD COLUMN data_atualizacao DATETIME')
+        conexao.exec_driver_sql(
+            f'UPDATE {tabela} SET data_atualizacao = data_criacao WHERE data_atualizacao IS NULL'
+        )
+        conexao.exec_driver_sql(f'CREATE INDEX IF NOT EXISTS {indice} ON {tabela} (data_atualizacao)')
+
+
+def _m005_busca_textual(conexao):
+    # Tabelas FTS5 e triggers de clientes e logs_mensagem, já preenchidas
+    from src.services import busca
+    busca.criar(conexao)
+    busca.reconstruir(conexao)
+
+
+def _m006_telefone_normalizado(conexao):
+    # Em bancos novos o create_all já criou a coluna; o preenchimento usa a
+    # mesma normalização das gravações (services.telefone)
+    from src.services import telefone
+    colunas = {linha[1] for linha in conexao.exec_driver_sql('PRAGMA table_info(clientes)')}
+    if 'telefone_normalizado' not in colunas:
+        conexao.exec_driver_sql('ALTER TABLE clientes ADD COLUMN telefone_normalizado VARCHAR(20)')
+    linhas = conexao.exec_driver_sql(
+        'SELECT id, telefone FROM clientes WHERE telefone_normalizado IS NULL'
+    ).fetchall()
+    for inicio in range(0, len(linhas), 5000):
+        conexao.exec_driver_sql(
+            'UPDATE clientes SET telefone_normalizado = ? WHERE id = ?',
+            [(telefone.normalizar(numero), cliente_id) for cliente_id, numero in linhas[inicio:inicio + 5000]]
+        )
+    conexao.exec_driver_sql(
+        'CREATE INDEX IF NOT EXISTS ix_clientes_telefone_normalizado ON clientes (telefone_normalizado)'
+    )
+    conexao.exec_driver_sql('ANALYZE clientes')
+
+
+def _m007_telefone_normalizado_canonico(conexao):
+    # A normalização antiga acrescentava 5511 a qualquer número de 10 dígitos
+    # e 55 a números com '+' de outros países; recalcular todos com a forma
+    # canônica (inutilizáveis ficam NULL)
+    from src.services import telefone
+    linhas = conexao.exec_driver_sql('SELECT id, telefone FROM clientes').fetchall()
+    for inicio in range(0, len(linhas), 5000):
+        conexao.exec_driver_sql(
+            'UPDATE clientes SET telefone_normalizado = ? WHERE id = ?',
+            [(telefone.normalizar(numero), cliente_id) for cliente_id, numero in linhas[inicio:inicio + 5000]]
+        )
+    # Mensagens já na fila seguem para o número recalculado
+    conexao.exec_driver_sql(
+        'UPDATE fila_envio SET telefone_destino = ('
+        '  SELECT telefone_normalizado FROM clientes WHERE clientes.id = fila_envio.cliente_id'
+        ') WHERE EXISTS ('
+        '  SELECT 1 FROM clientes WHERE clientes.id = fila_envio.cliente_id'
+        '  AND telefone_normalizado IS NOT NULL'
+        ')'
+    )
+
+
+# (versão, descrição, função); novas migrações entram sempre no fim da lista
+MIGRACOES = [
+    (1, 'Índices das consultas frequentes', _m001_indices_consultas_frequentes),
+    (2, 'Preenchimento dos resumos diários de renovações e mensagens', _m002_resumos_diarios),
+    (3, 'Índice de vencimento para a listagem de clientes', _m003_indice_vencimento_clientes),
+    (4, 'Coluna data_atualizacao em renovacoes e logs_mensagem', _m004_data_atualizacao_renovacoes_logs),
+    (5, 'Busca textual (FTS5) em clientes e logs_mensagem', _m005_busca_textual),
+    (6, 'Telefone normalizado e indexado em clientes', _m006_telefone_normalizado),
+    (7, 'Telefone normalizado recalculado na forma canônica', _m007_telefone_normalizado_canonico),
+]
+
+
+def _garantir_tabela(conexao):
+    conexao.exec_driver_sql(
+        'CREATE TABLE IF NOT EXISTS schema_migracoes ('
+        'versao INTEGER PRIMARY KEY, '
+        'descricao VARCHAR(255) NOT NULL, '
+        'data_aplicacao DATETIME NOT NULL)'
+    )
+
+
+def versoes_aplicadas():
+    with db.engine.begin() as conexao:
+        _garantir_tabela(conexao)
+        return {linha[0] for linha in conexao.exec_driver_sql('SELECT versao FROM schema_migracoes')}
+
+
+def aplicar_migracoes():
+    """Aplica as migrações pendentes, cada uma na sua própria transação"""
+    aplicadas = versoes_aplicadas()
+    novas = []
+
+    for versao, descricao, migracao in MIGRACOES:
+        if versao in aplicadas:
+            continue
+        with db.engine.begin() as conexao:
+            migracao(conexao)
+            conexao.exec_driver_sql(
+                'INSERT INTO schema_migracoes (versao, descricao, data_aplicacao) VALUES (?, ?, ?)',
+                (versao, descricao, datetime.utcnow().isoformat(' '))
+            )
+        novas.append((versao, descricao))
+        print(f"Migração {versao} aplicada: {descricao}")
+
+    return novas
+
+
+def _consultas_frequentes():
+    """Consultas representativas do dashboard, das listagens e dos avisos"""
+    from src.models.cliente import Cliente
+    from src.models.renovacao import Renovacao
+    from src.models.log_mensagem import LogMensagem
+
+    hoje = date.today()
+    inicio_mes = hoje.replace(day=1)
+
+    return {
+        'dashboard: clientes vencidos': select(func.count(Cliente.id)).where(
+            Cliente.ativo == True, Cliente.data_vencimento < hoje),
+        'dashboard: clientes vencendo': select(func.count(Cliente.id)).where(
+            Cliente.ativo == True, Cliente.data_vencimento.between(hoje, hoje + timedelta(days=7))),
+        'dashboard: renovações do mês': select(func.count(Renovacao.id)).join(Cliente).where(
+            Renovacao.data_renovacao >= inicio_mes),
+        'listagem de clientes por produto': select(Cliente).where(
+            Cliente.ativo == True, Cliente.tipo_produto == 'IPTV',
+            Cliente.data_vencimento <= hoje + timedelta(days=30)
+        ).order_by(Cliente.data_vencimento.asc()),
+        'listagem de clientes por cursor': select(Cliente.id, Cliente.nome_completo).where(
+            tuple_(Cliente.data_vencimento, Cliente.id) > tuple_(literal(hoje), literal(1))
+        ).order_by(Cliente.data_vencimento.asc(), Cliente.id.asc()).limit(100),
+        'cliente por telefone': select(Cliente.id).where(Cliente.telefone_normalizado == '5511987654321'),
+        'histórico de renovações do cliente': select(Renovacao).where(
+            Renovacao.cliente_id == 1).order_by(Renovacao.data_renovacao.desc()),
+        'listagem de logs': select(LogMensagem).order_by(LogMensagem.data_criacao.desc()).limit(50),
+        'logs do cliente': select(LogMensagem).where(
+            LogMensagem.cliente_id == 1).order_by(LogMensagem.data_criacao.desc()).limit(50),
+        'logs por status e tipo': select(func.count(LogMensagem.id)).where(
+            LogMensagem.status == 'falha', LogMensagem.tipo_notificacao == 'automatica'),
+        'avisos pendentes': Cliente.consulta_avisos_pendentes(hoje).statement,
+    }
+
+
+def verificar_planos():
+    """Retorna [(nome, linhas do plano, tabelas varridas sem índice)]"""
+    resultado = []
+    with db.engine.connect() as conexao:
+        for nome, consulta in _consultas_frequentes().items():
+            sql = str(consulta.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+            plano = [linha[3] for linha in conexao.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql)]
+            varreduras = [
+                detalhe for detalhe in plano
+                if detalhe.startswith('SCAN ') and ' USING ' not in detalhe
+            ]
+            resultado.append((nome, plano, varreduras))
+    return resultado
+
+
+def registrar_comandos(app):
+    @app.cli.command('migrar')
+    def migrar():
+        """Aplica as migrações pendentes do banco"""
+        novas = aplicar_migracoes()
+        click.echo(f'{len(novas)} migração(ões) aplicada(s)')
+
+    @app.cli.command('reconstruir-resumos')
+    def reconstruir_resumos():
+        """Refaz os resumos diários a partir de renovacoes e logs_mensagem"""
+        from src.services import resumo_diario
+        resumo_diario.reconstruir()
+        click.echo('Resumos diários reconstruídos')
+
+    @app.cli.command('reconstruir-busca')
+    def reconstruir_busca():
+        """Refaz os índices de busca textual de clientes e logs_mensagem"""
+        from src.services import busca
+        busca.reconstruir()
+        db.session.commit()
+        click.echo('Índices de busca reconstruídos')
+
+    @app.cli.command('arquivar-logs')
+    @click.option('--dias', type=int, default=None, help='Idade mínima dos logs arquivados (padrão: logs_retencao_dias)')
+    def arquivar_logs(dias):
+        """Move os logs antigos para os arquivos mensais compactados"""
+        from src.services import arquivo_logs
+        movidos = arquivo_logs.arquivar(dias)
+        for mes, quantidade in sorted(movidos.items()):
+            click.echo(f'{mes}: {quantidade} log(s)')
+        click.echo(f'{sum(movidos.values())} log(s) arquivado(s)')
+
+    @app.cli.command('backup')
+    @click.option('--incremental', is_flag=True, help='Só as alterações desde o último backup')
+    def gerar_backup(incremental):
+        """Gera um backup completo (API de backup do SQLite) ou incremental"""
+        from src.services import backup
+        try:
+            entrada = backup.incremental() if incremental else backup.completo()
+        except backup.ErroBackup as e:
+            raise click.ClickException(str(e))
+        click.echo(f"{entrada['nome']} ({entrada['tamanho']} bytes, sha256 {entrada['sha256']})")
+
+    @app.cli.command('restaurar-backup')
+    @click.argument('nome')
+    def restaurar_backup(nome):
+        """Restaura o banco até o backup NOME"""
+        from src.services import backup
+        try:
+            aplicados = backup.restaurar(nome)
+        except backup.ErroBackup as e:
+            raise click.ClickException(str(e))
+        for aplicado in aplicados:
+            click.echo(f'Aplicado: {aplicado}')
+
+    @app.cli.command('perfil-sqlite')
+    def mostrar_perfil_sqlite():
+        """Mostra o perfil SQLite configurado e os PRAGMAs efetivos de uma conexão"""
+        from src.database import perfil_sqlite
+        click.echo(f"Perfil: {app.config.get('SQLITE_PERFIL', 'producao')}")
+        with db.engine.connect() as conexao:
+            for pragma, valor in perfil_sqlite.estado(conexao).items():
+                click.echo(f'  {pragma} = {valor}')
+
+    @app.cli.command('verificar-indices')
+    def verificar_indices():
+        """Confere com EXPLAIN QUERY PLAN se as consultas frequentes usam índice"""
+        falhas = 0
+        for nome, plano, varreduras in verificar_planos():
+            click.echo(f"{'ERRO' if varreduras else 'OK  '} {nome}")
+            for detalhe in plano:
+                click.echo(f'       {detalhe}')
+            falhas += bool(varreduras)
+        if falhas:
+            raise click.ClickException(f'{falhas} consulta(s) varrendo a tabela inteira')
@@ -0,0 +1,93 @@
+"""
+Perfil do engine SQLite (PRAGMAs e pool de conexões)
+
+O banco é compartilhado pelas threads das requisições, pelo agendador, pelo
+escritor em lote e pelos trabalhadores da fila. Com o modo de journal
+padrão (rollback), uma escrita bloqueia todas as leituras e cada commit
+faz fsync do journal e do banco. O perfil 'producao' liga o WAL (leitores
+não esperam o escritor), synchronous=NORMAL (fsync só nos checkpoints; o
+WAL continua íntegro em caso de queda do processo), cache e mmap maiores,
+tabelas temporárias em memória e um busy_timeout para esperar o lock de
+escrita em vez de falhar com "database is locked".
+
+Os PRAGMAs são aplicados por um evento 'connect' em cada conexão nova do
+pool. O perfil é escolhido em app.config['SQLITE_PERFIL'] e cada PRAGMA
+pode ser sobrescrito em app.config['SQLITE_PRAGMAS'].
+"""
+from sqlalchemy import event
+
+# Ordem importa: journal_mode antes dos demais
+PERFIS = {
+    'producao': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 15000,       # ms
+        'cache_size': -65536,        # negativo = KiB (64 MiB por conexão)
+        'mmap_size': 268435456,      # 256 MiB
+        'temp_store': 'MEMORY',
+    },
+    # Mesmo perfil, com fsync a cada commit
+    'seguro': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'busy_timeout': 15000,
+        'cache_size': -65536,
+        'temp_store': 'MEMORY',
+    },
+    # Configuração padrão do SQLite, como antes do perfil
+    'padrao': {},
+}
+
+# Pool para servidor com threads: conexões suficientes para as requisições
+# e as threads de fundo sem criar uma conexão nova a cada pico
+OPCOES_POOL = {
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_timeout': 30,
+}
+
+
+def pragmas(app):
+    """PRAGMAs do perfil configurado, com as sobrescritas de SQLITE_PRAGMAS"""
+    nome = app.config.get('SQLITE_PERFIL', 'producao')
+    if nome not in PERFIS:
+        raise ValueError(f"Perfil SQLite desconhecido: {nome} (use {', '.join(PERFIS)})")
+    return dict(PERFIS[nome], **app.config.get('SQLITE_PRAGMAS', {}))
+
+
+def opcoes_engine(app):
+    """SQLALCHEMY_ENGINE_OPTIONS com o pool do perfil; chamar antes de db.init_app"""
+    opcoes = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    if app.config.get('SQLITE_PERFIL', 'producao') != 'padrao':
+        for opcao, valor in OPCOES_POOL.items():
+            opcoes.setdefault(opcao, valor)
+    return opcoes
+
+
+def aplicar(engine, comandos):
+    """Registra a aplicação dos PRAGMAs em cada conexão nova do engine"""
+    if not comandos:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def configurar_conexao(conexao_driver, registro):
+        cursor = conexao_driver.cursor()
+        try:
+            for pragma, valor in comandos.items():
+                cursor.execute(f'PRAGMA {pragma} = {valor}')
+        finally:
+            cursor.close()
+
+
+def configurar(app, db):
+    """Aplica o perfil ao engine da aplicação; chamar logo após db.init_app"""
+    with app.app_context():
+        aplicar(db.engine, pragmas(app))
+
+
+def estado(conexao):
+    """Valores efetivos dos PRAGMAs do perfil em uma conexão (para diagnóstico)"""
+    return {
+        pragma: conexao.exec_driver_sql(f'PRAGMA {pragma}').scalar()
+        for pragma in PERFIS['producao']
+    }
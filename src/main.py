@@ -13,6 +13,12 @@ from src.routes.configuracao import configuracao_bp
 from src.routes.log_mensagem import log_mensagem_bp
 from src.routes.renovacao import renovacao_bp
 from src.routes.whatsapp import whatsapp_bp
+from src.routes.backup import backup_bp
+from src.services.whatsapp_service import whatsapp_service
+from src.services.agendador_envio import agendador_envio
+from src.services.escritor_lote import escritor_lote
+from src.database.migracoes import aplicar_migracoes, registrar_comandos
+from src.database import perfil_sqlite
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
@@ -28,11 +34,22 @@ app.register_blueprint(configuracao_bp, url_prefix='/api')
 app.register_blueprint(log_mensagem_bp, url_prefix='/api')
 app.register_blueprint(renovacao_bp, url_prefix='/api')
 app.register_blueprint(whatsapp_bp, url_prefix='/api')
+app.register_blueprint(backup_bp, url_prefix='/api')
 
 # Configuração do banco de dados
 app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+app.config['DIRETORIO_ARQUIVO_LOGS'] = os.path.join(os.path.dirname(__file__), 'database', 'arquivo_logs')
+app.config['DIRETORIO_BACKUPS'] = os.path.join(os.path.dirname(__file__), 'database', 'backups')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Perfil do SQLite: 'producao' (WAL, synchronous=NORMAL...), 'seguro' ou 'padrao'
+app.config['SQLITE_PERFIL'] = os.environ.get('SQLITE_PERFIL', 'producao')
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = perfil_sqlite.opcoes_engine(app)
 db.init_app(app)
+perfil_sqlite.configurar(app, db)
+whatsapp_service.init_app(app)
+agendador_envio.init_app(app)
+escritor_lote.init_app(app)
+registrar_comandos(app)
 
 # Importar todos os modelos para garantir que sejam criados
 from src.models.cliente import Cliente
@@ -40,9 +57,13 @@ from src.models.renovacao import Renovacao
 from src.models.log_mensagem import LogMensagem
 from src.models.template_mensagem import TemplateMensagem
 from src.models.configuracao import Configuracao
+from src.models.versao_recurso import VersaoRecurso
+from src.models.fila_envio import FilaEnvio
+from src.models.resumo_diario import ResumoRenovacaoDiario, ResumoMensagemDiario
 
 with app.app_context():
     db.create_all()
+    aplicar_migracoes()
     
     # Inicializar configurações padrão se não existirem
     if Configuracao.query.count() == 0:
@@ -51,15 +72,27 @@ with app.app_context():
             # Criar configurações padrão programaticamente
             configuracoes_padrao = [
                 ('whatsapp_ativo', False, 'boolean', 'whatsapp', 'Ativar/desativar integração com WhatsApp'),
-                ('whatsapp_intervalo_mensagens', 5, 'integer', 'whatsapp', 'Intervalo em segundos entre mensagens'),
+                ('whatsapp_intervalo_mensagens', 5, 'integer', 'whatsapp', 'Intervalo inicial em segundos entre mensagens (o mesmo ritmo de whatsapp_taxa_mensagens_minuto; vale o alterado por último)'),
                 ('whatsapp_horario_inicio', '08:00', 'string', 'whatsapp', 'Horário de início para envio de mensagens'),
                 ('whatsapp_horario_fim', '22:00', 'string', 'whatsapp', 'Horário de fim para envio de mensagens'),
+                ('whatsapp_taxa_mensagens_minuto', 12, 'integer', 'whatsapp', 'Taxa inicial de envio em mensagens por minuto (o mesmo ritmo de whatsapp_intervalo_mensagens; vale o alterado por último)'),
+                ('whatsapp_rajada', 3, 'integer', 'whatsapp', 'Mensagens que podem sair em rajada antes do limitador segurar o envio'),
+                ('whatsapp_taxa_minima', 2, 'integer', 'whatsapp', 'Taxa mínima de envio (mensagens por minuto) após reduções'),
+                ('whatsapp_taxa_maxima', 30, 'integer', 'whatsapp', 'Taxa máxima de envio (mensagens por minuto) permitida pelo ajuste automático'),
+                ('whatsapp_latencia_alvo_ms', 3000, 'integer', 'whatsapp', 'Latência da ponte acima da qual a taxa de envio é reduzida'),
+                ('whatsapp_trabalhadores_envio', 1, 'integer', 'whatsapp', 'Quantidade de trabalhadores que esvaziam a fila de envio'),
+                ('whatsapp_sessoes', 1, 'integer', 'whatsapp', 'Sessões (números de WhatsApp) no pool de envio, cada uma com sua ponte, porta e limite de taxa'),
+                ('whatsapp_tamanho_lote', 10, 'integer', 'whatsapp', 'Mensagens reivindicadas por lote da fila de envio'),
+                ('whatsapp_lease_segundos', 300, 'integer', 'whatsapp', 'Duração do lease de um lote reivindicado'),
+                ('whatsapp_max_tentativas', 3, 'integer', 'whatsapp', 'Tentativas de envio antes de marcar a mensagem como falha'),
+                ('whatsapp_tempo_drenagem', 60, 'integer', 'whatsapp', 'Tempo máximo em segundos para esvaziar a fila ao parar o serviço'),
                 ('ia_ativa', False, 'boolean', 'ia', 'Ativar/desativar integração com IA'),
                 ('ia_provedor', 'openrouter', 'string', 'ia', 'Provedor de IA (openrouter, openai, etc.)'),
                 ('ia_api_key', '', 'string', 'ia', 'Chave da API do provedor de IA'),
                 ('ia_modelo', 'meta-llama/llama-3.1-8b-instruct:free', 'string', 'ia', 'Modelo de IA a ser usado'),
                 ('ia_tom_voz', 'profissional', 'string', 'ia', 'Tom de voz da IA'),
                 ('sistema_nome_empresa', 'Minha Empresa', 'string', 'sistema', 'Nome da empresa'),
+                ('logs_retencao_dias', 180, 'integer', 'sistema', 'Dias que os logs de mensagem ficam na tabela antes de ir para o arquivo mensal'),
             ]
             
             for chave, valor, tipo, categoria, descricao in configuracoes_padrao:
@@ -72,6 +105,7 @@ with app.app_context():
                 config.set_valor_tipado(valor)
                 db.session.add(config)
             
+            Configuracao.invalidar_cache()
             db.session.commit()
             print("Configurações padrão inicializadas com sucesso!")
         except Exception as e:
@@ -4,10 +4,18 @@ from src.models.user import db
 
 class Cliente(db.Model):
     __tablename__ = 'clientes'
+    __table_args__ = (
+        db.Index('ix_clientes_ativo_produto_vencimento', 'ativo', 'tipo_produto', 'data_vencimento'),
+        db.Index('ix_clientes_ativo_vencimento', 'ativo', 'data_vencimento'),
+        db.Index('ix_clientes_dias_aviso', 'dias_aviso_antecedencia'),
+        db.Index('ix_clientes_vencimento', 'data_vencimento'),
+        db.Index('ix_clientes_telefone_normalizado', 'telefone_normalizado'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nome_completo = db.Column(db.String(200), nullable=False)
     telefone = db.Column(db.String(20), nullable=False)
+    telefone_normalizado = db.Column(db.String(20))  # Só dígitos, com país (services.telefone)
     tipo_produto = db.Column(db.String(10), nullable=False)  # 'IPTV', 'VPN' ou 'OUTROS'
     plano_contratado = db.Column(db.String(100), nullable=False)
     valor_plano = db.Column(db.Float, nullable=False)
@@ -35,6 +43,7 @@ class Cliente(db.Model):
     template_mensagem = db.relationship('TemplateMensagem', backref='clientes', lazy=True)
     renovacoes = db.relationship('Renovacao', backref='cliente', lazy=True, cascade='all, delete-orphan')
     logs_mensagem = db.relationship('LogMensagem', backref='cliente', lazy=True, cascade='all, delete-orphan')
+    fila_envio = db.relationship('FilaEnvio', backref='cliente', lazy=True, cascade='all, delete-orphan')
 
     def __repr__(self):
         return f'<Cliente {self.nome_completo}>'
@@ -44,6 +53,7 @@ class Cliente(db.Model):
             'id': self.id,
             'nome_completo': self.nome_completo,
             'telefone': self.telefone,
+            'telefone_normalizado': self.telefone_normalizado,
             'tipo_produto': self.tipo_produto,
             'plano_contratado': self.plano_contratado,
             'valor_plano': self.valor_plano,
@@ -62,6 +72,42 @@ class Cliente(db.Model):
             'data_atualizacao': self.data_atualizacao.isoformat() if self.data_atualizacao else None
         }
 
+    # Campos de to_dict(), na mesma ordem; usados pelas listagens que leem
+    # só algumas colunas, sem montar o objeto
+    CAMPOS = (
+        'id', 'nome_completo', 'telefone', 'telefone_normalizado', 'tipo_produto',
+        'plano_contratado', 'valor_plano', 'data_vencimento', 'horario_envio', 'template_mensagem_id', 'mensagem_personalizada',
+        'aviso_ativo', 'dias_aviso_antecedencia', 'horario_aviso', 'comentarios',
+        'data_ultimo_comentario', 'ativo', 'ultima_mensagem_enviada', 'data_criacao',
+        'data_atualizacao'
+    )
+
+    @staticmethod
+    def serializador(campos, colunas):
+        """Função que converte uma linha com `colunas` no dicionário de `campos`.
+        
+        Os valores saem formatados como em to_dict(); o formato de cada campo
+        é resolvido uma vez, pelo tipo da coluna, e não a cada linha.
+        """
+        posicoes = []
+        for campo in campos:
+            tipo = getattr(Cliente, campo).type
+            if isinstance(tipo, db.Time):
+                formatar = lambda valor: valor.strftime('%H:%M')
+            elif isinstance(tipo, (db.Date, db.DateTime)):
+                formatar = lambda valor: valor.isoformat()
+            else:
+                formatar = None
+            posicoes.append((campo, colunas.index(campo), formatar))
+        
+        def serializar(linha):
+            dados = {}
+            for campo, posicao, formatar in posicoes:
+                valor = linha[posicao]
+                dados[campo] = formatar(valor) if formatar and valor is not None else valor
+            return dados
+        return serializar
+
     def dias_para_vencimento(self):
         """Calcula quantos dias faltam para o vencimento"""
         from datetime import date
@@ -111,6 +157,72 @@ class Cliente(db.Model):
         limite = datetime.utcnow() - timedelta(hours=2)
         return self.ultima_mensagem_enviada <= limite
 
+    @staticmethod
+    def buscar_avisos_pendentes(hoje=None, cliente_ids=None):
+        """Retorna (cliente, tipo_aviso) dos clientes que precisam de aviso hoje.
+
+        Aplica em uma única consulta as mesmas regras de
+        precisa_aviso_antecedencia, vence_hoje, foi_renovado_recentemente e
+        pode_enviar_mensagem. `cliente_ids` restringe a busca a esses clientes.
+        """
+        return Cliente.consulta_avisos_pendentes(hoje, cliente_ids).all()
+
+    @staticmethod
+    def consulta_avisos_pendentes(hoje=None, cliente_ids=None):
+        """Monta a consulta usada por buscar_avisos_pendentes"""
+        from datetime import date, timedelta
+        from sqlalchemy import and_, or_, case, exists, func
+        from src.models.renovacao import Renovacao
+
+        if hoje is None:
+            hoje = date.today()
+
+        # Faixa de vencimentos que pode gerar aviso hoje: de hoje até
+        # hoje + maior antecedência configurada. Mantém a consulta no
+        # índice (ativo, data_vencimento) em vez de varrer a tabela.
+        menor_antecedencia = db.session.query(func.min(Cliente.dias_aviso_antecedencia)).scalar() or 0
+        maior_antecedencia = db.session.query(func.max(Cliente.dias_aviso_antecedencia)).scalar() or 0
+        vencimento_minimo = hoje + timedelta(days=min(0, menor_antecedencia))
+        vencimento_maximo = hoje + timedelta(days=max(0, maior_antecedencia))
+
+        dias_para_vencimento = func.julianday(Cliente.data_vencimento) - func.julianday(hoje)
+
+        precisa_aviso = and_(
+            Cliente.aviso_ativo == True,
+            dias_para_vencimento == Cliente.dias_aviso_antecedencia
+        )
+        vence_hoje = Cliente.data_vencimento == hoje
+
+        # Renovado nas últimas 24 horas
+        renovado_recentemente = exists().where(
+            and_(
+                Renovacao.cliente_id == Cliente.id,
+                Renovacao.data_renovacao >= hoje - timedelta(days=1)
+            )
+        )
+
+        # Não enviar se já enviou nas últimas 2 horas
+        limite_spam = datetime.utcnow() - timedelta(hours=2)
+        pode_enviar = or_(
+            Cliente.ultima_mensagem_enviada.is_(None),
+            Cliente.ultima_mensagem_enviada <= limite_spam
+        )
+
+        tipo_aviso = case((precisa_aviso, 'antecedencia'), else_='vencimento')
+
+        query = db.session.query(Cliente, tipo_aviso).filter(
+            Cliente.ativo == True,
+            Cliente.data_vencimento.between(vencimento_minimo, vencimento_maximo),
+            or_(precisa_aviso, vence_hoje),
+            ~renovado_recentemente,
+            pode_enviar
+        )
+
+        if cliente_ids is not None:
+            query = query.filter(Cliente.id.in_(cliente_ids))
+
+        return query.order_by(Cliente.id.asc())
+
     def atualizar_comentario(self, novo_comentario):
         """Atualiza o comentário do cliente"""
         from datetime import datetime
@@ -1,6 +1,20 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import copy
+import threading
+import time
 from src.models.user import db
+from src.models.versao_recurso import VersaoRecurso
+
+# Cache das configurações já convertidas, compartilhado pelas threads do
+# processo. Alterações de outros processos são detectadas pela versão em
+# versoes_recursos, consultada no máximo a cada INTERVALO_VERIFICACAO
+# segundos. A versão é comparada junto com a sua data_atualizacao e o cache
+# pertence a um engine: o contador recomeça em cada banco novo.
+RECURSO_CACHE = 'configuracoes'
+INTERVALO_VERIFICACAO = 2.0
+_cache = {'engine': None, 'versao': None, 'valores': {}, 'atualizacoes': {}, 'verificado_em': 0.0}
+_cache_lock = threading.Lock()
 
 class Configuracao(db.Model):
     __tablename__ = 'configuracoes'
@@ -31,24 +45,29 @@ class Configuracao(db.Model):
 
     def get_valor_tipado(self):
         """Retorna o valor convertido para o tipo apropriado"""
-        if self.valor is None:
+        return Configuracao.converter_valor(self.valor, self.tipo)
+
+    @staticmethod
+    def converter_valor(valor, tipo):
+        """Converte o valor armazenado como texto para o tipo informado"""
+        if valor is None:
             return None
             
-        if self.tipo == 'integer':
+        if tipo == 'integer':
             try:
-                return int(self.valor)
+                return int(valor)
             except (ValueError, TypeError):
                 return 0
-        elif self.tipo == 'boolean':
-            return self.valor.lower() in ('true', '1', 'yes', 'on') if isinstance(self.valor, str) else bool(self.valor)
-        elif self.tipo == 'json':
+        elif tipo == 'boolean':
+            return valor.lower() in ('true', '1', 'yes', 'on') if isinstance(valor, str) else bool(valor)
+        elif tipo == 'json':
             import json
             try:
-                return json.loads(self.valor)
+                return json.loads(valor)
             except (json.JSONDecodeError, TypeError):
                 return {}
         else:
-            return self.valor
+            return valor
 
     def set_valor_tipado(self, valor):
         """Define o valor convertendo para string se necessário"""
@@ -61,10 +80,15 @@ class Configuracao(db.Model):
     @staticmethod
     def get_configuracao(chave, valor_padrao=None):
         """Método utilitário para buscar uma configuração"""
-        config = Configuracao.query.filter_by(chave=chave).first()
-        if config:
-            return config.get_valor_tipado()
-        return valor_padrao
+        valores = Configuracao.valores_em_cache()
+        if chave not in valores:
+            return valor_padrao
+        
+        valor = valores[chave]
+        # Listas e dicionários são compartilhados pelo cache
+        if isinstance(valor, (list, dict)):
+            return copy.deepcopy(valor)
+        return valor
 
     @staticmethod
     def set_configuracao(chave, valor, descricao=None, tipo='string', categoria='sistema'):
@@ -78,6 +102,62 @@ class Configuracao(db.Model):
         
         config.set_valor_tipado(valor)
         config.data_atualizacao = datetime.utcnow()
+        Configuracao.invalidar_cache()
         db.session.commit()
         return config
 
+    @staticmethod
+    def valores_em_cache():
+        """Todas as configurações já convertidas, recarregadas só quando a versão muda"""
+        return Configuracao._cache_atual()['valores']
+
+    @staticmethod
+    def atualizacao_em_cache(chave):
+        """data_atualizacao da configuração, lida do mesmo cache dos valores"""
+        return Configuracao._cache_atual()['atualizacoes'].get(chave)
+
+    @staticmethod
+    def _cache_atual():
+        global _cache
+        cache = _cache
+        engine = db.engine
+        agora = time.monotonic()
+        if cache['engine'] is engine and agora - cache['verificado_em'] < INTERVALO_VERIFICACAO:
+            return cache
+        
+        versao = db.session.query(VersaoRecurso.versao, VersaoRecurso.data_atualizacao).filter_by(
+            recurso=RECURSO_CACHE
+        ).first()
+        versao = tuple(versao) if versao else (0, None)
+        if cache['engine'] is engine and versao == cache['versao']:
+            valores, atualizacoes = cache['valores'], cache['atualizacoes']
+        else:
+            linhas = db.session.query(
+                Configuracao.chave, Configuracao.valor, Configuracao.tipo, Configuracao.data_atualizacao
+            ).all()
+            valores = {chave: Configuracao.converter_valor(valor, tipo) for chave, valor, tipo, _ in linhas}
+            atualizacoes = {chave: data_atualizacao for chave, _, _, data_atualizacao in linhas}
+        
+        cache = {'engine': engine, 'versao': versao, 'valores': valores,
+                 'atualizacoes': atualizacoes, 'verificado_em': agora}
+        with _cache_lock:
+            _cache = cache
+        return cache
+
+    @staticmethod
+    def invalidar_cache():
+        """Incrementa a versão das configurações na transação corrente.
+        
+        Deve ser chamado antes do commit de qualquer alteração; neste processo
+        a primeira leitura depois do commit já confere a versão, nos demais em
+        até INTERVALO_VERIFICACAO segundos.
+        """
+        VersaoRecurso.incrementar(RECURSO_CACHE)
+        VersaoRecurso.apos_commit(_expirar_cache)
+
+
+def _expirar_cache():
+    """Obriga a próxima leitura a conferir a versão"""
+    global _cache
+    with _cache_lock:
+        _cache = dict(_cache, verificado_em=0.0)
@@ -0,0 +1,46 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from src.models.user import db
+
+class FilaEnvio(db.Model):
+    """Mensagem aguardando envio pelo WhatsApp (outbox persistente)"""
+    __tablename__ = 'fila_envio'
+    __table_args__ = (
+        db.Index('ix_fila_envio_nao_antes_de', 'nao_antes_de'),
+        db.Index('ix_fila_envio_cliente', 'cliente_id'),
+        db.Index('ix_fila_envio_trabalhador', 'trabalhador'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id'), nullable=False)
+    log_mensagem_id = db.Column(db.Integer, db.ForeignKey('logs_mensagem.id'))
+    telefone_destino = db.Column(db.String(20), nullable=False)
+    mensagem = db.Column(db.Text, nullable=False)
+    tipo_notificacao = db.Column(db.String(50))
+    prioridade = db.Column(db.Integer, default=0)  # Maior valor sai primeiro
+    nao_antes_de = db.Column(db.DateTime, default=datetime.utcnow)  # Não enviar antes deste instante
+    tentativas = db.Column(db.Integer, default=0)
+    bloqueado_ate = db.Column(db.DateTime)  # Fim do lease do trabalhador que reivindicou
+    trabalhador = db.Column(db.String(100))  # Identificador do lease atual
+    ultimo_erro = db.Column(db.Text)
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<FilaEnvio Cliente:{self.cliente_id} - tentativas {self.tentativas}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'cliente_id': self.cliente_id,
+            'log_mensagem_id': self.log_mensagem_id,
+            'telefone_destino': self.telefone_destino,
+            'mensagem': self.mensagem,
+            'tipo_notificacao': self.tipo_notificacao,
+            'prioridade': self.prioridade,
+            'nao_antes_de': self.nao_antes_de.isoformat() if self.nao_antes_de else None,
+            'tentativas': self.tentativas,
+            'bloqueado_ate': self.bloqueado_ate.isoformat() if self.bloqueado_ate else None,
+            'trabalhador': self.trabalhador,
+            'ultimo_erro': self.ultimo_erro,
+            'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None
+        }
@@ -4,6 +4,12 @@ from src.models.user import db
 
 class LogMensagem(db.Model):
     __tablename__ = 'logs_mensagem'
+    __table_args__ = (
+        db.Index('ix_logs_mensagem_cliente_criacao', 'cliente_id', 'data_criacao'),
+        db.Index('ix_logs_mensagem_status_tipo', 'status', 'tipo_notificacao'),
+        db.Index('ix_logs_mensagem_criacao', 'data_criacao'),
+        db.Index('ix_logs_mensagem_atualizacao', 'data_atualizacao'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id'), nullable=False)
@@ -16,6 +22,7 @@ class LogMensagem(db.Model):
     erro_detalhes = db.Column(db.Text)
     tentativas = db.Column(db.Integer, default=0)
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+    data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
         return f'<LogMensagem Cliente:{self.cliente_id} - {self.status}>'
@@ -4,6 +4,11 @@ from src.models.user import db
 
 class Renovacao(db.Model):
     __tablename__ = 'renovacoes'
+    __table_args__ = (
+        db.Index('ix_renovacoes_cliente_data', 'cliente_id', 'data_renovacao'),
+        db.Index('ix_renovacoes_data', 'data_renovacao'),
+        db.Index('ix_renovacoes_atualizacao', 'data_atualizacao'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id'), nullable=False)
@@ -14,6 +19,7 @@ class Renovacao(db.Model):
     valor_pago = db.Column(db.Float, nullable=False)
     observacoes = db.Column(db.Text)
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+    data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
         return f'<Renovacao Cliente:{self.cliente_id} - {self.dias_renovados} dias>'
@@ -0,0 +1,46 @@
+from src.models.user import db
+
+class ResumoRenovacaoDiario(db.Model):
+    """Renovações agregadas por dia, produto e período renovado"""
+    __tablename__ = 'resumo_renovacoes_diario'
+
+    dia = db.Column(db.Date, primary_key=True)
+    tipo_produto = db.Column(db.String(10), primary_key=True)  # '' quando o cliente não existe mais
+    dias_renovados = db.Column(db.Integer, primary_key=True)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    receita = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ResumoRenovacaoDiario {self.dia} {self.tipo_produto} {self.dias_renovados}>'
+
+    def to_dict(self):
+        return {
+            'dia': self.dia.isoformat() if self.dia else None,
+            'tipo_produto': self.tipo_produto,
+            'dias_renovados': self.dias_renovados,
+            'quantidade': self.quantidade,
+            'receita': self.receita
+        }
+
+
+class ResumoMensagemDiario(db.Model):
+    """Logs de mensagem agregados por dia de criação, produto, status e tipo"""
+    __tablename__ = 'resumo_mensagens_diario'
+
+    dia = db.Column(db.Date, primary_key=True)
+    tipo_produto = db.Column(db.String(10), primary_key=True)  # '' quando o cliente não existe mais
+    status = db.Column(db.String(20), primary_key=True)
+    tipo_notificacao = db.Column(db.String(50), primary_key=True)  # '' quando não informado
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ResumoMensagemDiario {self.dia} {self.tipo_produto} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'dia': self.dia.isoformat() if self.dia else None,
+            'tipo_produto': self.tipo_produto,
+            'status': self.status,
+            'tipo_notificacao': self.tipo_notificacao or None,
+            'quantidade': self.quantidade
+        }
@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from src.models.user import db
+from src.services import motor_templates
 
 class TemplateMensagem(db.Model):
     __tablename__ = 'templates_mensagem'
@@ -33,18 +34,26 @@ class TemplateMensagem(db.Model):
             'data_atualizacao': self.data_atualizacao.isoformat() if self.data_atualizacao else None
         }
 
-    def processar_template(self, cliente, dias_vencimento=None):
-        """Processa o template substituindo as variáveis pelos dados do cliente"""
-        conteudo_processado = self.conteudo
-        
-        # Substituir variáveis básicas
-        conteudo_processado = conteudo_processado.replace('{nome}', cliente.nome_completo)
-        conteudo_processado = conteudo_processado.replace('{plano}', cliente.plano_contratado)
-        conteudo_processado = conteudo_processado.replace('{valor}', f'R$ {cliente.valor_plano:.2f}')
+    @staticmethod
+    def obter_padrao(tipo_produto, tipo_template):
+        """Busca o template padrão ativo do produto, recorrendo ao template GERAL"""
+        template = TemplateMensagem.query.filter_by(
+            tipo_produto=tipo_produto.upper(),
+            tipo_template=tipo_template,
+            padrao=True,
+            ativo=True
+        ).first()
         
-        # Substituir dias para vencimento
-        if dias_vencimento is not None:
-            conteudo_processado = conteudo_processado.replace('{dias}', str(abs(dias_vencimento)))
+        if not template:
+            template = TemplateMensagem.query.filter_by(
+                tipo_produto='GERAL',
+                tipo_template=tipo_template,
+                padrao=True,
+                ativo=True
+            ).first()
         
-        return conteudo_processado
+        return template
 
+    def processar_template(self, cliente, dias_vencimento=None):
+        """Processa o template substituindo as variáveis pelos dados do cliente"""
+        return motor_templates.renderizar(self, cliente, dias_vencimento)
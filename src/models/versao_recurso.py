@@ -0,0 +1,75 @@
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.models.user import db
+
+# Funções a executar depois do commit da transação corrente, por sessão
+APOS_COMMIT = 'versao_recurso_apos_commit'
+
+class VersaoRecurso(db.Model):
+    """Contador de versão por recurso, usado para invalidar caches entre processos"""
+    __tablename__ = 'versoes_recursos'
+
+    recurso = db.Column(db.String(50), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+    data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<VersaoRecurso {self.recurso} v{self.versao}>'
+
+    def to_dict(self):
+        return {
+            'recurso': self.recurso,
+            'versao': self.versao,
+            'data_atualizacao': self.data_atualizacao.isoformat() if self.data_atualizacao else None
+        }
+
+    @staticmethod
+    def obter(recurso):
+        """Versão atual do recurso (0 se nunca alterado)"""
+        versao = db.session.query(VersaoRecurso.versao).filter_by(recurso=recurso).scalar()
+        return versao or 0
+
+    @staticmethod
+    def incrementar(recurso, conexao=None):
+        """Incrementa a versão na transação corrente; o commit fica com quem chamou.
+        
+        Com `conexao` (SQLAlchemy Core) a versão é gravada nela, fora da sessão.
+        """
+        if conexao is not None:
+            tabela = VersaoRecurso.__table__
+            agora = datetime.utcnow()
+            inserir = sqlite_insert(tabela).values(recurso=recurso, versao=1, data_atualizacao=agora)
+            conexao.execute(inserir.on_conflict_do_update(
+                index_elements=['recurso'],
+                set_={'versao': tabela.c.versao + 1, 'data_atualizacao': agora}
+            ))
+            return
+        
+        atualizados = db.session.query(VersaoRecurso).filter_by(recurso=recurso).update({
+            'versao': VersaoRecurso.versao + 1,
+            'data_atualizacao': datetime.utcnow()
+        }, synchronize_session=False)
+
+        if not atualizados:
+            db.session.add(VersaoRecurso(recurso=recurso, versao=1))
+
+    @staticmethod
+    def apos_commit(funcao):
+        """Executa `funcao` depois do commit da transação corrente da sessão.
+
+        Para descartar caches locais só quando a nova versão já está visível
+        para os outros leitores; num rollback a função é descartada.
+        """
+        db.session.info.setdefault(APOS_COMMIT, {})[funcao] = None
+
+
+@event.listens_for(db.session, 'after_commit')
+def _executar_apos_commit(sessao):
+    for funcao in sessao.info.pop(APOS_COMMIT, {}):
+        funcao()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _descartar_apos_commit(sessao):
+    sessao.info.pop(APOS_COMMIT, None)
@@ -0,0 +1,80 @@
+from flask import Blueprint, request, jsonify, send_from_directory
+from src.models.user import db
+from src.services import backup
+from src.services.agendador_envio import agendador_envio
+
+backup_bp = Blueprint('backup', __name__)
+
+@backup_bp.route('/backups', methods=['GET'])
+def listar_backups():
+    """Lista os backups registrados, do mais recente para o mais antigo"""
+    try:
+        backups = list(reversed(backup.listar()))
+        return jsonify({'backups': backups, 'total': len(backups)})
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@backup_bp.route('/backups', methods=['POST'])
+def criar_backup():
+    """Gera um backup completo ou incremental (tipo no JSON, padrão completo)"""
+    try:
+        dados = request.get_json(silent=True) or {}
+        tipo = dados.get('tipo', 'completo')
+        if tipo not in ('completo', 'incremental'):
+            return jsonify({'erro': 'Tipo deve ser completo ou incremental'}), 400
+
+        try:
+            entrada = backup.completo() if tipo == 'completo' else backup.incremental()
+        except backup.ErroBackup as e:
+            return jsonify({'erro': str(e)}), 400
+
+        return jsonify({
+            'mensagem': 'Backup criado com sucesso',
+            'backup': entrada
+        }), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': str(e)}), 500
+
+@backup_bp.route('/backups/<nome>', methods=['GET'])
+def baixar_backup(nome):
+    """Baixa o arquivo de um backup"""
+    if not backup.obter(nome):
+        return jsonify({'erro': 'Backup não encontrado'}), 404
+    return send_from_directory(backup.diretorio(), nome, as_attachment=True)
+
+@backup_bp.route('/backups/<nome>/verificar', methods=['GET'])
+def verificar_backup(nome):
+    """Confere o SHA-256 do arquivo com o registrado na criação"""
+    try:
+        entrada = backup.obter(nome)
+        if not entrada:
+            return jsonify({'erro': 'Backup não encontrado'}), 404
+        return jsonify({'nome': nome, 'valido': backup.verificar(nome), 'sha256': entrada['sha256']})
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@backup_bp.route('/backups/<nome>/restaurar', methods=['POST'])
+def restaurar_backup(nome):
+    """Restaura o banco até o backup informado (completo anterior + incrementais)"""
+    try:
+        if not backup.obter(nome):
+            return jsonify({'erro': 'Backup não encontrado'}), 404
+
+        try:
+            aplicados = backup.restaurar(nome)
+        except backup.ErroBackup as e:
+            return jsonify({'erro': str(e)}), 400
+
+        if agendador_envio.executando:
+            agendador_envio.reconstruir()
+
+        return jsonify({
+            'mensagem': 'Backup restaurado com sucesso',
+            'aplicados': aplicados
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': str(e)}), 500
@@ -1,24 +1,63 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+import json
 from datetime import datetime, date, time
 from src.models.user import db
 from src.models.cliente import Cliente
 from src.models.template_mensagem import TemplateMensagem
 from src.models.renovacao import Renovacao
-from sqlalchemy import or_, and_
+from src.models.versao_recurso import VersaoRecurso
+from src.services import aviso_service
+from src.services import busca
+from src.services import cache_http
+from src.services import dashboard
+from src.services import importacao_clientes
+from src.services import paginacao
+from src.services import renovacao_lote
+from src.services import resumo_diario
+from src.services import telefone
+from src.services.agendador_envio import agendador_envio
+from sqlalchemy import or_
 
 cliente_bp = Blueprint('cliente', __name__)
 
 @cliente_bp.route('/clientes', methods=['GET'])
+@cache_http.condicional('clientes')
 def listar_clientes():
-    """Lista todos os clientes com filtros opcionais"""
+    """Lista os clientes com filtros opcionais.
+    
+    Sem `cursor` devolve todos os clientes, como antes. Com `cursor` (vazio
+    na primeira página) pagina por (data_vencimento, id). `fields` restringe
+    os campos retornados e `formato=ndjson` transmite um cliente por linha.
+    `q` busca por nome, telefone, plano ou comentários e devolve os mais
+    relevantes primeiro, paginados por `page`. `telefone` filtra pelo número
+    normalizado, em qualquer formato.
+    """
     try:
         # Parâmetros de filtro
         tipo_produto = request.args.get('tipo_produto')
         ativo = request.args.get('ativo')
         vencimento_ate = request.args.get('vencimento_ate')
-        
-        # Query base
-        query = Cliente.query
+        numero = request.args.get('telefone')
+        cursor = request.args.get('cursor')
+        q = request.args.get('q')
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = max(request.args.get('per_page', 100, type=int), 1)
+        incluir_total = request.args.get('incluir_total', '').lower() in ('true', '1', 'yes')
+        formato = request.args.get('formato', 'json').lower()
+        
+        # Campos retornados (todos os de to_dict() por padrão)
+        campos = Cliente.CAMPOS
+        if request.args.get('fields'):
+            campos = [campo.strip() for campo in request.args['fields'].split(',') if campo.strip()]
+            invalidos = [campo for campo in campos if campo not in Cliente.CAMPOS]
+            if invalidos:
+                return jsonify({'erro': f"Campos inválidos: {', '.join(invalidos)}"}), 400
+        
+        # Só as colunas necessárias, lidas como tuplas; id e data_vencimento
+        # entram sempre por causa da ordenação e do cursor
+        colunas = list(dict.fromkeys(list(campos) + ['id', 'data_vencimento']))
+        query = Cliente.query.with_entities(*[getattr(Cliente, coluna) for coluna in colunas])
+        serializar = Cliente.serializador(campos, colunas)
         
         # Aplicar filtros
         if tipo_produto:
@@ -35,11 +74,76 @@ def listar_clientes():
             except ValueError:
                 return jsonify({'erro': 'Formato de data inválido. Use YYYY-MM-DD'}), 400
         
-        clientes = query.order_by(Cliente.data_vencimento.asc()).all()
+        if numero:
+            numero_normalizado = telefone.normalizar(numero)
+            if numero_normalizado is None:
+                return jsonify({'erro': 'Telefone inválido'}), 400
+            query = query.filter(Cliente.telefone_normalizado == numero_normalizado)
+        
+        ordem = [Cliente.data_vencimento.asc(), Cliente.id.asc()]
+        
+        # Busca textual: ordem por relevância
+        if q is not None:
+            try:
+                query, relevancia = busca.filtrar(query, 'clientes', Cliente.id, q)
+            except busca.BuscaInvalida as e:
+                return jsonify({'erro': str(e)}), 400
+            ordem = [relevancia, Cliente.id.asc()]
+        
+        # Transmissão em NDJSON, lendo o resultado em blocos
+        if formato == 'ndjson':
+            linhas = query.order_by(*ordem).yield_per(1000)
+            
+            def gerar():
+                for linha in linhas:
+                    yield json.dumps(serializar(linha), ensure_ascii=False) + '\n'
+            
+            return Response(stream_with_context(gerar()), mimetype='application/x-ndjson')
+        
+        if q is not None:
+            total = query.order_by(None).count()
+            pages = -(-total // per_page) if total else 0
+            linhas = query.order_by(*ordem).limit(per_page).offset((page - 1) * per_page).all()
+            
+            return jsonify({
+                'clientes': [serializar(linha) for linha in linhas],
+                'total': total,
+                'pages': pages,
+                'current_page': page,
+                'per_page': per_page,
+                'has_next': page < pages,
+                'has_prev': page > 1
+            })
+        
+        # Paginação por cursor
+        if cursor is not None:
+            try:
+                linhas, proximo_cursor = paginacao.pagina_por_cursor(
+                    query,
+                    [Cliente.data_vencimento, Cliente.id],
+                    cursor,
+                    per_page,
+                    chave=lambda linha: [linha.data_vencimento, linha.id],
+                    ascendente=True
+                )
+            except paginacao.CursorInvalido as e:
+                return jsonify({'erro': str(e)}), 400
+            
+            resposta = {
+                'clientes': [serializar(linha) for linha in linhas],
+                'per_page': per_page,
+                'next_cursor': proximo_cursor,
+                'has_next': proximo_cursor is not None
+            }
+            if incluir_total:
+                resposta['total'] = query.order_by(None).count()
+            return jsonify(resposta)
+        
+        linhas = query.order_by(*ordem).all()
         
         return jsonify({
-            'clientes': [cliente.to_dict() for cliente in clientes],
-            'total': len(clientes)
+            'clientes': [serializar(linha) for linha in linhas],
+            'total': len(linhas)
         })
         
     except Exception as e:
@@ -63,6 +167,10 @@ def criar_cliente():
         if dados['tipo_produto'].upper() not in ['IPTV', 'VPN', 'OUTROS']:
             return jsonify({'erro': 'Tipo de produto deve ser IPTV, VPN ou OUTROS'}), 400
         
+        telefone_normalizado = telefone.normalizar(dados['telefone'])
+        if not telefone_normalizado:
+            return jsonify({'erro': 'Telefone inválido'}), 400
+        
         # Converter datas
         try:
             data_vencimento = datetime.strptime(dados['data_vencimento'], '%Y-%m-%d').date()
@@ -87,6 +195,7 @@ def criar_cliente():
         cliente = Cliente(
             nome_completo=dados['nome_completo'],
             telefone=dados['telefone'],
+            telefone_normalizado=telefone_normalizado,
             tipo_produto=dados['tipo_produto'].upper(),
             plano_contratado=dados['plano_contratado'],
             valor_plano=float(dados['valor_plano']),
@@ -106,7 +215,9 @@ def criar_cliente():
             cliente.data_ultimo_comentario = datetime.utcnow()
         
         db.session.add(cliente)
+        dashboard.invalidar('clientes')
         db.session.commit()
+        agendador_envio.reagendar_cliente(cliente)
         
         return jsonify({
             'mensagem': 'Cliente criado com sucesso',
@@ -117,6 +228,37 @@ def criar_cliente():
         db.session.rollback()
         return jsonify({'erro': str(e)}), 500
 
+@cliente_bp.route('/clientes/bulk', methods=['POST'])
+def importar_clientes():
+    """Cria ou atualiza clientes em lote, usando o telefone como chave.
+
+    Aceita uma lista JSON (ou {"clientes": [...]}, como data/clientes.json),
+    um CSV no corpo (Content-Type text/csv) ou um arquivo CSV enviado no
+    campo `arquivo`. Linhas inválidas voltam em `erros` sem impedir as demais.
+    """
+    try:
+        if 'arquivo' in request.files:
+            linhas = importacao_clientes.ler_csv(request.files['arquivo'].read().decode('utf-8-sig'))
+        elif request.mimetype in ('text/csv', 'application/csv'):
+            linhas = importacao_clientes.ler_csv(request.get_data().decode('utf-8-sig'))
+        else:
+            dados = request.get_json(silent=True)
+            linhas = dados.get('clientes') if isinstance(dados, dict) else dados
+            if not isinstance(linhas, list):
+                return jsonify({'erro': 'Envie uma lista de clientes em JSON ou um CSV'}), 400
+
+        if not linhas:
+            return jsonify({'erro': 'Nenhum cliente para importar'}), 400
+
+        resultado = importacao_clientes.importar(linhas)
+        agendador_envio.reagendar_clientes(resultado.pop('ids'))
+
+        return jsonify(dict(resultado, mensagem='Importação concluída', total=len(linhas)))
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': str(e)}), 500
+
 @cliente_bp.route('/clientes/<int:cliente_id>', methods=['GET'])
 def obter_cliente(cliente_id):
     """Obtém um cliente específico"""
@@ -132,13 +274,18 @@ def atualizar_cliente(cliente_id):
     try:
         cliente = Cliente.query.get_or_404(cliente_id)
         dados = request.get_json()
+        produto_anterior = cliente.tipo_produto
         
         # Atualizar campos se fornecidos
         if 'nome_completo' in dados:
             cliente.nome_completo = dados['nome_completo']
         
         if 'telefone' in dados:
+            telefone_normalizado = telefone.normalizar(dados['telefone'])
+            if not telefone_normalizado:
+                return jsonify({'erro': 'Telefone inválido'}), 400
             cliente.telefone = dados['telefone']
+            cliente.telefone_normalizado = telefone_normalizado
         
         if 'tipo_produto' in dados:
             if dados['tipo_produto'].upper() not in ['IPTV', 'VPN', 'OUTROS']:
@@ -198,7 +345,13 @@ def atualizar_cliente(cliente_id):
             cliente.atualizar_comentario(dados['comentarios'])
         
         cliente.data_atualizacao = datetime.utcnow()
+        
+        # Renovações e logs do cliente passam a contar para o novo produto
+        resumo_diario.mover_cliente(cliente.id, produto_anterior, cliente.tipo_produto)
+        dashboard.invalidar('clientes')
+        
         db.session.commit()
+        agendador_envio.reagendar_cliente(cliente)
         
         return jsonify({
             'mensagem': 'Cliente atualizado com sucesso',
@@ -214,8 +367,11 @@ def deletar_cliente(cliente_id):
     """Deleta um cliente"""
     try:
         cliente = Cliente.query.get_or_404(cliente_id)
+        resumo_diario.remover_cliente(cliente.id, cliente.tipo_produto)
         db.session.delete(cliente)
+        dashboard.invalidar('clientes', 'renovacoes')
         db.session.commit()
+        agendador_envio.remover_cliente(cliente_id)
         
         return jsonify({'mensagem': 'Cliente deletado com sucesso'})
         
@@ -266,7 +422,11 @@ def renovar_cliente(cliente_id):
         )
         
         db.session.add(renovacao)
+        db.session.flush()
+        resumo_diario.registrar_renovacao(renovacao, cliente.tipo_produto)
+        dashboard.invalidar('clientes', 'renovacoes')
         db.session.commit()
+        agendador_envio.reagendar_cliente(cliente)
         
         return jsonify({
             'mensagem': 'Cliente renovado com sucesso',
@@ -278,65 +438,73 @@ def renovar_cliente(cliente_id):
         db.session.rollback()
         return jsonify({'erro': str(e)}), 500
 
+@cliente_bp.route('/clientes/renovar-lote', methods=['POST'])
+def renovar_clientes_lote():
+    """Renova vários clientes de uma vez, em uma única transação.
+
+    Recebe uma lista (ou {"renovacoes": [...]}) de itens com cliente_id,
+    dias_renovacao e, opcionalmente, valor_pago e observacoes. Se algum
+    item for inválido nada é gravado.
+    """
+    try:
+        dados = request.get_json(silent=True)
+        itens = dados.get('renovacoes') if isinstance(dados, dict) else dados
+        if not isinstance(itens, list) or not itens:
+            return jsonify({'erro': 'Envie uma lista de renovações'}), 400
+        if len(itens) > renovacao_lote.MAXIMO_ITENS:
+            return jsonify({'erro': f'Máximo de {renovacao_lote.MAXIMO_ITENS} renovações por lote'}), 400
+
+        try:
+            renovacoes = renovacao_lote.renovar(itens)
+        except renovacao_lote.ErroRenovacao as e:
+            db.session.rollback()
+            return jsonify({'erro': str(e), 'erros': e.erros}), 400
+
+        db.session.commit()
+        agendador_envio.reagendar_clientes([renovacao['cliente_id'] for renovacao in renovacoes])
+
+        return jsonify({
+            'mensagem': 'Clientes renovados com sucesso',
+            'total': len(renovacoes),
+            'renovacoes': [{
+                campo: valor.isoformat() if isinstance(valor, (date, datetime)) else valor
+                for campo, valor in renovacao.items()
+            } for renovacao in renovacoes]
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': str(e)}), 500
+
+@cliente_bp.route('/clientes/dashboard', methods=['GET'])
+@cache_http.condicional(chave=dashboard.chave_atual)
+def dashboard_geral():
+    """Retorna dados do dashboard de todos os tipos de produto"""
+    try:
+        produtos = dashboard.obter()
+        totais = {
+            campo: sum(dados[campo] for dados in produtos.values())
+            for campo in ('clientes_ativos', 'clientes_vencidos', 'clientes_vencendo',
+                          'receita_total', 'renovacoes_mes')
+        }
+        
+        return jsonify({
+            'produtos': produtos,
+            'totais': totais
+        })
+        
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
 @cliente_bp.route('/clientes/dashboard/<tipo_produto>', methods=['GET'])
+@cache_http.condicional(chave=dashboard.chave_atual)
 def dashboard_clientes(tipo_produto):
     """Retorna dados do dashboard para um tipo de produto específico"""
     try:
         if tipo_produto.upper() not in ['IPTV', 'VPN', 'OUTROS']:
             return jsonify({'erro': 'Tipo de produto inválido'}), 400
         
-        # Clientes ativos
-        clientes_ativos = Cliente.query.filter_by(
-            tipo_produto=tipo_produto.upper(), 
-            ativo=True
-        ).count()
-        
-        # Clientes vencidos (data de vencimento < hoje)
-        clientes_vencidos = Cliente.query.filter(
-            and_(
-                Cliente.tipo_produto == tipo_produto.upper(),
-                Cliente.ativo == True,
-                Cliente.data_vencimento < date.today()
-            )
-        ).count()
-        
-        # Clientes que vencem nos próximos 7 dias
-        from datetime import timedelta
-        data_limite = date.today() + timedelta(days=7)
-        clientes_vencendo = Cliente.query.filter(
-            and_(
-                Cliente.tipo_produto == tipo_produto.upper(),
-                Cliente.ativo == True,
-                Cliente.data_vencimento >= date.today(),
-                Cliente.data_vencimento <= data_limite
-            )
-        ).count()
-        
-        # Receita total
-        receita_total = db.session.query(db.func.sum(Cliente.valor_plano)).filter(
-            and_(
-                Cliente.tipo_produto == tipo_produto.upper(),
-                Cliente.ativo == True
-            )
-        ).scalar() or 0
-        
-        # Renovações do mês atual
-        primeiro_dia_mes = date.today().replace(day=1)
-        renovacoes_mes = Renovacao.query.join(Cliente).filter(
-            and_(
-                Cliente.tipo_produto == tipo_produto.upper(),
-                Renovacao.data_renovacao >= primeiro_dia_mes
-            )
-        ).count()
-        
-        return jsonify({
-            'tipo_produto': tipo_produto.upper(),
-            'clientes_ativos': clientes_ativos,
-            'clientes_vencidos': clientes_vencidos,
-            'clientes_vencendo': clientes_vencendo,
-            'receita_total': receita_total,
-            'renovacoes_mes': renovacoes_mes
-        })
+        return jsonify(dashboard.obter()[tipo_produto.upper()])
         
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
@@ -352,6 +520,7 @@ def atualizar_comentario_cliente(cliente_id):
             return jsonify({'erro': 'Campo comentarios é obrigatório'}), 400
         
         cliente.atualizar_comentario(dados['comentarios'])
+        VersaoRecurso.incrementar('clientes')
         db.session.commit()
         
         return jsonify({
@@ -373,6 +542,7 @@ def deletar_comentario_cliente(cliente_id):
         cliente.comentarios = None
         cliente.data_ultimo_comentario = None
         cliente.data_atualizacao = datetime.utcnow()
+        VersaoRecurso.incrementar('clientes')
         
         db.session.commit()
         
@@ -386,37 +556,15 @@ def deletar_comentario_cliente(cliente_id):
 def clientes_avisos_pendentes():
     """Retorna clientes que precisam receber avisos hoje"""
     try:
-        from datetime import date, time
-        
         hoje = date.today()
-        clientes_para_aviso = []
         
-        # Buscar todos os clientes ativos
-        clientes = Cliente.query.filter_by(ativo=True).all()
-        
-        for cliente in clientes:
-            # Verificar se precisa de aviso de antecedência
-            if cliente.precisa_aviso_antecedencia() and not cliente.foi_renovado_recentemente():
-                if cliente.pode_enviar_mensagem():
-                    clientes_para_aviso.append({
-                        'cliente': cliente.to_dict(),
-                        'tipo_aviso': 'antecedencia',
-                        'dias_restantes': cliente.dias_para_vencimento(),
-                        'horario_envio': cliente.horario_aviso.strftime('%H:%M') if cliente.horario_aviso else cliente.horario_envio.strftime('%H:%M')
-                    })
-            
-            # Verificar se vence hoje
-            elif cliente.vence_hoje() and not cliente.foi_renovado_recentemente():
-                if cliente.pode_enviar_mensagem():
-                    clientes_para_aviso.append({
-                        'cliente': cliente.to_dict(),
-                        'tipo_aviso': 'vencimento',
-                        'dias_restantes': 0,
-                        'horario_envio': cliente.horario_envio.strftime('%H:%M')
-                    })
-        
-        # Ordenar por horário de envio
-        clientes_para_aviso.sort(key=lambda x: x['horario_envio'])
+        # Elegibilidade resolvida no banco em uma única consulta
+        avisos = aviso_service.buscar_avisos_pendentes(hoje)
+        
+        clientes_para_aviso = []
+        for aviso in avisos:
+            aviso['cliente'] = aviso['cliente'].to_dict()
+            clientes_para_aviso.append(aviso)
         
         return jsonify({
             'clientes_para_aviso': clientes_para_aviso,
@@ -432,11 +580,7 @@ def marcar_mensagem_enviada(cliente_id):
     """Marca que uma mensagem foi enviada para o cliente"""
     try:
         cliente = Cliente.query.get_or_404(cliente_id)
-        
-        cliente.ultima_mensagem_enviada = datetime.utcnow()
-        cliente.data_atualizacao = datetime.utcnow()
-        
-        db.session.commit()
+        aviso_service.marcar_mensagem_enviada(cliente)
         
         return jsonify({
             'mensagem': 'Mensagem marcada como enviada',
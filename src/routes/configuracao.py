@@ -1,12 +1,14 @@
 from flask import Blueprint, request, jsonify
 from datetime import datetime
 from src.models.user import db
-from src.models.configuracao import Configuracao
+from src.models.configuracao import Configuracao, RECURSO_CACHE
+from src.services import cache_http
 import json
 
 configuracao_bp = Blueprint('configuracao', __name__)
 
 @configuracao_bp.route('/configuracoes', methods=['GET'])
+@cache_http.condicional(RECURSO_CACHE)
 def listar_configuracoes():
     """Lista todas as configurações com filtros opcionais"""
     try:
@@ -35,6 +37,7 @@ def listar_configuracoes():
         return jsonify({'erro': str(e)}), 500
 
 @configuracao_bp.route('/configuracoes/<categoria>', methods=['GET'])
+@cache_http.condicional(RECURSO_CACHE)
 def listar_configuracoes_categoria(categoria):
     """Lista configurações de uma categoria específica"""
     try:
@@ -77,6 +80,7 @@ def criar_configuracao():
             config.set_valor_tipado(dados['valor'])
         
         db.session.add(config)
+        Configuracao.invalidar_cache()
         db.session.commit()
         
         return jsonify({
@@ -118,6 +122,7 @@ def atualizar_configuracao(chave):
             config.categoria = dados['categoria']
         
         config.data_atualizacao = datetime.utcnow()
+        Configuracao.invalidar_cache()
         db.session.commit()
         
         return jsonify({
@@ -135,6 +140,7 @@ def deletar_configuracao(chave):
     try:
         config = Configuracao.query.filter_by(chave=chave).first_or_404()
         db.session.delete(config)
+        Configuracao.invalidar_cache()
         db.session.commit()
         
         return jsonify({'mensagem': 'Configuração deletada com sucesso'})
@@ -181,6 +187,8 @@ def atualizar_configuracoes_lote():
             config.data_atualizacao = datetime.utcnow()
             configuracoes_atualizadas.append(config.to_dict())
         
+        Configuracao.invalidar_cache()
+        
         db.session.commit()
         
         return jsonify({
@@ -210,7 +218,7 @@ def inicializar_configuracoes_padrao():
                 'valor': 5,
                 'tipo': 'integer',
                 'categoria': 'whatsapp',
-                'descricao': 'Intervalo em segundos entre mensagens'
+                'descricao': 'Intervalo inicial em segundos entre mensagens (o mesmo ritmo de whatsapp_taxa_mensagens_minuto; vale o alterado por último)'
             },
             {
                 'chave': 'whatsapp_horario_inicio',
@@ -226,6 +234,83 @@ def inicializar_configuracoes_padrao():
                 'categoria': 'whatsapp',
                 'descricao': 'Horário de fim para envio de mensagens'
             },
+            {
+                'chave': 'whatsapp_taxa_mensagens_minuto',
+                'valor': 12,
+                'tipo': 'integer',
+                'categoria': 'whatsapp',
+                'descricao': 'Taxa inicial de envio em mensagens por minuto (o mesmo ritmo de whatsapp_intervalo_mensagens; vale o alterado por último)'
+            },
+            {
+                'chave': 'whatsapp_rajada',
+                'valor': 3,
+                'tipo': 'integer',
+                'categoria': 'whatsapp',
+                'descricao': 'Mensagens que podem sair em rajada antes do limitador segurar o envio'
+            },
+            {
+                'chave': 'whatsapp_taxa_minima',
+                'valor': 2,
+                'tipo': 'integer',
+                'categoria': 'whatsapp',
+                'descricao': 'Taxa mínima de envio (mensagens por minuto) após reduções'
+            },
+            {
+                'chave': 'whatsapp_taxa_maxima',
+                'valor': 30,
+                'tipo': 'integer',
+                'categoria': 'whatsapp',
+                'descricao': 'Taxa máxima de envio (mensagens por minuto) permitida pelo ajuste automático'
+            },
+            {
+                'chave': 'whatsapp_latencia_alvo_ms',
+                'valor': 3000,
+                'tipo': 'integer',
+                'categoria': 'whatsapp',
+                'descricao': 'Latência da ponte acima da qual a taxa de envio é reduzida'
+            },
+            {
+                'chave': 'whatsapp_trabalhadores_envio',
+                'valor': 1,
+                'tipo': 'integer',
+                'categoria': 'whatsapp',
+                'descricao': 'Quantidade de trabalhadores que esvaziam a fila de envio'
+            },
+            {
+                'chave': 'whatsapp_sessoes',
+                'valor': 1,
+                'tipo': 'integer',
+                'categoria': 'whatsapp',
+                'descricao': 'Sessões (números de WhatsApp) no pool de envio, cada uma com sua ponte, porta e limite de taxa'
+            },
+            {
+                'chave': 'whatsapp_tamanho_lote',
+                'valor': 10,
+                'tipo': 'integer',
+                'categoria': 'whatsapp',
+                'descricao': 'Mensagens reivindicadas por lote da fila de envio'
+            },
+            {
+                'chave': 'whatsapp_lease_segundos',
+                'valor': 300,
+                'tipo': 'integer',
+                'categoria': 'whatsapp',
+                'descricao': 'Duração do lease de um lote reivindicado'
+            },
+            {
+                'chave': 'whatsapp_max_tentativas',
+                'valor': 3,
+                'tipo': 'integer',
+                'categoria': 'whatsapp',
+                'descricao': 'Tentativas de envio antes de marcar a mensagem como falha'
+            },
+            {
+                'chave': 'whatsapp_tempo_drenagem',
+                'valor': 60,
+                'tipo': 'integer',
+                'categoria': 'whatsapp',
+                'descricao': 'Tempo máximo em segundos para esvaziar a fila ao parar o serviço'
+            },
             {
                 'chave': 'whatsapp_dias_funcionamento',
                 'valor': ['segunda', 'terca', 'quarta', 'quinta', 'sexta', 'sabado'],
@@ -319,6 +404,13 @@ def inicializar_configuracoes_padrao():
                 'tipo': 'string',
                 'categoria': 'sistema',
                 'descricao': 'Fuso horário do sistema'
+            },
+            {
+                'chave': 'logs_retencao_dias',
+                'valor': 180,
+                'tipo': 'integer',
+                'categoria': 'sistema',
+                'descricao': 'Dias que os logs de mensagem ficam na tabela antes de ir para o arquivo mensal'
             }
         ]
         
@@ -339,6 +431,8 @@ def inicializar_configuracoes_padrao():
                 db.session.add(config)
                 configuracoes_criadas += 1
         
+        Configuracao.invalidar_cache()
+        
         db.session.commit()
         
         return jsonify({
@@ -3,13 +3,24 @@ from datetime import datetime, date
 from src.models.user import db
 from src.models.log_mensagem import LogMensagem
 from src.models.cliente import Cliente
-from sqlalchemy import and_, or_
+from src.models.resumo_diario import ResumoMensagemDiario
+from src.services import arquivo_logs
+from src.services import busca
+from src.services import fila_envio
+from src.services import paginacao
+from src.services import resumo_diario
+from sqlalchemy import and_, or_, func
 
 log_mensagem_bp = Blueprint('log_mensagem', __name__)
 
 @log_mensagem_bp.route('/logs', methods=['GET'])
 def listar_logs():
-    """Lista todos os logs de mensagem com filtros opcionais"""
+    """Lista todos os logs de mensagem com filtros opcionais.
+    
+    `q` busca no texto da mensagem e no detalhe do erro; os resultados vêm
+    por relevância entre os busca.JANELA_RELEVANCIA logs mais recentes que
+    casam, paginados por `page` (logs arquivados não entram).
+    """
     try:
         # Parâmetros de filtro
         cliente_id = request.args.get('cliente_id', type=int)
@@ -17,11 +28,15 @@ def listar_logs():
         tipo_notificacao = request.args.get('tipo_notificacao')
         data_inicio = request.args.get('data_inicio')
         data_fim = request.args.get('data_fim')
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = max(request.args.get('per_page', 50, type=int), 1)
+        cursor = request.args.get('cursor')
+        q = request.args.get('q')
+        incluir_total = request.args.get('incluir_total', '').lower() in ('true', '1', 'yes')
         
         # Query base
         query = LogMensagem.query
+        data_inicio_obj = data_fim_obj = None
         
         # Aplicar filtros
         if cliente_id:
@@ -49,39 +64,139 @@ def listar_logs():
             except ValueError:
                 return jsonify({'erro': 'Formato de data_fim inválido. Use YYYY-MM-DD'}), 400
         
-        # Ordenar por data de criação (mais recentes primeiro)
-        query = query.order_by(LogMensagem.data_criacao.desc())
-        
-        # Paginação
-        logs_paginados = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
+        ranqueados = None
+        if q is not None:
+            try:
+                ranqueados = busca.recentes(query, 'logs_mensagem', LogMensagem.id, q)
+            except busca.BuscaInvalida as e:
+                return jsonify({'erro': str(e)}), 400
+            inicio = (page - 1) * per_page
+            query = LogMensagem.query.filter(LogMensagem.id.in_(ranqueados[inicio:inicio + per_page]))
+        
+        # Dados do cliente em um único join, só com as colunas usadas
+        query_com_cliente = query.outerjoin(Cliente, Cliente.id == LogMensagem.cliente_id).add_columns(
+            Cliente.nome_completo, Cliente.tipo_produto
         )
         
-        # Incluir dados do cliente nos logs
-        logs_com_cliente = []
-        for log in logs_paginados.items:
-            log_dict = log.to_dict()
-            cliente = Cliente.query.get(log.cliente_id)
-            if cliente:
-                log_dict['cliente_nome'] = cliente.nome_completo
-                log_dict['cliente_tipo_produto'] = cliente.tipo_produto
-            logs_com_cliente.append(log_dict)
+        def com_cliente(linhas):
+            logs_com_cliente = []
+            for log, cliente_nome, cliente_tipo_produto in linhas:
+                log_dict = log.to_dict()
+                if cliente_nome is not None:
+                    log_dict['cliente_nome'] = cliente_nome
+                    log_dict['cliente_tipo_produto'] = cliente_tipo_produto
+                logs_com_cliente.append(log_dict)
+            return logs_com_cliente
+        
+        ordem = [LogMensagem.data_criacao, LogMensagem.id]
+        
+        # Busca textual: mais relevantes primeiro
+        if ranqueados is not None:
+            posicao = {log_id: i for i, log_id in enumerate(ranqueados)}
+            linhas = sorted(query_com_cliente.all(), key=lambda linha: posicao[linha[0].id])
+            total = len(ranqueados)
+            pages = -(-total // per_page) if total else 0
+            
+            return jsonify({
+                'logs': com_cliente(linhas),
+                'total': total,
+                'pages': pages,
+                'current_page': page,
+                'per_page': per_page,
+                'has_next': page < pages,
+                'has_prev': page > 1
+            })
+        
+        # Intervalos de datas que alcançam meses arquivados também leem o
+        # arquivo, intercalado com a tabela
+        arquivados = []
+        if data_inicio_obj or data_fim_obj:
+            arquivados = arquivo_logs.buscar(data_inicio_obj, data_fim_obj, cliente_id, status, tipo_notificacao)
+        
+        # Paginação por cursor (mais recentes primeiro); o total só se pedido
+        if cursor is not None:
+            try:
+                linhas, proximo_cursor = paginacao.pagina_por_cursor(query_com_cliente, ordem, cursor, per_page)
+                logs = com_cliente(linhas)
+                if arquivados:
+                    depois_de = tuple(paginacao.decodificar_cursor(cursor, ordem)) if cursor else None
+                    logs, ultima = arquivo_logs.mesclar_cursor(
+                        logs, proximo_cursor is not None, arquivados, depois_de, per_page
+                    )
+                    proximo_cursor = paginacao.codificar_cursor(ultima) if ultima else None
+            except paginacao.CursorInvalido as e:
+                return jsonify({'erro': str(e)}), 400
+            
+            resposta = {
+                'logs': logs,
+                'per_page': per_page,
+                'next_cursor': proximo_cursor,
+                'has_next': proximo_cursor is not None
+            }
+            if incluir_total:
+                resposta['total'] = query.order_by(None).count() + len(arquivados)
+            return jsonify(resposta)
+        
+        # Paginação por página (mais recentes primeiro)
+        if arquivados:
+            total = query.order_by(None).count() + len(arquivados)
+            pages = -(-total // per_page)
+            chaves = query.with_entities(*ordem).order_by(
+                *[coluna.desc() for coluna in ordem]
+            ).limit(page * per_page).all()
+            escolhidos = arquivo_logs.mesclar_offset(chaves, arquivados, page, per_page)
+            
+            ids = [log_id for log_id, registro in escolhidos if registro is None]
+            da_tabela = {}
+            if ids:
+                da_tabela = {
+                    log['id']: log
+                    for log in com_cliente(query_com_cliente.filter(LogMensagem.id.in_(ids)).all())
+                }
+            logs = [registro if registro is not None else da_tabela[log_id] for log_id, registro in escolhidos]
+        else:
+            linhas, total, pages = paginacao.pagina_por_offset(query, query_com_cliente, ordem, page, per_page)
+            logs = com_cliente(linhas)
         
         return jsonify({
-            'logs': logs_com_cliente,
-            'total': logs_paginados.total,
-            'pages': logs_paginados.pages,
+            'logs': logs,
+            'total': total,
+            'pages': pages,
             'current_page': page,
             'per_page': per_page,
-            'has_next': logs_paginados.has_next,
-            'has_prev': logs_paginados.has_prev
+            'has_next': page < pages,
+            'has_prev': page > 1
         })
         
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
+@log_mensagem_bp.route('/logs/arquivar', methods=['POST'])
+def arquivar_logs():
+    """Move os logs antigos para os arquivos mensais compactados"""
+    try:
+        dados = request.get_json(silent=True) or {}
+        dias = dados.get('dias')
+        if dias is not None:
+            try:
+                dias = int(dias)
+            except (TypeError, ValueError):
+                return jsonify({'erro': 'dias deve ser um número inteiro'}), 400
+            if dias < 1:
+                return jsonify({'erro': 'dias deve ser maior que zero'}), 400
+        
+        movidos = arquivo_logs.arquivar(dias)
+        
+        return jsonify({
+            'mensagem': 'Logs arquivados com sucesso',
+            'arquivados_por_mes': movidos,
+            'total': sum(movidos.values())
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': str(e)}), 500
+
 @log_mensagem_bp.route('/logs', methods=['POST'])
 def criar_log():
     """Cria um novo log de mensagem"""
@@ -118,6 +233,8 @@ def criar_log():
         )
         
         db.session.add(log)
+        db.session.flush()
+        resumo_diario.registrar_log(log, cliente.tipo_produto)
         db.session.commit()
         
         return jsonify({
@@ -156,7 +273,13 @@ def atualizar_log(log_id):
         if 'status' in dados:
             if dados['status'] not in ['enviada', 'falha', 'pendente']:
                 return jsonify({'erro': 'Status deve ser enviada, falha ou pendente'}), 400
+            status_anterior = log.status
             log.status = dados['status']
+            resumo_diario.registrar_log(
+                log,
+                log.cliente.tipo_produto if log.cliente else None,
+                status_anterior=status_anterior
+            )
         
         if 'data_envio' in dados:
             if dados['data_envio']:
@@ -190,52 +313,68 @@ def estatisticas_logs():
         data_fim = request.args.get('data_fim')
         tipo_produto = request.args.get('tipo_produto')
         
-        # Query base
-        query = LogMensagem.query
+        # Os números vêm do resumo diário por dia de criação do log
+        query = ResumoMensagemDiario.query
         
         # Aplicar filtros de data
         if data_inicio:
             try:
-                data_inicio_obj = datetime.strptime(data_inicio, '%Y-%m-%d')
-                query = query.filter(LogMensagem.data_criacao >= data_inicio_obj)
+                data_inicio_obj = datetime.strptime(data_inicio, '%Y-%m-%d').date()
+                query = query.filter(ResumoMensagemDiario.dia >= data_inicio_obj)
             except ValueError:
                 return jsonify({'erro': 'Formato de data_inicio inválido'}), 400
         
         if data_fim:
             try:
-                data_fim_obj = datetime.strptime(data_fim, '%Y-%m-%d')
-                data_fim_obj = data_fim_obj.replace(hour=23, minute=59, second=59)
-                query = query.filter(LogMensagem.data_criacao <= data_fim_obj)
+                data_fim_obj = datetime.strptime(data_fim, '%Y-%m-%d').date()
+                query = query.filter(ResumoMensagemDiario.dia <= data_fim_obj)
             except ValueError:
                 return jsonify({'erro': 'Formato de data_fim inválido'}), 400
         
         # Filtrar por tipo de produto se especificado
         if tipo_produto:
-            query = query.join(Cliente).filter(Cliente.tipo_produto == tipo_produto.upper())
-        
-        # Estatísticas por status
-        total_mensagens = query.count()
-        mensagens_enviadas = query.filter(LogMensagem.status == 'enviada').count()
-        mensagens_falha = query.filter(LogMensagem.status == 'falha').count()
-        mensagens_pendentes = query.filter(LogMensagem.status == 'pendente').count()
-        
-        # Estatísticas por tipo de notificação
+            query = query.filter(ResumoMensagemDiario.tipo_produto == tipo_produto.upper())
+        
+        grupos = query.with_entities(
+            ResumoMensagemDiario.status,
+            ResumoMensagemDiario.tipo_notificacao,
+            ResumoMensagemDiario.tipo_produto,
+            func.sum(ResumoMensagemDiario.quantidade)
+        ).group_by(
+            ResumoMensagemDiario.status,
+            ResumoMensagemDiario.tipo_notificacao,
+            ResumoMensagemDiario.tipo_produto
+        ).all()
+        
+        # Uma só passada sobre os grupos: status, tipos e produtos presentes
+        # no período filtrado
+        por_status = {}
         stats_tipo = {}
-        tipos_notificacao = db.session.query(LogMensagem.tipo_notificacao).distinct().all()
-        for (tipo,) in tipos_notificacao:
-            if tipo:
-                stats_tipo[tipo] = query.filter(LogMensagem.tipo_notificacao == tipo).count()
-        
-        # Estatísticas por produto
         stats_produto = {}
-        if not tipo_produto:  # Se não filtrou por produto, mostrar todos
-            produtos = db.session.query(Cliente.tipo_produto).distinct().all()
-            for (produto,) in produtos:
-                count = query.join(Cliente).filter(Cliente.tipo_produto == produto).count()
-                stats_produto[produto] = count
-        
-        # Taxa de sucesso
+        falhas_tipo = {}
+        falhas_produto = {}
+        for status, tipo, produto, quantidade in grupos:
+            if not quantidade:
+                continue
+            por_status[status] = por_status.get(status, 0) + quantidade
+            if tipo:
+                stats_tipo[tipo] = stats_tipo.get(tipo, 0) + quantidade
+            if produto and not tipo_produto:
+                stats_produto[produto] = stats_produto.get(produto, 0) + quantidade
+            if status == 'falha':
+                if tipo:
+                    falhas_tipo[tipo] = falhas_tipo.get(tipo, 0) + quantidade
+                if produto:
+                    falhas_produto[produto] = falhas_produto.get(produto, 0) + quantidade
+        
+        total_mensagens = sum(por_status.values())
+        mensagens_enviadas = por_status.get('enviada', 0)
+        mensagens_falha = por_status.get('falha', 0)
+        mensagens_pendentes = por_status.get('pendente', 0)
+        
+        # Taxas de sucesso e de falha
         taxa_sucesso = (mensagens_enviadas / total_mensagens * 100) if total_mensagens > 0 else 0
+        taxa_falha = (mensagens_falha / total_mensagens * 100) if total_mensagens > 0 else 0
         
         return jsonify({
             'total_mensagens': total_mensagens,
@@ -243,8 +382,11 @@ def estatisticas_logs():
             'mensagens_falha': mensagens_falha,
             'mensagens_pendentes': mensagens_pendentes,
             'taxa_sucesso': round(taxa_sucesso, 2),
+            'taxa_falha': round(taxa_falha, 2),
             'estatisticas_por_tipo': stats_tipo,
-            'estatisticas_por_produto': stats_produto
+            'estatisticas_por_produto': stats_produto,
+            'falhas_por_tipo': falhas_tipo,
+            'falhas_por_produto': falhas_produto
         })
         
     except Exception as e:
@@ -262,9 +404,17 @@ def reenviar_mensagem(log_id):
         
         # Atualizar status para pendente
         log.status = 'pendente'
+        resumo_diario.registrar_log(
+            log,
+            log.cliente.tipo_produto if log.cliente else None,
+            status_anterior='falha'
+        )
         log.tentativas += 1
         log.erro_detalhes = None
         
+        # Devolver a mensagem à fila de envio
+        fila_envio.reenfileirar_log(log)
+        
         db.session.commit()
         
         return jsonify({
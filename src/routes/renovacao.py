@@ -3,7 +3,12 @@ from datetime import datetime, date
 from src.models.user import db
 from src.models.renovacao import Renovacao
 from src.models.cliente import Cliente
-from sqlalchemy import and_, func
+from src.models.resumo_diario import ResumoRenovacaoDiario
+from src.services.agendador_envio import agendador_envio
+from src.services import dashboard
+from src.services import paginacao
+from src.services import resumo_diario
+from sqlalchemy import func
 
 renovacao_bp = Blueprint('renovacao', __name__)
 
@@ -16,8 +21,10 @@ def listar_renovacoes():
         data_inicio = request.args.get('data_inicio')
         data_fim = request.args.get('data_fim')
         dias_renovados = request.args.get('dias_renovados', type=int)
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = max(request.args.get('per_page', 50, type=int), 1)
+        cursor = request.args.get('cursor')
+        incluir_total = request.args.get('incluir_total', '').lower() in ('true', '1', 'yes')
         
         # Query base
         query = Renovacao.query
@@ -43,35 +50,58 @@ def listar_renovacoes():
         if dias_renovados:
             query = query.filter(Renovacao.dias_renovados == dias_renovados)
         
-        # Ordenar por data de renovação (mais recentes primeiro)
-        query = query.order_by(Renovacao.data_renovacao.desc())
-        
-        # Paginação
-        renovacoes_paginadas = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
+        # Dados do cliente em um único join, só com as colunas usadas
+        query_com_cliente = query.outerjoin(Cliente, Cliente.id == Renovacao.cliente_id).add_columns(
+            Cliente.nome_completo, Cliente.tipo_produto, Cliente.plano_contratado
         )
         
-        # Incluir dados do cliente nas renovações
-        renovacoes_com_cliente = []
-        for renovacao in renovacoes_paginadas.items:
-            renovacao_dict = renovacao.to_dict()
-            cliente = Cliente.query.get(renovacao.cliente_id)
-            if cliente:
-                renovacao_dict['cliente_nome'] = cliente.nome_completo
-                renovacao_dict['cliente_tipo_produto'] = cliente.tipo_produto
-                renovacao_dict['cliente_plano'] = cliente.plano_contratado
-            renovacoes_com_cliente.append(renovacao_dict)
+        def com_cliente(linhas):
+            renovacoes_com_cliente = []
+            for renovacao, cliente_nome, cliente_tipo_produto, cliente_plano in linhas:
+                renovacao_dict = renovacao.to_dict()
+                if cliente_nome is not None:
+                    renovacao_dict['cliente_nome'] = cliente_nome
+                    renovacao_dict['cliente_tipo_produto'] = cliente_tipo_produto
+                    renovacao_dict['cliente_plano'] = cliente_plano
+                renovacoes_com_cliente.append(renovacao_dict)
+            return renovacoes_com_cliente
+        
+        # Paginação por cursor (mais recentes primeiro); o total só se pedido
+        if cursor is not None:
+            try:
+                linhas, proximo_cursor = paginacao.pagina_por_cursor(
+                    query_com_cliente, [Renovacao.data_renovacao, Renovacao.id], cursor, per_page
+                )
+            except paginacao.CursorInvalido as e:
+                return jsonify({'erro': str(e)}), 400
+            
+            resposta = {
+                'renovacoes': com_cliente(linhas),
+                'per_page': per_page,
+                'next_cursor': proximo_cursor,
+                'has_next': proximo_cursor is not None
+            }
+            if incluir_total:
+                resposta['total'] = query.order_by(None).count()
+            return jsonify(resposta)
+        
+        # Paginação por página (mais recentes primeiro)
+        linhas, total, pages = paginacao.pagina_por_offset(
+            query,
+            query_com_cliente,
+            [Renovacao.data_renovacao, Renovacao.id],
+            page,
+            per_page
+        )
         
         return jsonify({
-            'renovacoes': renovacoes_com_cliente,
-            'total': renovacoes_paginadas.total,
-            'pages': renovacoes_paginadas.pages,
+            'renovacoes': com_cliente(linhas),
+            'total': total,
+            'pages': pages,
             'current_page': page,
             'per_page': per_page,
-            'has_next': renovacoes_paginadas.has_next,
-            'has_prev': renovacoes_paginadas.has_prev
+            'has_next': page < pages,
+            'has_prev': page > 1
         })
         
     except Exception as e:
@@ -102,11 +132,18 @@ def atualizar_renovacao(renovacao_id):
         
         # Atualizar campos se fornecidos
         if 'valor_pago' in dados:
+            valor_anterior = renovacao.valor_pago
             renovacao.valor_pago = float(dados['valor_pago'])
+            resumo_diario.registrar_renovacao(
+                renovacao,
+                renovacao.cliente.tipo_produto if renovacao.cliente else None,
+                valor_anterior=valor_anterior
+            )
         
         if 'observacoes' in dados:
             renovacao.observacoes = dados['observacoes']
         
+        dashboard.invalidar('renovacoes')
         db.session.commit()
         
         return jsonify({
@@ -129,6 +166,7 @@ def deletar_renovacao(renovacao_id):
             cliente_id=renovacao.cliente_id
         ).order_by(Renovacao.data_renovacao.desc()).first()
         
+        cliente = None
         if renovacao_mais_recente and renovacao_mais_recente.id == renovacao.id:
             # Se for a mais recente, reverter a data de vencimento do cliente
             cliente = Cliente.query.get(renovacao.cliente_id)
@@ -136,9 +174,18 @@ def deletar_renovacao(renovacao_id):
                 cliente.data_vencimento = renovacao.data_vencimento_anterior
                 cliente.data_atualizacao = datetime.utcnow()
         
+        resumo_diario.registrar_renovacao(
+            renovacao,
+            renovacao.cliente.tipo_produto if renovacao.cliente else None,
+            sinal=-1
+        )
         db.session.delete(renovacao)
+        dashboard.invalidar('clientes', 'renovacoes')
         db.session.commit()
         
+        if cliente:
+            agendador_envio.reagendar_cliente(cliente)
+        
         return jsonify({'mensagem': 'Renovação deletada com sucesso'})
         
     except Exception as e:
@@ -154,94 +201,91 @@ def estatisticas_renovacoes():
         data_fim = request.args.get('data_fim')
         tipo_produto = request.args.get('tipo_produto')
         
-        # Query base
-        query = Renovacao.query
+        # Os números vêm do resumo diário: o custo depende da quantidade de
+        # dias no intervalo, não da quantidade de renovações
+        query = ResumoRenovacaoDiario.query
         
         # Aplicar filtros de data
         if data_inicio:
             try:
                 data_inicio_obj = datetime.strptime(data_inicio, '%Y-%m-%d').date()
-                query = query.filter(Renovacao.data_renovacao >= data_inicio_obj)
+                query = query.filter(ResumoRenovacaoDiario.dia >= data_inicio_obj)
             except ValueError:
                 return jsonify({'erro': 'Formato de data_inicio inválido'}), 400
         
         if data_fim:
             try:
                 data_fim_obj = datetime.strptime(data_fim, '%Y-%m-%d').date()
-                query = query.filter(Renovacao.data_renovacao <= data_fim_obj)
+                query = query.filter(ResumoRenovacaoDiario.dia <= data_fim_obj)
             except ValueError:
                 return jsonify({'erro': 'Formato de data_fim inválido'}), 400
         
         # Filtrar por tipo de produto se especificado
         if tipo_produto:
-            query = query.join(Cliente).filter(Cliente.tipo_produto == tipo_produto.upper())
+            query = query.filter(ResumoRenovacaoDiario.tipo_produto == tipo_produto.upper())
+        
+        # Uma única passada agrupada por período e produto
+        grupos = query.with_entities(
+            ResumoRenovacaoDiario.dias_renovados,
+            ResumoRenovacaoDiario.tipo_produto,
+            func.sum(ResumoRenovacaoDiario.quantidade),
+            func.sum(ResumoRenovacaoDiario.receita)
+        ).group_by(ResumoRenovacaoDiario.dias_renovados, ResumoRenovacaoDiario.tipo_produto).all()
         
         # Estatísticas gerais
-        total_renovacoes = query.count()
-        receita_total = query.with_entities(func.sum(Renovacao.valor_pago)).scalar() or 0
+        total_renovacoes = sum(quantidade for _, _, quantidade, _ in grupos)
+        receita_total = sum(receita or 0 for _, _, _, receita in grupos)
         
         # Estatísticas por período de renovação
-        stats_periodo = {}
         periodos = [30, 60, 90, 180, 365]
-        for periodo in periodos:
-            count = query.filter(Renovacao.dias_renovados == periodo).count()
-            receita = query.filter(Renovacao.dias_renovados == periodo).with_entities(func.sum(Renovacao.valor_pago)).scalar() or 0
-            stats_periodo[f'{periodo}_dias'] = {
-                'quantidade': count,
-                'receita': float(receita)
-            }
+        stats_periodo = {f'{periodo}_dias': {'quantidade': 0, 'receita': 0.0} for periodo in periodos}
+        for dias, _, quantidade, receita in grupos:
+            if dias in periodos:
+                stats_periodo[f'{dias}_dias']['quantidade'] += quantidade
+                stats_periodo[f'{dias}_dias']['receita'] += float(receita or 0)
         
         # Estatísticas por produto
         stats_produto = {}
         if not tipo_produto:  # Se não filtrou por produto, mostrar todos
             produtos = db.session.query(Cliente.tipo_produto).distinct().all()
-            for (produto,) in produtos:
-                count = query.join(Cliente).filter(Cliente.tipo_produto == produto).count()
-                receita = query.join(Cliente).filter(Cliente.tipo_produto == produto).with_entities(func.sum(Renovacao.valor_pago)).scalar() or 0
-                stats_produto[produto] = {
-                    'quantidade': count,
-                    'receita': float(receita)
-                }
-        
-        # Renovações por mês (últimos 12 meses)
-        from datetime import timedelta
-        from dateutil.relativedelta import relativedelta
+            stats_produto = {produto: {'quantidade': 0, 'receita': 0.0} for (produto,) in produtos}
+            for _, produto, quantidade, receita in grupos:
+                if produto in stats_produto:
+                    stats_produto[produto]['quantidade'] += quantidade
+                    stats_produto[produto]['receita'] += float(receita or 0)
         
-        renovacoes_por_mes = []
+        # Renovações por mês (últimos 12 meses, o atual até hoje)
         data_atual = date.today()
+        meses = []
+        ano, mes = data_atual.year, data_atual.month
+        for _ in range(12):
+            meses.append(date(ano, mes, 1))
+            ano, mes = (ano, mes - 1) if mes > 1 else (ano - 1, 12)
+        meses.reverse()
+        
+        mes_renovacao = func.strftime('%Y-%m', ResumoRenovacaoDiario.dia)
+        por_mes = {
+            chave: (quantidade, receita)
+            for chave, quantidade, receita in query.filter(
+                ResumoRenovacaoDiario.dia >= meses[0],
+                ResumoRenovacaoDiario.dia <= data_atual
+            ).with_entities(
+                mes_renovacao,
+                func.sum(ResumoRenovacaoDiario.quantidade),
+                func.sum(ResumoRenovacaoDiario.receita)
+            ).group_by(mes_renovacao).all()
+        }
         
-        for i in range(12):
-            inicio_mes = (data_atual - relativedelta(months=i)).replace(day=1)
-            if i == 0:
-                fim_mes = data_atual
-            else:
-                fim_mes = inicio_mes.replace(day=28) + timedelta(days=4)
-                fim_mes = fim_mes - timedelta(days=fim_mes.day)
-            
-            count = query.filter(
-                and_(
-                    Renovacao.data_renovacao >= inicio_mes,
-                    Renovacao.data_renovacao <= fim_mes
-                )
-            ).count()
-            
-            receita = query.filter(
-                and_(
-                    Renovacao.data_renovacao >= inicio_mes,
-                    Renovacao.data_renovacao <= fim_mes
-                )
-            ).with_entities(func.sum(Renovacao.valor_pago)).scalar() or 0
-            
+        renovacoes_por_mes = []
+        for inicio_mes in meses:
+            quantidade, receita = por_mes.get(inicio_mes.strftime('%Y-%m'), (0, 0))
             renovacoes_por_mes.append({
                 'mes': inicio_mes.strftime('%Y-%m'),
                 'mes_nome': inicio_mes.strftime('%B %Y'),
-                'quantidade': count,
-                'receita': float(receita)
+                'quantidade': quantidade,
+                'receita': float(receita or 0)
             })
         
-        # Reverter para ordem cronológica
-        renovacoes_por_mes.reverse()
-        
         # Ticket médio
         ticket_medio = (receita_total / total_renovacoes) if total_renovacoes > 0 else 0
         
@@ -2,11 +2,15 @@ from flask import Blueprint, request, jsonify
 from datetime import datetime
 from src.models.user import db
 from src.models.template_mensagem import TemplateMensagem
+from src.models.versao_recurso import VersaoRecurso
+from src.services import cache_http
+from src.services import motor_templates
 import json
 
 template_mensagem_bp = Blueprint('template_mensagem', __name__)
 
 @template_mensagem_bp.route('/templates', methods=['GET'])
+@cache_http.condicional('templates')
 def listar_templates():
     """Lista todos os templates de mensagem com filtros opcionais"""
     try:
@@ -85,6 +89,7 @@ def criar_template():
             ).update({'padrao': False})
         
         db.session.add(template)
+        VersaoRecurso.incrementar('templates')
         db.session.commit()
         
         return jsonify({
@@ -150,7 +155,9 @@ def atualizar_template(template_id):
                 ).update({'padrao': False})
         
         template.data_atualizacao = datetime.utcnow()
+        VersaoRecurso.incrementar('templates')
         db.session.commit()
+        motor_templates.invalidar(template.id)
         
         return jsonify({
             'mensagem': 'Template atualizado com sucesso',
@@ -177,7 +184,9 @@ def deletar_template(template_id):
             }), 400
         
         db.session.delete(template)
+        VersaoRecurso.incrementar('templates')
         db.session.commit()
+        motor_templates.invalidar(template_id)
         
         return jsonify({'mensagem': 'Template deletado com sucesso'})
         
@@ -206,7 +215,7 @@ def preview_template(template_id):
                 self.valor_plano = valor
         
         cliente_ficticio = ClienteFicticio(nome, plano, valor)
-        mensagem_processada = template.processar_template(cliente_ficticio, dias)
+        mensagem_processada = motor_templates.renderizar(template, cliente_ficticio, dias)
         
         return jsonify({
             'template_original': template.conteudo,
@@ -232,22 +241,8 @@ def obter_template_padrao(tipo_produto, tipo_template):
         if tipo_template not in ['vencimento', 'renovacao', 'personalizada']:
             return jsonify({'erro': 'Tipo de template inválido'}), 400
         
-        # Buscar template padrão específico primeiro
-        template = TemplateMensagem.query.filter_by(
-            tipo_produto=tipo_produto.upper(),
-            tipo_template=tipo_template,
-            padrao=True,
-            ativo=True
-        ).first()
-        
-        # Se não encontrar, buscar template geral
-        if not template:
-            template = TemplateMensagem.query.filter_by(
-                tipo_produto='GERAL',
-                tipo_template=tipo_template,
-                padrao=True,
-                ativo=True
-            ).first()
+        # Buscar template padrão específico primeiro, depois o geral
+        template = TemplateMensagem.obter_padrao(tipo_produto, tipo_template)
         
         if not template:
             return jsonify({'erro': 'Template padrão não encontrado'}), 404
@@ -1,5 +1,7 @@
 from flask import Blueprint, request, jsonify
 from src.services.whatsapp_service import whatsapp_service
+from src.services.agendador_envio import agendador_envio
+from src.services.escritor_lote import escritor_lote
 from src.models.configuracao import Configuracao
 from src.models.user import db
 
@@ -7,16 +9,21 @@ whatsapp_bp = Blueprint('whatsapp', __name__)
 
 @whatsapp_bp.route('/whatsapp/status', methods=['GET'])
 def status_whatsapp():
-    """Retorna o status do serviço WhatsApp"""
+    """Retorna o status do serviço WhatsApp, com saúde e vazão de cada sessão"""
     try:
         conectado = whatsapp_service.verificar_conexao()
         executando = whatsapp_service.executando
+        sessoes = whatsapp_service.pool.estado()
         
         return jsonify({
             'executando': executando,
             'conectado': conectado,
-            'qr_disponivel': whatsapp_service.qr_code is not None,
-            'porta': whatsapp_service.porta
+            'qr_disponivel': any(sessao['qr_disponivel'] for sessao in sessoes),
+            'sessoes_saudaveis': sum(1 for sessao in sessoes if sessao['saudavel']),
+            'mensagens_ultimo_minuto': sum(sessao['mensagens_ultimo_minuto'] for sessao in sessoes),
+            'sessoes': sessoes,
+            'agendador': agendador_envio.estado(),
+            'gravacoes_pendentes': escritor_lote.pendentes()
         })
         
     except Exception as e:
@@ -63,13 +70,18 @@ def parar_whatsapp():
 
 @whatsapp_bp.route('/whatsapp/qr', methods=['GET'])
 def obter_qr_code():
-    """Obtém o QR code para conexão"""
+    """Obtém o QR code para conexão (da sessão informada em `sessao` ou da
+    primeira ainda não conectada)"""
     try:
-        qr_code = whatsapp_service.obter_qr_code()
+        sessao, qr_code = whatsapp_service.obter_qr_code(request.args.get('sessao'))
+        
+        if sessao is None:
+            return jsonify({'erro': 'Sessão não encontrada'}), 404
         
         if qr_code:
             return jsonify({
                 'qr_code': qr_code,
+                'sessao': sessao.nome,
                 'instrucoes': 'Escaneie este QR code com seu WhatsApp para conectar'
             })
         else:
@@ -128,11 +140,16 @@ def processar_avisos_manual():
 def obter_configuracoes_whatsapp():
     """Obtém configurações do WhatsApp"""
     try:
+        # Intervalo e taxa são o mesmo ritmo: mostrar o que está valendo,
+        # mesmo que tenha sido definido pela taxa
+        taxa = whatsapp_service.taxa_configurada()
         configuracoes = {
             'ativo': Configuracao.get_configuracao('whatsapp_ativo', False),
-            'intervalo_mensagens': Configuracao.get_configuracao('whatsapp_intervalo_mensagens', 60),
+            'intervalo_mensagens': max(1, round(60.0 / taxa)),
+            'taxa_mensagens_minuto': round(taxa, 2),
             'horario_inicio': Configuracao.get_configuracao('whatsapp_horario_inicio', '08:00'),
             'horario_fim': Configuracao.get_configuracao('whatsapp_horario_fim', '22:00'),
+            'sessoes': Configuracao.get_configuracao('whatsapp_sessoes', 1),
             'dias_funcionamento': Configuracao.get_configuracao('whatsapp_dias_funcionamento', 
                 ['segunda', 'terca', 'quarta', 'quinta', 'sexta', 'sabado'])
         }
@@ -148,6 +165,15 @@ def atualizar_configuracoes_whatsapp():
     try:
         dados = request.get_json()
         
+        # Validar antes de gravar qualquer configuração
+        if 'sessoes' in dados:
+            try:
+                sessoes_validas = int(dados['sessoes']) >= 1
+            except (TypeError, ValueError):
+                sessoes_validas = False
+            if not sessoes_validas:
+                return jsonify({'erro': 'Quantidade de sessões deve ser um inteiro maior que zero'}), 400
+        
         configuracoes_atualizadas = []
         
         # Atualizar cada configuração se fornecida
@@ -155,7 +181,7 @@ def atualizar_configuracoes_whatsapp():
             config = Configuracao.set_configuracao(
                 'whatsapp_intervalo_mensagens', 
                 dados['intervalo_mensagens'],
-                'Intervalo em segundos entre mensagens',
+                'Intervalo inicial em segundos entre mensagens (o mesmo ritmo de whatsapp_taxa_mensagens_minuto; vale o alterado por último)',
                 'integer',
                 'whatsapp'
             )
@@ -191,6 +217,20 @@ def atualizar_configuracoes_whatsapp():
             )
             configuracoes_atualizadas.append(config.to_dict())
         
+        if 'sessoes' in dados:
+            config = Configuracao.set_configuracao(
+                'whatsapp_sessoes',
+                int(dados['sessoes']),
+                'Sessões (números de WhatsApp) no pool de envio; vale ao reiniciar o serviço',
+                'integer',
+                'whatsapp'
+            )
+            configuracoes_atualizadas.append(config.to_dict())
+        
+        # Janela de funcionamento pode ter mudado: recalcular os disparos
+        if agendador_envio.executando:
+            agendador_envio.reconstruir()
+        
         return jsonify({
             'mensagem': f'{len(configuracoes_atualizadas)} configurações atualizadas',
             'configuracoes': configuracoes_atualizadas
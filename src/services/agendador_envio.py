@@ -0,0 +1,326 @@
+"""
+Agendador de envios por cliente
+
+Mantém um min-heap com o próximo instante de aviso de cada cliente e dorme
+exatamente até o próximo vencimento, em vez de varrer todos os clientes a
+cada poucos minutos. As rotas de clientes e renovações atualizam o heap de
+forma incremental; à meia-noite o heap é reconstruído e os logs antigos são
+arquivados.
+"""
+import heapq
+import threading
+from datetime import datetime, date, time, timedelta
+from sqlalchemy import or_
+from src.models.user import db
+from src.models.cliente import Cliente
+from src.models.configuracao import Configuracao
+from src.services import arquivo_logs
+
+DIAS_SEMANA = ['segunda', 'terca', 'quarta', 'quinta', 'sexta', 'sabado', 'domingo']
+ESPERA_NOVA_TENTATIVA = 120  # segundos até tentar de novo um aviso devido que não foi enfileirado
+
+
+def carregar_janela():
+    """Lê a janela de funcionamento: (inicio, fim, dias permitidos)"""
+    horario_inicio = Configuracao.get_configuracao('whatsapp_horario_inicio', '08:00')
+    horario_fim = Configuracao.get_configuracao('whatsapp_horario_fim', '22:00')
+    dias_funcionamento = Configuracao.get_configuracao('whatsapp_dias_funcionamento',
+        ['segunda', 'terca', 'quarta', 'quinta', 'sexta', 'sabado'])
+
+    inicio = datetime.strptime(horario_inicio, '%H:%M').time()
+    fim = datetime.strptime(horario_fim, '%H:%M').time()
+    return inicio, fim, set(dias_funcionamento)
+
+
+def proximo_disparo(cliente, janela, agora=None, a_partir_de=None):
+    """Calcula o próximo instante em que o cliente deve receber aviso.
+
+    Considera o aviso de antecedência e o aviso do dia do vencimento, ajusta
+    o horário à janela de funcionamento e ignora dias sem funcionamento.
+    `a_partir_de` limita a busca a datas a partir do dia informado. Retorna
+    None se não houver aviso futuro.
+    """
+    if not cliente.ativo or not cliente.data_vencimento or not cliente.horario_envio:
+        return None
+
+    if agora is None:
+        agora = datetime.now()
+    hoje = agora.date()
+    if a_partir_de is None:
+        a_partir_de = hoje
+
+    inicio, fim, dias_permitidos = janela
+
+    candidatos = [(cliente.data_vencimento, cliente.horario_envio)]
+    if cliente.aviso_ativo and cliente.dias_aviso_antecedencia is not None:
+        candidatos.append((
+            cliente.data_vencimento - timedelta(days=cliente.dias_aviso_antecedencia),
+            cliente.horario_aviso or cliente.horario_envio
+        ))
+
+    # Aviso de hoje já atendido (mensagem enviada hoje) não é repetido
+    enviado_hoje = False
+    if cliente.ultima_mensagem_enviada:
+        fuso = datetime.now() - datetime.utcnow()
+        enviado_hoje = cliente.ultima_mensagem_enviada + fuso >= datetime.combine(hoje, time.min)
+
+    melhor = None
+    for dia, horario in candidatos:
+        if dia < a_partir_de or (dia == hoje and enviado_hoje):
+            continue
+        if DIAS_SEMANA[dia.weekday()] not in dias_permitidos:
+            continue
+
+        horario = min(max(horario, inicio), fim)
+        instante = datetime.combine(dia, horario)
+
+        # Horário de hoje que já passou: disparar assim que possível
+        if instante < agora:
+            if agora.time() > fim:
+                continue
+            instante = agora
+
+        if melhor is None or instante < melhor:
+            melhor = instante
+
+    return melhor
+
+
+class AgendadorEnvio:
+    def __init__(self):
+        self.app = None
+        self.executando = False
+        self.disparar = None
+        self.thread = None
+        self._cond = threading.Condition()
+        self._heap = []  # (instante, cliente_id)
+        self._proximos = {}  # cliente_id -> instante válido no heap
+        self._janela = None
+        self._dia_construcao = None
+
+    def init_app(self, app):
+        self.app = app
+
+    def iniciar(self, disparar):
+        """Inicia a thread do agendador.
+
+        `disparar(ids)` recebe os clientes devidos e retorna os que tiveram o
+        aviso de hoje resolvido; os demais são tentados de novo mais tarde.
+        """
+        if self.executando:
+            return
+        self.disparar = disparar
+        self.executando = True
+        self.thread = threading.Thread(target=self._loop, name='whatsapp-agendador', daemon=True)
+        self.thread.start()
+
+    def parar(self):
+        with self._cond:
+            self.executando = False
+            self._cond.notify_all()
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def reconstruir(self):
+        """Recarrega do banco o próximo disparo de todos os clientes ativos"""
+        janela = carregar_janela()
+        agora = datetime.now()
+
+        clientes = db.session.query(
+            Cliente.id, Cliente.ativo, Cliente.data_vencimento, Cliente.horario_envio,
+            Cliente.aviso_ativo, Cliente.dias_aviso_antecedencia, Cliente.horario_aviso,
+            Cliente.ultima_mensagem_enviada
+        ).filter(
+            Cliente.ativo == True,
+            or_(
+                Cliente.data_vencimento >= agora.date(),
+                Cliente.dias_aviso_antecedencia < 0
+            )
+        ).all()
+
+        heap = []
+        proximos = {}
+        for cliente in clientes:
+            instante = proximo_disparo(cliente, janela, agora)
+            if instante:
+                heap.append((instante, cliente.id))
+                proximos[cliente.id] = instante
+        heapq.heapify(heap)
+
+        with self._cond:
+            self._heap = heap
+            self._proximos = proximos
+            self._janela = janela
+            self._dia_construcao = agora.date()
+            self._cond.notify_all()
+
+        return len(proximos)
+
+    def reagendar_cliente(self, cliente):
+        """Atualiza o próximo disparo de um cliente criado, alterado ou renovado"""
+        if not self.executando or self._janela is None:
+            return
+        instante = proximo_disparo(cliente, self._janela)
+        with self._cond:
+            self._definir(cliente.id, instante)
+            self._cond.notify_all()
+
+    def reagendar_clientes(self, cliente_ids):
+        """Como reagendar_cliente, para muitos clientes (importações e operações em lote)"""
+        if not self.executando or self._janela is None or not cliente_ids:
+            return
+        cliente_ids = list(cliente_ids)
+        for inicio in range(0, len(cliente_ids), 500):
+            clientes = db.session.query(
+                Cliente.id, Cliente.ativo, Cliente.data_vencimento, Cliente.horario_envio,
+                Cliente.aviso_ativo, Cliente.dias_aviso_antecedencia, Cliente.horario_aviso,
+                Cliente.ultima_mensagem_enviada
+            ).filter(Cliente.id.in_(cliente_ids[inicio:inicio + 500])).all()
+            with self._cond:
+                for cliente in clientes:
+                    self._definir(cliente.id, proximo_disparo(cliente, self._janela))
+        with self._cond:
+            self._cond.notify_all()
+
+    def remover_cliente(self, cliente_id):
+        """Remove o cliente do agendamento"""
+        if not self.executando:
+            return
+        with self._cond:
+            self._proximos.pop(cliente_id, None)
+
+    def proximo(self):
+        """Instante do próximo disparo agendado"""
+        with self._cond:
+            self._descartar_obsoletos()
+            return self._heap[0][0] if self._heap else None
+
+    def estado(self):
+        proximo = self.proximo()
+        return {
+            'executando': self.executando,
+            'clientes_agendados': len(self._proximos),
+            'proximo_disparo': proximo.isoformat() if proximo else None
+        }
+
+    def _definir(self, cliente_id, instante):
+        if instante is None:
+            self._proximos.pop(cliente_id, None)
+            return
+        self._proximos[cliente_id] = instante
+        heapq.heappush(self._heap, (instante, cliente_id))
+
+        # Entradas substituídas ficam no heap até serem descartadas;
+        # compactar quando passarem a dominar
+        if len(self._heap) > 2 * len(self._proximos) + 1000:
+            self._heap = [(i, c) for c, i in self._proximos.items()]
+            heapq.heapify(self._heap)
+
+    def _descartar_obsoletos(self):
+        while self._heap and self._proximos.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def _retirar_devidos(self, agora):
+        devidos = []
+        while True:
+            self._descartar_obsoletos()
+            if not self._heap or self._heap[0][0] > agora:
+                break
+            _, cliente_id = heapq.heappop(self._heap)
+            del self._proximos[cliente_id]
+            devidos.append(cliente_id)
+        return devidos
+
+    def _loop(self):
+        with self.app.app_context():
+            while self.executando:
+                try:
+                    if self._dia_construcao != date.today():
+                        self.reconstruir()
+                        db.session.rollback()
+                        self._arquivar_logs()
+
+                    with self._cond:
+                        self._descartar_obsoletos()
+                        agora = datetime.now()
+                        meia_noite = datetime.combine(agora.date() + timedelta(days=1), time.min)
+                        alvo = min(self._heap[0][0], meia_noite) if self._heap else meia_noite
+                        # Limitar a espera protege contra ajustes no relógio
+                        espera = min((alvo - agora).total_seconds(), 3600)
+                        if espera > 0:
+                            self._cond.wait(espera)
+                        if not self.executando:
+                            break
+                        devidos = self._retirar_devidos(datetime.now())
+
+                    if devidos:
+                        self._atender(devidos)
+
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Erro no agendador de envios: {str(e)}")
+                    with self._cond:
+                        self._cond.wait(60)
+
+    def _arquivar_logs(self):
+        """Retenção diária: logs antigos vão para os arquivos mensais"""
+        try:
+            movidos = arquivo_logs.arquivar()
+            if movidos:
+                print(f"Logs arquivados: {sum(movidos.values())}")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Erro ao arquivar logs: {str(e)}")
+
+    def _atender(self, devidos):
+        """Dispara os clientes devidos e agenda o próximo disparo de cada um.
+
+        Quem teve o aviso de hoje resolvido, e quem deixou de ser elegível
+        (renovado, desativado, mensagem enviada há pouco), vai para o próximo
+        dia de aviso. Quem continua elegível mas não foi enfileirado (ponte
+        desconectada, fora do horário, erro) é tentado de novo daqui a
+        ESPERA_NOVA_TENTATIVA segundos, ainda hoje se a janela permitir.
+        """
+        try:
+            atendidos = set(self.disparar(devidos) or ())
+        except Exception as e:
+            print(f"Erro ao disparar avisos: {str(e)}")
+            atendidos = set()
+        db.session.rollback()
+
+        amanha = date.today() + timedelta(days=1)
+        restantes = [cliente_id for cliente_id in devidos if cliente_id not in atendidos]
+        elegiveis = []
+        if restantes:
+            elegiveis = [
+                cliente.id for cliente, _ in Cliente.buscar_avisos_pendentes(cliente_ids=restantes)
+            ]
+
+        self._reagendar_ids(
+            [cliente_id for cliente_id in devidos if cliente_id not in elegiveis],
+            a_partir_de=amanha
+        )
+        if elegiveis:
+            self._reagendar_ids(
+                elegiveis,
+                agora=datetime.now() + timedelta(seconds=ESPERA_NOVA_TENTATIVA)
+            )
+        db.session.rollback()
+
+    def _reagendar_ids(self, cliente_ids, a_partir_de=None, agora=None):
+        """Calcula o disparo seguinte dos clientes que acabaram de ser disparados.
+
+        `a_partir_de` pula para o próximo dia de aviso; `agora` no futuro adia
+        o disparo de hoje até esse instante.
+        """
+        clientes = Cliente.query.filter(Cliente.id.in_(cliente_ids)).all()
+        with self._cond:
+            for cliente in clientes:
+                if cliente.id not in self._proximos:
+                    self._definir(cliente.id, proximo_disparo(
+                        cliente, self._janela, agora=agora, a_partir_de=a_partir_de
+                    ))
+
+
+# Instância global do agendador
+agendador_envio = AgendadorEnvio()
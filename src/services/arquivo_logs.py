@@ -0,0 +1,267 @@
+"""
+Retenção e arquivamento mensal de logs_mensagem
+
+Logs finalizados ('enviada' ou 'falha') mais antigos que logs_retencao_dias
+saem da tabela em lotes e vão para um arquivo JSON compactado por mês
+(logs_AAAA_MM.json.gz, no mesmo formato de data/logs_2025_07.json), com o
+nome e o produto do cliente já resolvidos. Logs ainda presos à fila de
+envio ficam na tabela.
+
+Os resumos diários não são alterados: continuam contando o histórico
+arquivado, e `resumo_diario.reconstruir()` soma os arquivos de volta. A
+listagem /logs com intervalo de datas lê os meses arquivados do intervalo
+e os intercala com a tabela.
+"""
+import gzip
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import literal, select, tuple_
+from src.models.user import db
+from src.models.cliente import Cliente
+from src.models.configuracao import Configuracao
+from src.models.fila_envio import FilaEnvio
+from src.models.log_mensagem import LogMensagem
+
+RETENCAO_PADRAO = 180
+TAMANHO_LOTE = 5000
+STATUS_ARQUIVAVEIS = ('enviada', 'falha')
+PADRAO_ARQUIVO = re.compile(r'logs_(\d{4})_(\d{2})\.json\.gz')
+
+MESES_EM_CACHE = 12
+
+# caminho -> (mtime, [(chave, log)] do mais recente ao mais antigo), dos
+# MESES_EM_CACHE meses lidos mais recentemente
+_cache = OrderedDict()
+_lock_cache = threading.Lock()
+_lock = threading.Lock()
+
+
+def diretorio():
+    return current_app.config['DIRETORIO_ARQUIVO_LOGS']
+
+
+def _caminho(mes):
+    return os.path.join(diretorio(), f"logs_{mes.replace('-', '_')}.json.gz")
+
+
+def chave(registro):
+    """Chave de ordenação (data_criacao, id) de um log arquivado"""
+    return datetime.fromisoformat(registro['data_criacao']), registro['id']
+
+
+def meses_arquivados():
+    """Meses ('AAAA-MM') com arquivo, em ordem crescente"""
+    if not os.path.isdir(diretorio()):
+        return []
+    meses = []
+    for nome in os.listdir(diretorio()):
+        encontro = PADRAO_ARQUIVO.fullmatch(nome)
+        if encontro:
+            meses.append(f'{encontro.group(1)}-{encontro.group(2)}')
+    return sorted(meses)
+
+
+def _indexado(mes):
+    """[(chave, log)] do mês em ordem decrescente, lido de novo só se o arquivo mudar"""
+    caminho = _caminho(mes)
+    if not os.path.exists(caminho):
+        return []
+
+    modificacao = os.path.getmtime(caminho)
+    with _lock_cache:
+        em_cache = _cache.get(caminho)
+        if em_cache and em_cache[0] == modificacao:
+            _cache.move_to_end(caminho)
+            return em_cache[1]
+
+    with gzip.open(caminho, 'rt', encoding='utf-8') as arquivo:
+        logs = json.load(arquivo)['logs']
+    indexado = sorted(((chave(registro), registro) for registro in logs), key=lambda par: par[0], reverse=True)
+    _guardar(caminho, modificacao, indexado)
+    return indexado
+
+
+def _guardar(caminho, modificacao, indexado):
+    with _lock_cache:
+        _cache[caminho] = (modificacao, indexado)
+        _cache.move_to_end(caminho)
+        while len(_cache) > MESES_EM_CACHE:
+            _cache.popitem(last=False)
+
+
+def ler_mes(mes):
+    """Logs arquivados do mês"""
+    return [registro for _, registro in _indexado(mes)]
+
+
+def _gravar_mes(mes, logs):
+    """Grava o arquivo do mês com `logs` em ordem crescente de (data_criacao, id)"""
+    os.makedirs(diretorio(), exist_ok=True)
+    caminho = _caminho(mes)
+    conteudo = {
+        'logs': logs,
+        'total': len(logs),
+        'mes': mes,
+        'ultima_atualizacao': datetime.utcnow().isoformat(),
+        'versao': '1.0'
+    }
+    # Grava ao lado e troca de uma vez: um arquivo nunca fica pela metade
+    temporario = caminho + '.tmp'
+    with gzip.open(temporario, 'wt', encoding='utf-8') as arquivo:
+        json.dump(conteudo, arquivo, ensure_ascii=False)
+    os.replace(temporario, caminho)
+    # A listagem que vier depois não precisa ler de novo o que acabou de ser gravado
+    _guardar(caminho, os.path.getmtime(caminho), [(chave(registro), registro) for registro in reversed(logs)])
+
+
+def _fechar_mes(mes, registros, tamanho_lote):
+    """Grava o mês uma única vez e só então apaga da tabela os logs gravados"""
+    logs = {registro['id']: registro for registro in ler_mes(mes)}
+    logs.update((registro['id'], registro) for registro in registros)
+    _gravar_mes(mes, sorted(logs.values(), key=chave))
+
+    ids = [registro['id'] for registro in registros]
+    try:
+        for inicio in range(0, len(ids), tamanho_lote):
+            LogMensagem.query.filter(
+                LogMensagem.id.in_(ids[inicio:inicio + tamanho_lote])
+            ).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def arquivar(dias=None, tamanho_lote=TAMANHO_LOTE):
+    """Move para os arquivos mensais os logs finalizados com mais de `dias` dias.
+
+    Os logs são lidos em lotes de `tamanho_lote`, em ordem de data, e cada
+    mês é gravado uma única vez, ao fim dos seus lotes, antes de os seus
+    logs serem apagados da tabela. Se o processo cair no meio, a próxima
+    execução regrava o mês sem duplicar (os arquivos são indexados por id).
+    Retorna {mes: quantidade}.
+    """
+    if dias is None:
+        dias = Configuracao.get_configuracao('logs_retencao_dias', RETENCAO_PADRAO)
+    limite = datetime.utcnow() - timedelta(days=dias)
+    na_fila = select(FilaEnvio.log_mensagem_id).where(FilaEnvio.log_mensagem_id.isnot(None))
+    ordem = (LogMensagem.data_criacao, LogMensagem.id)
+
+    movidos = {}
+    with _lock:
+        mes_atual = None
+        registros = []
+        ultima = None
+        while True:
+            query = db.session.query(
+                LogMensagem, Cliente.nome_completo, Cliente.tipo_produto
+            ).outerjoin(Cliente, Cliente.id == LogMensagem.cliente_id).filter(
+                LogMensagem.data_criacao < limite,
+                LogMensagem.status.in_(STATUS_ARQUIVAVEIS),
+                LogMensagem.id.notin_(na_fila)
+            )
+            # Os lotes já lidos só saem da tabela quando o mês fecha: seguir
+            # pela chave do último lido
+            if ultima is not None:
+                query = query.filter(tuple_(*ordem) > tuple_(
+                    *[literal(valor, coluna.type) for valor, coluna in zip(ultima, ordem)]
+                ))
+            linhas = query.order_by(*ordem).limit(tamanho_lote).all()
+            if not linhas:
+                break
+
+            for log, cliente_nome, cliente_tipo_produto in linhas:
+                mes = log.data_criacao.strftime('%Y-%m')
+                if mes != mes_atual and registros:
+                    _fechar_mes(mes_atual, registros, tamanho_lote)
+                    movidos[mes_atual] = len(registros)
+                    registros = []
+                mes_atual = mes
+                registro = log.to_dict()
+                if cliente_nome is not None:
+                    registro['cliente_nome'] = cliente_nome
+                    registro['cliente_tipo_produto'] = cliente_tipo_produto
+                registros.append(registro)
+            ultima = (linhas[-1][0].data_criacao, linhas[-1][0].id)
+            db.session.expunge_all()
+
+        if registros:
+            _fechar_mes(mes_atual, registros, tamanho_lote)
+            movidos[mes_atual] = len(registros)
+
+    return movidos
+
+
+def buscar(inicio=None, fim=None, cliente_id=None, status=None, tipo_notificacao=None):
+    """Logs arquivados com data_criacao em [inicio, fim] que atendem aos filtros.
+
+    Retorna pares (chave, log) do mais recente para o mais antigo, como a
+    listagem.
+    """
+    resultado = []
+    for mes in reversed(meses_arquivados()):
+        if inicio and mes < inicio.strftime('%Y-%m'):
+            break
+        if fim and mes > fim.strftime('%Y-%m'):
+            continue
+        for par in _indexado(mes):
+            (data_criacao, _), registro = par
+            if (fim and data_criacao > fim) or (inicio and data_criacao < inicio):
+                continue
+            if cliente_id and registro['cliente_id'] != cliente_id:
+                continue
+            if status and registro['status'] != status:
+                continue
+            if tipo_notificacao and registro['tipo_notificacao'] != tipo_notificacao:
+                continue
+            resultado.append(par)
+    return resultado
+
+
+def mesclar_cursor(linhas, ha_mais, arquivados, depois_de, por_pagina):
+    """Intercala uma página por cursor da tabela com os logs arquivados.
+
+    `linhas` são os dicionários da tabela já filtrados pelo cursor e `ha_mais`
+    indica se a tabela tem outras linhas além delas; `arquivados` vem de
+    buscar() e `depois_de` é a chave (data_criacao, id) do cursor ou None.
+    Retorna (pagina, chave_da_ultima), com chave None na última página.
+    """
+    candidatos = []
+    for chave_arquivada, registro in arquivados:
+        if depois_de is None or chave_arquivada < depois_de:
+            candidatos.append((chave_arquivada, registro))
+            if len(candidatos) > por_pagina:
+                break
+    mesclados = sorted([(chave(log), log) for log in linhas] + candidatos, key=lambda par: par[0], reverse=True)
+    pagina = mesclados[:por_pagina]
+    if len(mesclados) > por_pagina or ha_mais:
+        return [log for _, log in pagina], pagina[-1][0]
+    return [log for _, log in pagina], None
+
+
+def mesclar_offset(chaves_tabela, arquivados, pagina, por_pagina):
+    """Escolhe as linhas de uma página por número intercalando tabela e arquivo.
+
+    `chaves_tabela` são as (data_criacao, id) das primeiras pagina*por_pagina
+    linhas da tabela. Retorna [(id, registro arquivado ou None)] na ordem
+    da página.
+    """
+    limite = pagina * por_pagina
+    candidatos = [(tuple(chave_tabela), None) for chave_tabela in chaves_tabela] + arquivados[:limite]
+    candidatos.sort(key=lambda par: par[0], reverse=True)
+    return [(chave_linha[1], registro) for chave_linha, registro in candidatos[limite - por_pagina:limite]]
+
+
+def deltas_resumo():
+    """Deltas (dia, tipo_produto, status, tipo_notificacao, 1) dos logs arquivados"""
+    return [
+        (registro['data_criacao'], registro.get('cliente_tipo_produto'), registro['status'],
+         registro.get('tipo_notificacao'), 1)
+        for mes in meses_arquivados()
+        for registro in ler_mes(mes)
+    ]
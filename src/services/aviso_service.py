@@ -0,0 +1,117 @@
+"""
+Serviço de avisos de vencimento compartilhado pelas rotas da API e pelo
+despachante do WhatsApp
+"""
+from datetime import datetime, date
+from src.models.user import db
+from src.models.cliente import Cliente
+from src.models.template_mensagem import TemplateMensagem
+from src.models.versao_recurso import VersaoRecurso
+from src.services import motor_templates
+
+
+def buscar_avisos_pendentes(hoje=None, cliente_ids=None):
+    """Retorna os avisos do dia ordenados por horário de envio"""
+    if hoje is None:
+        hoje = date.today()
+
+    avisos = []
+    for cliente, tipo_aviso in Cliente.buscar_avisos_pendentes(hoje, cliente_ids):
+        if tipo_aviso == 'antecedencia':
+            horario = cliente.horario_aviso or cliente.horario_envio
+            dias_restantes = (cliente.data_vencimento - hoje).days
+        else:
+            horario = cliente.horario_envio
+            dias_restantes = 0
+
+        avisos.append({
+            'cliente': cliente,
+            'tipo_aviso': tipo_aviso,
+            'dias_restantes': dias_restantes,
+            'horario_envio': horario.strftime('%H:%M')
+        })
+
+    avisos.sort(key=lambda x: x['horario_envio'])
+    return avisos
+
+
+def obter_template_aviso(cliente, tipo_aviso, templates=None):
+    """Obtém o template do cliente ou o padrão do produto.
+
+    `templates` é um dicionário opcional usado como memória entre chamadas de
+    um mesmo lote, evitando repetir as consultas para cada cliente.
+    """
+    if templates is None:
+        templates = {}
+
+    if cliente.template_mensagem_id:
+        chave = ('id', cliente.template_mensagem_id)
+        if chave not in templates:
+            templates[chave] = db.session.get(TemplateMensagem, cliente.template_mensagem_id)
+        if templates[chave]:
+            return templates[chave]
+
+    tipo_template = 'vencimento' if tipo_aviso in ['vencimento', 'antecedencia'] else 'personalizada'
+    chave = ('padrao', cliente.tipo_produto, tipo_template)
+    if chave not in templates:
+        templates[chave] = TemplateMensagem.obter_padrao(cliente.tipo_produto, tipo_template)
+    return templates[chave]
+
+
+def gerar_mensagem_aviso(cliente, tipo_aviso, templates=None, hoje=None):
+    """Gera o texto do aviso para o cliente ou None se não houver template"""
+    template = obter_template_aviso(cliente, tipo_aviso, templates)
+    if not template:
+        return None
+
+    if hoje is None:
+        hoje = date.today()
+    dias_vencimento = (cliente.data_vencimento - hoje).days
+
+    return template.processar_template(cliente, dias_vencimento)
+
+
+def gerar_mensagens_avisos(avisos, hoje=None):
+    """Gera os textos de um lote de avisos, renderizando por template.
+
+    Retorna pares (aviso, mensagem) na ordem original; avisos sem template
+    ou com dados inválidos ficam de fora.
+    """
+    if hoje is None:
+        hoje = date.today()
+
+    templates = {}
+    grupos = {}
+    for posicao, aviso in enumerate(avisos):
+        template = obter_template_aviso(aviso['cliente'], aviso['tipo_aviso'], templates)
+        if template:
+            grupos.setdefault(template.id, (template, []))[1].append(posicao)
+
+    mensagens = [None] * len(avisos)
+    for template, posicoes in grupos.values():
+        clientes = [avisos[posicao]['cliente'] for posicao in posicoes]
+        try:
+            renderizadas = motor_templates.renderizar_lote(template, clientes, hoje)
+        except Exception:
+            # Isolar o cliente com dados inválidos sem perder o restante do lote
+            renderizadas = []
+            for cliente in clientes:
+                try:
+                    renderizadas.extend(motor_templates.renderizar_lote(template, [cliente], hoje))
+                except Exception as e:
+                    print(f"Erro ao gerar aviso para cliente {cliente.id}: {str(e)}")
+                    renderizadas.append(None)
+
+        for posicao, mensagem in zip(posicoes, renderizadas):
+            mensagens[posicao] = mensagem
+
+    return [(aviso, mensagem) for aviso, mensagem in zip(avisos, mensagens) if mensagem]
+
+
+def marcar_mensagem_enviada(cliente):
+    """Registra o envio de mensagem para o controle de spam"""
+    cliente.ultima_mensagem_enviada = datetime.utcnow()
+    cliente.data_atualizacao = datetime.utcnow()
+    VersaoRecurso.incrementar('clientes')
+    db.session.commit()
+    return cliente
@@ -0,0 +1,383 @@
+"""
+Backups do banco: instantâneos completos e incrementais
+
+O backup completo usa a API de backup online do SQLite (cópia página a
+página, sem parar a aplicação) e é compactado em streaming para
+backup_completo_AAAAMMDD_HHMMSS.db.gz. O incremental grava em NDJSON
+compactado só as linhas criadas ou alteradas (data_criacao/data_atualizacao)
+desde o backup anterior, mais as faixas de ids existentes em cada tabela,
+o que permite refletir exclusões na restauração.
+
+Cada arquivo tem o SHA-256 registrado em backups.json, conferido antes de
+restaurar. A restauração aplica o último completo com a API de backup e os
+incrementais seguintes com INSERT OR REPLACE em executemany; os resumos
+diários e os índices de busca são refeitos no fim. Os logs já arquivados
+(arquivo_logs) ficam fora: os arquivos mensais já são a cópia deles.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import date, datetime, time
+from flask import current_app
+from sqlalchemy import Date, DateTime, Time, insert, select, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.models.user import db
+from src.models.versao_recurso import VersaoRecurso
+from src.services import dashboard
+
+MANIFESTO = 'backups.json'
+TAMANHO_LOTE = 5000
+TAMANHO_BLOCO = 1 << 20
+PAGINAS_POR_PASSO = 1024
+
+# Ordem de gravação e restauração (referenciadas antes de quem referencia).
+# Com colunas, o incremental leva só as linhas criadas/alteradas desde o
+# último backup; sem (None), a tabela inteira, que é pequena.
+TABELAS = (
+    ('user', None),
+    ('configuracoes', ('data_criacao', 'data_atualizacao')),
+    ('templates_mensagem', ('data_criacao', 'data_atualizacao')),
+    ('clientes', ('data_criacao', 'data_atualizacao')),
+    ('renovacoes', ('data_criacao', 'data_atualizacao')),
+    ('logs_mensagem', ('data_criacao', 'data_atualizacao')),
+    ('fila_envio', None),
+)
+
+_lock = threading.Lock()
+
+
+class ErroBackup(Exception):
+    pass
+
+
+def diretorio():
+    return current_app.config['DIRETORIO_BACKUPS']
+
+
+def listar():
+    """Backups registrados, do mais antigo para o mais recente"""
+    caminho = os.path.join(diretorio(), MANIFESTO)
+    if not os.path.exists(caminho):
+        return []
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)['backups']
+
+
+def _registrar(entrada):
+    backups = listar() + [entrada]
+    caminho = os.path.join(diretorio(), MANIFESTO)
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as arquivo:
+        json.dump({'backups': backups, 'versao': '1.0'}, arquivo, ensure_ascii=False, indent=2)
+    os.replace(caminho + '.tmp', caminho)
+
+
+def _novo_nome(tipo, agora, extensao):
+    nome = f'backup_{tipo}_{agora:%Y%m%d_%H%M%S}'
+    sufixo = 1
+    while os.path.exists(os.path.join(diretorio(), f'{nome}{extensao}')):
+        sufixo += 1
+        nome = f'backup_{tipo}_{agora:%Y%m%d_%H%M%S}_{sufixo}'
+    return nome + extensao
+
+
+def obter(nome):
+    for entrada in listar():
+        if entrada['nome'] == nome:
+            return entrada
+    return None
+
+
+class _ComHash:
+    """Arquivo de saída que calcula o SHA-256 do que passa por ele"""
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.hash = hashlib.sha256()
+        self.tamanho = 0
+
+    def write(self, dados):
+        self.hash.update(dados)
+        self.tamanho += len(dados)
+        return self.arquivo.write(dados)
+
+    def flush(self):
+        self.arquivo.flush()
+
+
+def _sha256(caminho):
+    hash_arquivo = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO), b''):
+            hash_arquivo.update(bloco)
+    return hash_arquivo.hexdigest()
+
+
+def verificar(nome):
+    """True se o arquivo existe e confere com o SHA-256 registrado"""
+    entrada = obter(nome)
+    caminho = os.path.join(diretorio(), nome)
+    return bool(entrada) and os.path.exists(caminho) and _sha256(caminho) == entrada['sha256']
+
+
+def _serializar(valor):
+    if isinstance(valor, (date, datetime, time)):
+        return valor.isoformat()
+    return valor
+
+
+def _conversores(tabela, colunas):
+    """Funções que devolvem os valores do NDJSON aos tipos das colunas"""
+    conversores = []
+    for nome in colunas:
+        tipo = tabela.c[nome].type
+        if isinstance(tipo, DateTime):
+            conversores.append(datetime.fromisoformat)
+        elif isinstance(tipo, Date):
+            conversores.append(date.fromisoformat)
+        elif isinstance(tipo, Time):
+            conversores.append(time.fromisoformat)
+        else:
+            conversores.append(None)
+    return conversores
+
+
+def _faixas(ids):
+    """Ids em ordem crescente -> [[inicio, fim], ...] de sequências contínuas"""
+    faixas = []
+    for id_linha in ids:
+        if faixas and id_linha == faixas[-1][1] + 1:
+            faixas[-1][1] = id_linha
+        else:
+            faixas.append([id_linha, id_linha])
+    return faixas
+
+
+def _gravar_compactado(nome, escrever):
+    """Compacta o que `escrever(arquivo_gzip)` produzir; retorna (sha256, tamanho)"""
+    os.makedirs(diretorio(), exist_ok=True)
+    caminho = os.path.join(diretorio(), nome)
+    with open(caminho + '.tmp', 'wb') as bruto:
+        saida = _ComHash(bruto)
+        with gzip.GzipFile(filename='', mode='wb', fileobj=saida, compresslevel=6) as compactado:
+            escrever(compactado)
+    os.replace(caminho + '.tmp', caminho)
+    return saida.hash.hexdigest(), saida.tamanho
+
+
+def completo():
+    """Instantâneo do banco inteiro pela API de backup online do SQLite"""
+    agora = datetime.utcnow()
+
+    with _lock:
+        os.makedirs(diretorio(), exist_ok=True)
+        nome = _novo_nome('completo', agora, '.db.gz')
+        descritor, copia = tempfile.mkstemp(suffix='.db', dir=diretorio())
+        os.close(descritor)
+        try:
+            destino = sqlite3.connect(copia)
+            conexao = db.engine.raw_connection()
+            try:
+                # Em passos: entre um e outro a aplicação continua gravando
+                conexao.driver_connection.backup(destino, pages=PAGINAS_POR_PASSO)
+                linhas = {
+                    tabela: destino.execute(f'SELECT COUNT(*) FROM "{tabela}"').fetchone()[0]
+                    for tabela, _ in TABELAS
+                }
+            finally:
+                conexao.close()
+                destino.close()
+
+            def escrever(compactado):
+                with open(copia, 'rb') as origem:
+                    shutil.copyfileobj(origem, compactado, TAMANHO_BLOCO)
+
+            sha256, tamanho = _gravar_compactado(nome, escrever)
+        finally:
+            os.remove(copia)
+
+        entrada = {
+            'nome': nome,
+            'tipo': 'completo',
+            'desde': None,
+            'ate': agora.isoformat(),
+            'sha256': sha256,
+            'tamanho': tamanho,
+            'linhas': linhas
+        }
+        _registrar(entrada)
+    return entrada
+
+
+def incremental():
+    """Linhas criadas ou alteradas desde o último backup, em NDJSON compactado"""
+    with _lock:
+        backups = listar()
+        if not backups:
+            raise ErroBackup('Nenhum backup anterior; faça primeiro um backup completo')
+        desde = datetime.fromisoformat(backups[-1]['ate'])
+        agora = datetime.utcnow()
+        nome = _novo_nome('incremental', agora, '.ndjson.gz')
+        linhas = {}
+
+        def escrever(compactado):
+            def linha(dados):
+                compactado.write((json.dumps(dados, ensure_ascii=False, separators=(',', ':')) + '\n').encode())
+
+            linha({'tipo': 'incremental', 'desde': desde.isoformat(), 'ate': agora.isoformat(), 'versao': 1})
+            for nome_tabela, colunas_alteracao in TABELAS:
+                tabela = db.metadata.tables[nome_tabela]
+                consulta = select(tabela)
+                if colunas_alteracao:
+                    consulta = consulta.where(or_(*[tabela.c[coluna] >= desde for coluna in colunas_alteracao]))
+
+                linha({'tabela': nome_tabela, 'colunas': [coluna.name for coluna in tabela.c]})
+                total = 0
+                for registro in db.session.execute(consulta.execution_options(yield_per=TAMANHO_LOTE)):
+                    linha([_serializar(valor) for valor in registro])
+                    total += 1
+                linhas[nome_tabela] = total
+
+                ids = db.session.scalars(select(tabela.c.id).order_by(tabela.c.id))
+                linha({'tabela': nome_tabela, 'ids': _faixas(ids)})
+
+        sha256, tamanho = _gravar_compactado(nome, escrever)
+        entrada = {
+            'nome': nome,
+            'tipo': 'incremental',
+            'desde': desde.isoformat(),
+            'ate': agora.isoformat(),
+            'sha256': sha256,
+            'tamanho': tamanho,
+            'linhas': linhas
+        }
+        _registrar(entrada)
+    return entrada
+
+
+def _cadeia(nome):
+    """Backups a aplicar para chegar em `nome`: o completo anterior e os incrementais seguintes"""
+    backups = listar()
+    posicao = next((indice for indice, entrada in enumerate(backups) if entrada['nome'] == nome), None)
+    if posicao is None:
+        raise ErroBackup(f'Backup {nome} não encontrado')
+    inicio = next((indice for indice in range(posicao, -1, -1) if backups[indice]['tipo'] == 'completo'), None)
+    if inicio is None:
+        raise ErroBackup('Nenhum backup completo antes deste incremental')
+    return backups[inicio:posicao + 1]
+
+
+def _restaurar_completo(caminho):
+    descritor, copia = tempfile.mkstemp(suffix='.db', dir=diretorio())
+    os.close(descritor)
+    try:
+        with gzip.open(caminho, 'rb') as compactado, open(copia, 'wb') as saida:
+            shutil.copyfileobj(compactado, saida, TAMANHO_BLOCO)
+        origem = sqlite3.connect(copia)
+        conexao = db.engine.raw_connection()
+        try:
+            origem.backup(conexao.driver_connection, pages=PAGINAS_POR_PASSO)
+        finally:
+            conexao.close()
+            origem.close()
+    finally:
+        os.remove(copia)
+    # Conexões do pool podem ter esquema/páginas do banco anterior em cache
+    db.engine.dispose()
+
+
+def _aplicar_incremental(caminho, conexao):
+    tabela = instrucao = colunas = conversores = None
+    lote = []
+
+    def gravar():
+        if lote:
+            conexao.execute(instrucao, lote)
+            lote.clear()
+
+    with gzip.open(caminho, 'rt', encoding='utf-8') as arquivo:
+        next(arquivo)  # cabeçalho
+        for texto in arquivo:
+            dados = json.loads(texto)
+            if isinstance(dados, list):
+                lote.append({
+                    coluna: converter(valor) if converter and valor is not None else valor
+                    for coluna, converter, valor in zip(colunas, conversores, dados)
+                })
+                if len(lote) >= TAMANHO_LOTE:
+                    gravar()
+            elif 'colunas' in dados:
+                gravar()
+                tabela = db.metadata.tables[dados['tabela']]
+                colunas = dados['colunas']
+                conversores = _conversores(tabela, colunas)
+                instrucao = insert(tabela).prefix_with('OR REPLACE')
+            else:
+                # Faixas de ids que existiam no backup: o resto foi excluído
+                gravar()
+                manter = set()
+                for inicio, fim in dados['ids']:
+                    manter.update(range(inicio, fim + 1))
+                excluidos = [id_linha for id_linha in conexao.execute(select(tabela.c.id)).scalars()
+                             if id_linha not in manter]
+                for inicio in range(0, len(excluidos), 500):
+                    conexao.execute(tabela.delete().where(tabela.c.id.in_(excluidos[inicio:inicio + 500])))
+
+
+def _avancar_versoes(anteriores):
+    """Versões de cache acima das de antes da restauração, para ETags e caches antigos não valerem"""
+    tabela = VersaoRecurso.__table__
+    agora = datetime.utcnow()
+    with db.engine.begin() as conexao:
+        atuais = dict(conexao.execute(select(tabela.c.recurso, tabela.c.versao)).all())
+        for recurso in set(anteriores) | set(atuais):
+            versao = max(anteriores.get(recurso, 0), atuais.get(recurso, 0)) + 1
+            conexao.execute(sqlite_insert(tabela).values(
+                recurso=recurso, versao=versao, data_atualizacao=agora
+            ).on_conflict_do_update(
+                index_elements=['recurso'], set_={'versao': versao, 'data_atualizacao': agora}
+            ))
+
+
+def restaurar(nome):
+    """Restaura o banco até o backup `nome` (completo ou incremental).
+
+    Confere o SHA-256 de todos os arquivos da cadeia antes de alterar o
+    banco. Os trabalhadores de envio ficam pausados durante a restauração e
+    o escritor em lote é descarregado antes dela, para que nenhuma gravação
+    pendente caia no banco restaurado. Retorna os nomes aplicados, em ordem.
+    """
+    from src.services.escritor_lote import escritor_lote
+    from src.services.whatsapp_service import whatsapp_service
+
+    with _lock:
+        cadeia = _cadeia(nome)
+        for entrada in cadeia:
+            if not verificar(entrada['nome']):
+                raise ErroBackup(f"Arquivo {entrada['nome']} ausente ou corrompido (SHA-256 não confere)")
+
+        with whatsapp_service.pausado():
+            escritor_lote.descarregar()
+
+            db.session.remove()
+            anteriores = dict(db.session.execute(select(VersaoRecurso.recurso, VersaoRecurso.versao)).all())
+            db.session.remove()
+
+            _restaurar_completo(os.path.join(diretorio(), cadeia[0]['nome']))
+            if len(cadeia) > 1:
+                from src.services import busca, resumo_diario
+                with db.engine.begin() as conexao:
+                    for entrada in cadeia[1:]:
+                        _aplicar_incremental(os.path.join(diretorio(), entrada['nome']), conexao)
+                    resumo_diario.reconstruir(conexao)
+                    # INSERT OR REPLACE não dispara o trigger de exclusão da busca
+                    busca.reconstruir(conexao)
+
+            _avancar_versoes(anteriores)
+            dashboard.invalidar()
+            db.session.commit()
+    return [entrada['nome'] for entrada in cadeia]
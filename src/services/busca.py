@@ -0,0 +1,111 @@
+"""
+Busca textual (SQLite FTS5) em clientes e logs de mensagem
+
+clientes_fts indexa nome, telefone, plano e comentários; logs_mensagem_fts
+indexa o texto da mensagem e o detalhe do erro. São tabelas FTS5 de
+conteúdo externo (o texto fica só na tabela original) mantidas por
+triggers criados na migração 5; `flask reconstruir-busca` refaz os índices
+a partir das tabelas.
+
+O texto digitado vira uma consulta com um prefixo por palavra ("joao sil"
+encontra "João Silva"), sem acentos e sem diferenciar maiúsculas, e os
+resultados são ordenados por relevância (bm25). Nos logs, o bm25 é
+calculado só para os JANELA_RELEVANCIA logs mais recentes que casam com a
+busca e os filtros: um termo comum casa com quase toda a tabela e ordenar
+tudo por relevância custaria segundos.
+"""
+import re
+from sqlalchemy import column, func, literal_column, table
+from src.models.user import db
+
+TOKENIZADOR = "unicode61 remove_diacritics 2"
+
+# (tabela FTS, tabela de origem, colunas indexadas, pesos no bm25)
+INDICES = {
+    'clientes': ('clientes_fts', 'clientes',
+                 ('nome_completo', 'telefone', 'plano_contratado', 'comentarios'), (10.0, 8.0, 2.0, 1.0)),
+    'logs_mensagem': ('logs_mensagem_fts', 'logs_mensagem',
+                      ('mensagem', 'erro_detalhes'), (1.0, 2.0)),
+}
+
+JANELA_RELEVANCIA = 5000
+
+PALAVRA = re.compile(r'\w+', re.UNICODE)
+
+
+class BuscaInvalida(ValueError):
+    pass
+
+
+def expressao(texto):
+    """Consulta FTS5 (prefixo por palavra, todas obrigatórias) para o texto digitado"""
+    palavras = PALAVRA.findall(texto or '')
+    if not palavras:
+        raise BuscaInvalida('Informe ao menos uma palavra ou número para a busca')
+    # Entre aspas, cada palavra é literal: operadores do FTS5 não passam
+    return ' '.join(f'"{palavra}"*' for palavra in palavras)
+
+
+def filtrar(query, indice, coluna_id, texto):
+    """Restringe `query` às linhas que casam com o texto.
+
+    Retorna (query, relevancia), sendo `relevancia` a expressão bm25 para
+    ORDER BY (menor = mais relevante).
+    """
+    nome_fts, _, _, pesos = INDICES[indice]
+    fts = table(nome_fts, column('rowid'))
+    relevancia = func.bm25(literal_column(nome_fts), *pesos)
+    query = query.join(fts, fts.c.rowid == coluna_id).filter(
+        literal_column(nome_fts).op('MATCH')(expressao(texto))
+    )
+    return query, relevancia
+
+
+def recentes(query, indice, coluna_id, texto, janela=JANELA_RELEVANCIA):
+    """Ids das `janela` linhas mais recentes de `query` que casam com o
+    texto, do mais relevante para o menos relevante.
+
+    O índice FTS é percorrido do rowid maior para o menor e para na janela,
+    então o custo não cresce com o número total de correspondências.
+    """
+    nome_fts = INDICES[indice][0]
+    query, relevancia = filtrar(query, indice, coluna_id, texto)
+    linhas = query.with_entities(coluna_id, relevancia).order_by(
+        literal_column(f'{nome_fts}.rowid').desc()
+    ).limit(janela).all()
+    linhas.sort(key=lambda linha: (linha[1], -linha[0]))
+    return [id_ for id_, _ in linhas]
+
+
+def criar(conexao):
+    """Cria as tabelas FTS5 e os triggers que as acompanham (idempotente)"""
+    for nome_fts, origem, colunas, _ in INDICES.values():
+        lista = ', '.join(colunas)
+        novos = ', '.join(f'new.{coluna}' for coluna in colunas)
+        antigos = ', '.join(f'old.{coluna}' for coluna in colunas)
+        conexao.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {nome_fts} USING fts5("
+            f"{lista}, content='{origem}', content_rowid='id', tokenize='{TOKENIZADOR}')"
+        )
+        conexao.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {nome_fts}_insert AFTER INSERT ON {origem} BEGIN "
+            f"INSERT INTO {nome_fts}(rowid, {lista}) VALUES (new.id, {novos}); END"
+        )
+        conexao.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {nome_fts}_delete AFTER DELETE ON {origem} BEGIN "
+            f"INSERT INTO {nome_fts}({nome_fts}, rowid, {lista}) VALUES ('delete', old.id, {antigos}); END"
+        )
+        # Só quando uma coluna indexada muda: mudanças de status dos logs
+        # não mexem no índice
+        conexao.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {nome_fts}_update AFTER UPDATE OF {lista} ON {origem} BEGIN "
+            f"INSERT INTO {nome_fts}({nome_fts}, rowid, {lista}) VALUES ('delete', old.id, {antigos}); "
+            f"INSERT INTO {nome_fts}(rowid, {lista}) VALUES (new.id, {novos}); END"
+        )
+
+
+def reconstruir(conexao=None):
+    """Refaz os índices de busca a partir de clientes e logs_mensagem"""
+    conexao = conexao or db.session
+    for nome_fts, _, _, _ in INDICES.values():
+        conexao.execute(db.text(f"INSERT INTO {nome_fts}({nome_fts}) VALUES ('rebuild')"))
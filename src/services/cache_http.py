@@ -0,0 +1,76 @@
+"""
+GET condicional (ETag / Last-Modified) para listagens e dashboard
+
+O ETag é derivado das versões dos recursos em versoes_recursos (um contador
+incrementado a cada escrita) e da URL. Quando o navegador reenvia o ETag em
+If-None-Match e nada mudou, a resposta é um 304 vazio: a consulta e a
+serialização do endpoint nem chegam a rodar.
+"""
+import hashlib
+from datetime import timezone
+from functools import wraps
+from flask import request, make_response, Response
+from src.models.user import db
+from src.models.versao_recurso import VersaoRecurso
+
+
+def versoes(recursos):
+    """[(recurso, versao, data_atualizacao)] em uma única consulta"""
+    linhas = {
+        recurso: (versao, data_atualizacao)
+        for recurso, versao, data_atualizacao in db.session.query(
+            VersaoRecurso.recurso, VersaoRecurso.versao, VersaoRecurso.data_atualizacao
+        ).filter(VersaoRecurso.recurso.in_(recursos)).all()
+    }
+    return [(recurso,) + linhas.get(recurso, (0, None)) for recurso in recursos]
+
+
+def _etag(estado):
+    base = repr((request.path, sorted(request.args.items(multi=True)), estado))
+    return hashlib.sha1(base.encode()).hexdigest()[:20]
+
+
+def _nao_modificado(etag, ultima_modificacao):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if ultima_modificacao and request.if_modified_since:
+        return ultima_modificacao.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def condicional(*recursos, chave=None):
+    """Decorator de GET condicional.
+
+    `recursos` são nomes em versoes_recursos; `chave`, se informada, é uma
+    função cujo resultado também entra no ETag (por exemplo o dia, para
+    dados que dependem da data). Last-Modified só é enviado quando há
+    recursos e nenhuma chave.
+    """
+    def decorador(funcao):
+        @wraps(funcao)
+        def envolvida(*args, **kwargs):
+            estado = versoes(recursos) if recursos else []
+            extra = chave() if chave else None
+            etag = _etag(([versao for _, versao, _ in estado], extra))
+
+            ultima_modificacao = None
+            if estado and chave is None:
+                datas = [data for _, _, data in estado if data]
+                if datas:
+                    ultima_modificacao = max(datas).replace(tzinfo=timezone.utc)
+
+            if _nao_modificado(etag, ultima_modificacao):
+                resposta = Response(status=304)
+            else:
+                resposta = make_response(funcao(*args, **kwargs))
+                if resposta.status_code != 200:
+                    return resposta
+
+            resposta.set_etag(etag, weak=True)
+            if ultima_modificacao:
+                resposta.last_modified = ultima_modificacao
+            # O navegador pode guardar, mas sempre revalida
+            resposta.cache_control.no_cache = True
+            return resposta
+        return envolvida
+    return decorador
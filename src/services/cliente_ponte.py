@@ -0,0 +1,141 @@
+"""
+Cliente HTTP da ponte Node do WhatsApp
+
+Usa uma única sessão com pool de conexões keep-alive, timeouts separados de
+conexão e leitura e novas tentativas limitadas, com backoff e jitter. Os
+GETs (/status, /qr, /health) são repetidos também em erros de leitura e
+respostas 502/503/504; o POST de envio só é repetido quando a conexão nem
+chegou a ser estabelecida, para não duplicar mensagens.
+"""
+import threading
+import time
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.retry import Retry
+
+
+def falhou_antes_do_envio(erro):
+    """Se a requisição com `erro` certamente não chegou à ponte.
+
+    Só a falha ao abrir a conexão (recusada, sem rota, timeout de conexão)
+    garante isso. Timeout de leitura e conexão derrubada no meio da resposta
+    deixam em aberto se a ponte recebeu o pedido.
+    """
+    if isinstance(erro, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(erro, requests.exceptions.ConnectionError) or not erro.args:
+        return False
+    # Com novas tentativas esgotadas, o urllib3 embrulha a causa em MaxRetryError
+    causa = getattr(erro.args[0], 'reason', erro.args[0])
+    # NewConnectionError (e NameResolutionError) derivam de ConnectTimeoutError
+    return isinstance(causa, ConnectTimeoutError)
+
+
+class ClientePonteWhatsApp:
+    def __init__(self, base_url, tempo_conexao=3.05, tempo_leitura=10, tempo_leitura_envio=30,
+                 tentativas=3, fator_espera=0.3, jitter=0.2, tamanho_pool=10):
+        self.base_url = base_url.rstrip('/')
+        self.tempo_conexao = tempo_conexao
+        self.tempo_leitura = tempo_leitura
+        self.tempo_leitura_envio = tempo_leitura_envio
+
+        retry = Retry(
+            total=tentativas,
+            connect=tentativas,
+            read=tentativas,
+            status=tentativas,
+            backoff_factor=fator_espera,
+            backoff_jitter=jitter,
+            status_forcelist=(502, 503, 504),
+            # Métodos fora desta lista só são repetidos em erro de conexão
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False,
+            respect_retry_after_header=True
+        )
+        adaptador = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=tamanho_pool,
+            pool_block=False,
+            max_retries=retry
+        )
+
+        self.sessao = requests.Session()
+        self.sessao.mount('http://', adaptador)
+        self.sessao.mount('https://', adaptador)
+
+        self._lock = threading.Lock()
+        self._metricas = {}
+
+    def status(self):
+        return self.requisitar('GET', '/status')
+
+    def qr(self):
+        return self.requisitar('GET', '/qr')
+
+    def saude(self):
+        return self.requisitar('GET', '/health', tempo_leitura=5)
+
+    def enviar_mensagem(self, numero, mensagem):
+        return self.requisitar(
+            'POST', '/send-message',
+            json={'number': numero, 'message': mensagem},
+            tempo_leitura=self.tempo_leitura_envio
+        )
+
+    def requisitar(self, metodo, caminho, tempo_leitura=None, **kwargs):
+        """Executa a requisição registrando latência, erros e novas tentativas"""
+        timeout = (self.tempo_conexao, tempo_leitura or self.tempo_leitura)
+        inicio = time.monotonic()
+        try:
+            response = self.sessao.request(metodo, f"{self.base_url}{caminho}", timeout=timeout, **kwargs)
+        except Exception:
+            self._registrar(caminho, time.monotonic() - inicio, sucesso=False, repeticoes=0)
+            raise
+
+        retries = getattr(response.raw, 'retries', None)
+        repeticoes = len(retries.history) if retries else 0
+        self._registrar(caminho, time.monotonic() - inicio, response.status_code < 400, repeticoes)
+        return response
+
+    def estatisticas(self):
+        """Latência (ms) e contadores por endpoint"""
+        with self._lock:
+            resultado = {}
+            for caminho, metrica in self._metricas.items():
+                latencias = sorted(metrica['latencias'])
+                resultado[caminho] = {
+                    'chamadas': metrica['chamadas'],
+                    'erros': metrica['erros'],
+                    'repeticoes': metrica['repeticoes'],
+                    'latencia_media_ms': round(sum(latencias) / len(latencias), 1) if latencias else 0,
+                    'latencia_p50_ms': self._percentil(latencias, 50),
+                    'latencia_p95_ms': self._percentil(latencias, 95),
+                    'latencia_max_ms': round(latencias[-1], 1) if latencias else 0
+                }
+            return resultado
+
+    def fechar(self):
+        self.sessao.close()
+
+    def _registrar(self, caminho, duracao, sucesso, repeticoes):
+        with self._lock:
+            metrica = self._metricas.setdefault(caminho, {
+                'chamadas': 0,
+                'erros': 0,
+                'repeticoes': 0,
+                'latencias': deque(maxlen=200)
+            })
+            metrica['chamadas'] += 1
+            metrica['repeticoes'] += repeticoes
+            if not sucesso:
+                metrica['erros'] += 1
+            metrica['latencias'].append(duracao * 1000)
+
+    @staticmethod
+    def _percentil(valores, percentil):
+        if not valores:
+            return 0
+        indice = min(len(valores) - 1, int(round(percentil / 100 * (len(valores) - 1))))
+        return round(valores[indice], 1)
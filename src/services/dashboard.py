@@ -0,0 +1,116 @@
+"""
+Dados do dashboard de clientes, calculados para todos os produtos de uma vez
+
+Uma consulta agrupada por tipo_produto, com agregação condicional, substitui
+as cinco consultas por produto; as renovações do mês vêm do resumo diário.
+O resultado fica em cache por até TEMPO_VIDA segundos, junto com as versões
+de clientes e renovações (versoes_recursos) lidas na mesma transação do
+cálculo. Escritas nesses recursos chamam `invalidar()` antes do commit, o
+que só incrementa as versões; cada leitura confere as versões antes de
+servir o cache. Assim, um cálculo feito antes do commit de outra escrita
+fica guardado com as versões antigas e não é servido depois dele, neste
+processo ou em outros.
+"""
+import copy
+import threading
+import time
+from datetime import date, timedelta
+from sqlalchemy import case, func
+from src.models.user import db
+from src.models.cliente import Cliente
+from src.models.resumo_diario import ResumoRenovacaoDiario
+from src.models.versao_recurso import VersaoRecurso
+
+PRODUTOS = ('IPTV', 'VPN', 'OUTROS')
+RECURSOS = ('clientes', 'renovacoes')
+TEMPO_VIDA = 30.0
+
+_cache = {'chave': None, 'dados': None, 'calculado_em': 0.0}
+_cache_lock = threading.Lock()
+
+
+def _versoes():
+    linhas = dict(db.session.query(VersaoRecurso.recurso, VersaoRecurso.versao).filter(
+        VersaoRecurso.recurso.in_(RECURSOS)
+    ).all())
+    return tuple(linhas.get(recurso, 0) for recurso in RECURSOS)
+
+
+def calcular(hoje=None):
+    """Dados do dashboard por produto, sem passar pelo cache"""
+    if hoje is None:
+        hoje = date.today()
+    data_limite = hoje + timedelta(days=7)
+    primeiro_dia_mes = hoje.replace(day=1)
+
+    ativo = Cliente.ativo == True
+    linhas = db.session.query(
+        Cliente.tipo_produto,
+        func.sum(case((ativo, 1), else_=0)),
+        func.sum(case((ativo & (Cliente.data_vencimento < hoje), 1), else_=0)),
+        func.sum(case((ativo & Cliente.data_vencimento.between(hoje, data_limite), 1), else_=0)),
+        func.sum(case((ativo, Cliente.valor_plano)))
+    ).filter(Cliente.tipo_produto.in_(PRODUTOS)).group_by(Cliente.tipo_produto).all()
+
+    renovacoes = dict(db.session.query(
+        ResumoRenovacaoDiario.tipo_produto,
+        func.sum(ResumoRenovacaoDiario.quantidade)
+    ).filter(
+        ResumoRenovacaoDiario.tipo_produto.in_(PRODUTOS),
+        ResumoRenovacaoDiario.dia >= primeiro_dia_mes
+    ).group_by(ResumoRenovacaoDiario.tipo_produto).all())
+
+    dados = {
+        produto: {
+            'tipo_produto': produto,
+            'clientes_ativos': 0,
+            'clientes_vencidos': 0,
+            'clientes_vencendo': 0,
+            'receita_total': 0,
+            'renovacoes_mes': renovacoes.get(produto) or 0
+        }
+        for produto in PRODUTOS
+    }
+    for produto, ativos, vencidos, vencendo, receita in linhas:
+        dados[produto].update({
+            'clientes_ativos': ativos or 0,
+            'clientes_vencidos': vencidos or 0,
+            'clientes_vencendo': vencendo or 0,
+            'receita_total': receita or 0
+        })
+    return dados
+
+
+def chave_atual():
+    """Chave (versões, dia) dos dados que obter() devolveria agora; usada no ETag"""
+    return (_versoes(), date.today())
+
+
+def obter():
+    """Dados do dashboard por produto, reaproveitando o cache quando válido.
+
+    O resultado é uma cópia; quem chamou pode alterá-lo à vontade.
+    """
+    global _cache
+    cache = _cache
+    chave = chave_atual()
+    agora = time.monotonic()
+
+    if cache['dados'] is not None and cache['chave'] == chave \
+            and agora - cache['calculado_em'] < TEMPO_VIDA:
+        return copy.deepcopy(cache['dados'])
+
+    dados = calcular(chave[1])
+    with _cache_lock:
+        _cache = {'chave': chave, 'dados': dados, 'calculado_em': agora}
+    return copy.deepcopy(dados)
+
+
+def invalidar(*recursos):
+    """Incrementa a versão dos recursos alterados na transação corrente.
+
+    Deve ser chamado antes do commit de escritas em clientes ou renovações;
+    o cache deixa de valer quando o commit torna a nova versão visível.
+    """
+    for recurso in recursos or RECURSOS:
+        VersaoRecurso.incrementar(recurso)
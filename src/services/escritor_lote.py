@@ -0,0 +1,197 @@
+"""
+Escritor em lote (group commit) para as gravações frequentes do envio
+
+Logs de mensagem, transições de status, remoções/reagendamentos da fila e a
+marcação de ultima_mensagem_enviada são acumulados em memória e gravados por
+uma única thread, com executemany, quando o buffer enche ou o intervalo
+expira. Assim cada mensagem não paga um commit (e um fsync) próprio nem
+disputa o lock de escrita do SQLite com as requisições da API.
+"""
+import atexit
+import threading
+from datetime import datetime
+from sqlalchemy import insert, update, delete, bindparam
+from src.models.user import db
+from src.models.cliente import Cliente
+from src.models.log_mensagem import LogMensagem
+from src.models.fila_envio import FilaEnvio
+from src.models.versao_recurso import VersaoRecurso
+from src.services import resumo_diario
+
+_logs = LogMensagem.__table__
+_clientes = Cliente.__table__
+_fila = FilaEnvio.__table__
+
+# Instruções fixas: todas as linhas de um mesmo tipo têm as mesmas colunas,
+# o que permite um único executemany por tipo. Nos UPDATEs as colunas do SET
+# vêm das chaves dos parâmetros.
+INSERIR_LOG = insert(_logs)
+ATUALIZAR_LOG = update(_logs).where(_logs.c.id == bindparam('b_id'))
+MARCAR_ENVIO_CLIENTE = update(_clientes).where(_clientes.c.id == bindparam('b_id'))
+REMOVER_DA_FILA = delete(_fila).where(_fila.c.id == bindparam('b_id'))
+REAGENDAR_NA_FILA = update(_fila).where(_fila.c.id == bindparam('b_id'))
+
+CAMPOS_LOG = ('cliente_id', 'telefone_destino', 'mensagem', 'status', 'tipo_notificacao',
+              'data_agendamento', 'data_envio', 'erro_detalhes', 'tentativas', 'data_criacao')
+
+# Ordem de gravação dentro de um lote
+ORDEM = (INSERIR_LOG, ATUALIZAR_LOG, REAGENDAR_NA_FILA, REMOVER_DA_FILA)
+
+
+class EscritorLote:
+    def __init__(self, tamanho_maximo=200, intervalo=1.0):
+        self.app = None
+        self.tamanho_maximo = tamanho_maximo
+        self.intervalo = intervalo
+        self._cond = threading.Condition()
+        self._pendentes = {instrucao: [] for instrucao in ORDEM}
+        self._envios_cliente = {}  # cliente_id -> instante (só o mais recente importa)
+        self._total = 0
+        self._thread = None
+        self._ativo = False
+        self._lock_gravacao = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        atexit.register(self.parar)
+
+    def registrar_log(self, **campos):
+        """Agenda a inserção de um LogMensagem"""
+        if campos.get('cliente_id') is None:
+            # cliente_id é obrigatório na tabela; a linha derrubaria o lote inteiro
+            return
+        campos.setdefault('data_criacao', datetime.utcnow())
+        campos.setdefault('tentativas', 0)
+        self._adicionar(INSERIR_LOG, {campo: campos.get(campo) for campo in CAMPOS_LOG})
+
+    def atualizar_log(self, log_id, status, data_envio=None, erro_detalhes=None, tentativas=0):
+        """Agenda a transição de status de um LogMensagem"""
+        self._adicionar(ATUALIZAR_LOG, {
+            'b_id': log_id,
+            'status': status,
+            'data_envio': data_envio,
+            'erro_detalhes': erro_detalhes,
+            'tentativas': tentativas
+        })
+
+    def marcar_mensagem_enviada(self, cliente_id, instante):
+        """Agenda a atualização de ultima_mensagem_enviada do cliente"""
+        with self._cond:
+            self._envios_cliente[cliente_id] = instante
+            self._notificar()
+
+    def remover_da_fila(self, item_id):
+        self._adicionar(REMOVER_DA_FILA, {'b_id': item_id})
+
+    def reagendar_na_fila(self, item_id, tentativas, ultimo_erro, nao_antes_de):
+        self._adicionar(REAGENDAR_NA_FILA, {
+            'b_id': item_id,
+            'tentativas': tentativas,
+            'ultimo_erro': ultimo_erro,
+            'nao_antes_de': nao_antes_de,
+            'bloqueado_ate': None,
+            'trabalhador': None
+        })
+
+    def descarregar(self):
+        """Grava imediatamente tudo o que está no buffer.
+
+        O buffer é trocado já com o lock de gravação: duas descargas
+        simultâneas gravam na ordem em que esvaziaram o buffer, e uma
+        transição de status mais nova nunca é sobrescrita pela anterior.
+        """
+        with self._lock_gravacao:
+            with self._cond:
+                pendentes = self._pendentes
+                envios_cliente = self._envios_cliente
+                self._pendentes = {instrucao: [] for instrucao in ORDEM}
+                self._envios_cliente = {}
+                self._total = 0
+
+            if not envios_cliente and not any(pendentes.values()):
+                return 0
+
+            lotes = [(instrucao, pendentes[instrucao]) for instrucao in ORDEM if pendentes[instrucao]]
+            if envios_cliente:
+                lotes.append((MARCAR_ENVIO_CLIENTE, [
+                    {'b_id': cliente_id, 'ultima_mensagem_enviada': instante, 'data_atualizacao': instante}
+                    for cliente_id, instante in envios_cliente.items()
+                ]))
+
+            with self.app.app_context():
+                try:
+                    with db.engine.begin() as conexao:
+                        for instrucao, parametros in lotes:
+                            self._executar(conexao, instrucao, parametros)
+                except Exception as e:
+                    print(f"Erro ao gravar lote, regravando linha a linha: {str(e)}")
+                    self._gravar_individualmente(lotes)
+
+        return sum(len(parametros) for _, parametros in lotes)
+
+    def parar(self):
+        """Para a thread de gravação e descarrega o buffer"""
+        with self._cond:
+            self._ativo = False
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=10)
+        if self.app:
+            self.descarregar()
+
+    def pendentes(self):
+        with self._cond:
+            return self._total + len(self._envios_cliente)
+
+    def _adicionar(self, instrucao, parametros):
+        with self._cond:
+            self._pendentes[instrucao].append(parametros)
+            self._total += 1
+            self._notificar()
+
+    def _notificar(self):
+        # Chamado com o lock adquirido
+        if not self._ativo:
+            self._ativo = True
+            self._thread = threading.Thread(target=self._loop, name='escritor-lote', daemon=True)
+            self._thread.start()
+        if self._total + len(self._envios_cliente) >= self.tamanho_maximo:
+            self._cond.notify_all()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                if not self._ativo:
+                    break
+                if self._total + len(self._envios_cliente) < self.tamanho_maximo:
+                    self._cond.wait(self.intervalo)
+            try:
+                self.descarregar()
+            except Exception as e:
+                print(f"Erro no escritor em lote: {str(e)}")
+
+    def _executar(self, conexao, instrucao, parametros):
+        # Os resumos diários acompanham os logs na mesma transação
+        if instrucao is INSERIR_LOG:
+            resumo_diario.registrar_logs_inseridos(parametros, conexao)
+        elif instrucao is ATUALIZAR_LOG:
+            resumo_diario.registrar_transicoes_logs(
+                [(linha['b_id'], linha['status']) for linha in parametros], conexao
+            )
+        elif instrucao is MARCAR_ENVIO_CLIENTE:
+            VersaoRecurso.incrementar('clientes', conexao)
+        conexao.execute(instrucao, parametros)
+
+    def _gravar_individualmente(self, lotes):
+        """Isola linhas inválidas para não perder o restante do lote"""
+        for instrucao, parametros in lotes:
+            for linha in parametros:
+                try:
+                    with db.engine.begin() as conexao:
+                        self._executar(conexao, instrucao, [linha])
+                except Exception as e:
+                    print(f"Linha descartada pelo escritor em lote: {str(e)}")
+
+
+# Instância global do escritor
+escritor_lote = EscritorLote()
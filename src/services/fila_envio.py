@@ -0,0 +1,201 @@
+"""
+Fila persistente de envio (outbox) das mensagens de WhatsApp
+
+Produtores enfileiram em lote; trabalhadores reivindicam lotes com lease,
+o que permite que várias threads ou processos esvaziem a fila sem enviar a
+mesma mensagem duas vezes. Cada item aponta para um LogMensagem, que passa
+de 'pendente' para 'enviada' ou 'falha' conforme o resultado.
+"""
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import insert, update, select, or_, func
+from src.models.user import db
+from src.models.log_mensagem import LogMensagem
+from src.models.fila_envio import FilaEnvio
+from src.services.escritor_lote import escritor_lote
+from src.services import resumo_diario
+from src.services import telefone
+
+
+def enfileirar_lote(itens):
+    """Enfileira mensagens e cria seus logs pendentes em uma única transação.
+
+    Cada item é um dicionário com cliente_id, telefone_destino, mensagem e,
+    opcionalmente, tipo_notificacao, prioridade e nao_antes_de.
+    """
+    if not itens:
+        return 0
+
+    agora = datetime.utcnow()
+    try:
+        logs = [{
+            'cliente_id': item['cliente_id'],
+            'telefone_destino': item['telefone_destino'],
+            'mensagem': item['mensagem'],
+            'status': 'pendente',
+            'tipo_notificacao': item.get('tipo_notificacao', 'automatica'),
+            'data_agendamento': item.get('nao_antes_de') or agora,
+            'tentativas': 0,
+            'data_criacao': agora
+        } for item in itens]
+
+        log_ids = db.session.scalars(
+            insert(LogMensagem).returning(LogMensagem.id, sort_by_parameter_order=True),
+            logs
+        ).all()
+        resumo_diario.registrar_logs_inseridos(logs)
+
+        db.session.execute(insert(FilaEnvio), [{
+            'cliente_id': item['cliente_id'],
+            'log_mensagem_id': log_id,
+            'telefone_destino': item['telefone_destino'],
+            'mensagem': item['mensagem'],
+            'tipo_notificacao': item.get('tipo_notificacao', 'automatica'),
+            'prioridade': item.get('prioridade', 0),
+            'nao_antes_de': item.get('nao_antes_de') or agora,
+            'tentativas': 0,
+            'data_criacao': agora
+        } for item, log_id in zip(itens, log_ids)])
+
+        db.session.commit()
+        return len(itens)
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def reenfileirar_log(log, prioridade=1):
+    """Coloca de volta na fila a mensagem de um log existente (reenvio)"""
+    item = FilaEnvio(
+        cliente_id=log.cliente_id,
+        log_mensagem_id=log.id,
+        telefone_destino=log.telefone_destino,
+        mensagem=log.mensagem,
+        tipo_notificacao=log.tipo_notificacao,
+        prioridade=prioridade,
+        tentativas=0
+    )
+    db.session.add(item)
+    return item
+
+
+def clientes_na_fila():
+    """IDs de clientes que já têm mensagem aguardando envio"""
+    return set(db.session.scalars(select(FilaEnvio.cliente_id).distinct()).all())
+
+
+def numeros_na_fila():
+    """Telefones normalizados que já têm mensagem aguardando envio"""
+    return {
+        telefone.normalizar(numero)
+        for numero in db.session.scalars(select(FilaEnvio.telefone_destino).distinct())
+    }
+
+
+def reivindicar_lote(tamanho=10, duracao_lease=300):
+    """Reivindica até `tamanho` itens vencidos, com lease de `duracao_lease` segundos.
+
+    A marcação é feita por um único UPDATE, de modo que dois trabalhadores
+    nunca recebem o mesmo item enquanto o lease estiver válido. Itens cujo
+    lease expirou (trabalhador que caiu) voltam a ser elegíveis.
+    """
+    agora = datetime.utcnow()
+    token = uuid.uuid4().hex
+    bloqueado_ate = agora + timedelta(seconds=duracao_lease)
+
+    try:
+        candidatos = select(FilaEnvio.id).where(
+            FilaEnvio.nao_antes_de <= agora,
+            or_(FilaEnvio.bloqueado_ate.is_(None), FilaEnvio.bloqueado_ate < agora)
+        ).order_by(
+            FilaEnvio.prioridade.desc(),
+            FilaEnvio.nao_antes_de.asc(),
+            FilaEnvio.id.asc()
+        ).limit(tamanho)
+
+        db.session.execute(
+            update(FilaEnvio)
+            .where(FilaEnvio.id.in_(candidatos.scalar_subquery()))
+            .values(bloqueado_ate=bloqueado_ate, trabalhador=token)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return FilaEnvio.query.filter_by(trabalhador=token).order_by(
+        FilaEnvio.prioridade.desc(),
+        FilaEnvio.nao_antes_de.asc(),
+        FilaEnvio.id.asc()
+    ).all()
+
+
+def liberar(itens):
+    """Devolve itens reivindicados à fila sem contar tentativa"""
+    ids = [item.id for item in itens]
+    if not ids:
+        return
+    db.session.execute(
+        update(FilaEnvio)
+        .where(FilaEnvio.id.in_(ids))
+        .values(bloqueado_ate=None, trabalhador=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def concluir(item):
+    """Remove o item da fila e marca o log como enviado.
+
+    As gravações vão para o escritor em lote; até ele descarregar, o lease
+    mantém o item fora do alcance de outros trabalhadores.
+    """
+    agora = datetime.utcnow()
+    tentativas = (item.tentativas or 0) + 1
+
+    if item.log_mensagem_id:
+        escritor_lote.atualizar_log(
+            item.log_mensagem_id, 'enviada', data_envio=agora, tentativas=tentativas
+        )
+    escritor_lote.marcar_mensagem_enviada(item.cliente_id, agora)
+    escritor_lote.remover_da_fila(item.id)
+
+
+def registrar_falha(item, erro, max_tentativas=3, espera_base=60):
+    """Registra uma tentativa falha, reagendando com backoff exponencial.
+
+    Ao atingir `max_tentativas` o item sai da fila e o log fica como 'falha'.
+    Retorna True se o item ainda será tentado novamente.
+    """
+    agora = datetime.utcnow()
+    tentativas = (item.tentativas or 0) + 1
+    nova_tentativa = tentativas < max_tentativas
+
+    if item.log_mensagem_id:
+        escritor_lote.atualizar_log(
+            item.log_mensagem_id,
+            'pendente' if nova_tentativa else 'falha',
+            erro_detalhes=erro,
+            tentativas=tentativas
+        )
+
+    if nova_tentativa:
+        escritor_lote.reagendar_na_fila(
+            item.id,
+            tentativas=tentativas,
+            ultimo_erro=erro,
+            nao_antes_de=agora + timedelta(seconds=espera_base * (2 ** (tentativas - 1)))
+        )
+    else:
+        escritor_lote.remover_da_fila(item.id)
+
+    return nova_tentativa
+
+
+def contar_pendentes(apenas_vencidos=False):
+    """Quantidade de itens na fila (opcionalmente só os já liberados para envio)"""
+    query = db.session.query(func.count(FilaEnvio.id))
+    if apenas_vencidos:
+        query = query.filter(FilaEnvio.nao_antes_de <= datetime.utcnow())
+    return query.scalar() or 0
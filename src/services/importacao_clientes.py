@@ -0,0 +1,292 @@
+"""
+Importação de clientes em lote (upsert pelo telefone normalizado)
+
+Recebe as linhas já lidas de JSON ou CSV, valida todas antes de gravar,
+busca os templates referenciados em uma única consulta e grava em blocos
+de TAMANHO_LOTE linhas: um INSERT ... RETURNING com executemany para os
+novos, um UPDATE com executemany para os que já existem (mesmo telefone,
+em qualquer formato),
+e um commit por bloco. Linhas inválidas não impedem as demais; cada uma
+volta no relatório com o número da linha e o motivo.
+
+O formato legado de data/clientes.json (nome, plano, valor, aviso_3_dias,
+horario_aviso_3_dias) é aceito e convertido para os campos atuais.
+"""
+import csv
+import io
+from datetime import datetime
+from sqlalchemy import insert, update, bindparam
+from src.models.user import db
+from src.models.cliente import Cliente
+from src.models.template_mensagem import TemplateMensagem
+from src.services import dashboard
+from src.services import resumo_diario
+from src.services import telefone
+
+TAMANHO_LOTE = 1000
+PRODUTOS = ('IPTV', 'VPN', 'OUTROS')
+
+CAMPOS_OBRIGATORIOS = ('nome_completo', 'telefone', 'tipo_produto',
+                       'plano_contratado', 'valor_plano', 'data_vencimento', 'horario_envio')
+CAMPOS_OPCIONAIS = ('template_mensagem_id', 'mensagem_personalizada', 'aviso_ativo',
+                    'dias_aviso_antecedencia', 'horario_aviso', 'comentarios', 'ativo')
+
+# Campos do formato antigo (data/clientes.json) -> campos atuais
+CAMPOS_LEGADOS = {
+    'nome': 'nome_completo',
+    'plano': 'plano_contratado',
+    'valor': 'valor_plano',
+    'aviso_3_dias': 'aviso_ativo',
+    'horario_aviso_3_dias': 'horario_aviso'
+}
+
+_clientes = Cliente.__table__
+ATUALIZAR_CLIENTE = update(_clientes).where(_clientes.c.id == bindparam('b_id'))
+
+
+class ErroLinha(ValueError):
+    pass
+
+
+def ler_csv(texto):
+    """Linhas de um CSV com cabeçalho; aceita ',' ou ';' como separador"""
+    amostra = texto[:4096]
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=',;')
+    except csv.Error:
+        dialeto = csv.excel
+    leitor = csv.DictReader(io.StringIO(texto), dialect=dialeto)
+    # Células vazias contam como campo não informado
+    return [
+        {campo.strip(): valor.strip() for campo, valor in linha.items() if campo and valor and valor.strip()}
+        for linha in leitor
+    ]
+
+
+def _booleano(valor, campo):
+    if isinstance(valor, bool):
+        return valor
+    if isinstance(valor, (int, float)):
+        return bool(valor)
+    texto = str(valor).strip().lower()
+    if texto in ('true', '1', 'yes', 'sim', 's'):
+        return True
+    if texto in ('false', '0', 'no', 'nao', 'não', 'n'):
+        return False
+    raise ErroLinha(f'Campo {campo} deve ser verdadeiro ou falso')
+
+
+def _inteiro(valor, campo):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ErroLinha(f'Campo {campo} deve ser um número inteiro')
+
+
+def _horario(valor, campo):
+    try:
+        return datetime.strptime(str(valor), '%H:%M').time()
+    except ValueError:
+        raise ErroLinha(f'Formato de horário inválido em {campo}. Use HH:MM')
+
+
+def normalizar(dados):
+    """Converte uma linha do formato legado para os nomes de campo atuais"""
+    linha = {}
+    for campo, valor in dados.items():
+        novo = CAMPOS_LEGADOS.get(campo, campo)
+        # O nome atual prevalece se a linha trouxer os dois
+        if novo != campo and novo in dados:
+            continue
+        linha[novo] = valor
+    if 'aviso_3_dias' in dados and 'dias_aviso_antecedencia' not in dados:
+        linha['dias_aviso_antecedencia'] = 3
+    return linha
+
+
+def validar(dados, templates):
+    """Valores do cliente prontos para gravar; ErroLinha se a linha for inválida.
+
+    `templates` é o conjunto de ids de templates existentes. Só os campos
+    opcionais presentes na linha entram no resultado.
+    """
+    if not isinstance(dados, dict):
+        raise ErroLinha('Linha deve ser um objeto')
+    dados = normalizar(dados)
+
+    for campo in CAMPOS_OBRIGATORIOS:
+        if campo not in dados or dados[campo] in (None, ''):
+            raise ErroLinha(f'Campo {campo} é obrigatório')
+
+    tipo_produto = str(dados['tipo_produto']).strip().upper()
+    if tipo_produto not in PRODUTOS:
+        raise ErroLinha('Tipo de produto deve ser IPTV, VPN ou OUTROS')
+
+    try:
+        valor_plano = float(str(dados['valor_plano']).replace(',', '.'))
+    except ValueError:
+        raise ErroLinha('Campo valor_plano deve ser numérico')
+
+    try:
+        data_vencimento = datetime.strptime(str(dados['data_vencimento']), '%Y-%m-%d').date()
+    except ValueError:
+        raise ErroLinha('Formato de data inválido em data_vencimento. Use YYYY-MM-DD')
+
+    telefone_normalizado = telefone.normalizar(dados['telefone'])
+    if not telefone_normalizado:
+        raise ErroLinha('Telefone inválido')
+
+    valores = {
+        'nome_completo': str(dados['nome_completo']).strip(),
+        'telefone': str(dados['telefone']).strip(),
+        'telefone_normalizado': telefone_normalizado,
+        'tipo_produto': tipo_produto,
+        'plano_contratado': str(dados['plano_contratado']).strip(),
+        'valor_plano': valor_plano,
+        'data_vencimento': data_vencimento,
+        'horario_envio': _horario(dados['horario_envio'], 'horario_envio')
+    }
+
+    if dados.get('template_mensagem_id') not in (None, ''):
+        template_mensagem_id = _inteiro(dados['template_mensagem_id'], 'template_mensagem_id')
+        if template_mensagem_id not in templates:
+            raise ErroLinha('Template de mensagem não encontrado')
+        valores['template_mensagem_id'] = template_mensagem_id
+    if 'mensagem_personalizada' in dados:
+        valores['mensagem_personalizada'] = dados['mensagem_personalizada'] or None
+    if 'aviso_ativo' in dados:
+        valores['aviso_ativo'] = _booleano(dados['aviso_ativo'], 'aviso_ativo')
+    if 'dias_aviso_antecedencia' in dados:
+        valores['dias_aviso_antecedencia'] = _inteiro(dados['dias_aviso_antecedencia'], 'dias_aviso_antecedencia')
+    if 'horario_aviso' in dados:
+        valores['horario_aviso'] = _horario(dados['horario_aviso'], 'horario_aviso') if dados['horario_aviso'] else None
+    if 'ativo' in dados:
+        valores['ativo'] = _booleano(dados['ativo'], 'ativo')
+    if dados.get('comentarios'):
+        valores['comentarios'] = dados['comentarios']
+    return valores
+
+
+def _templates_referenciados(linhas):
+    """Ids de templates citados nas linhas que existem, em uma consulta"""
+    ids = set()
+    for dados in linhas:
+        if isinstance(dados, dict) and dados.get('template_mensagem_id') not in (None, ''):
+            try:
+                ids.add(int(dados['template_mensagem_id']))
+            except (TypeError, ValueError):
+                pass
+    if not ids:
+        return set()
+    return set(db.session.scalars(
+        db.select(TemplateMensagem.id).where(TemplateMensagem.id.in_(ids))
+    ).all())
+
+
+def _existentes(telefones):
+    """telefone normalizado -> (id, tipo_produto) do cliente mais antigo com o número"""
+    existentes = {}
+    telefones = list(telefones)
+    for inicio in range(0, len(telefones), 500):
+        for cliente_id, numero, tipo_produto in db.session.query(
+            Cliente.id, Cliente.telefone_normalizado, Cliente.tipo_produto
+        ).filter(Cliente.telefone_normalizado.in_(telefones[inicio:inicio + 500])).order_by(Cliente.id.desc()):
+            existentes[numero] = (cliente_id, tipo_produto)
+    return existentes
+
+
+def _gravar_bloco(bloco, existentes, agora):
+    """Grava um bloco de (numero_linha, valores); retorna (criados, atualizados) em ids"""
+    novos = []
+    atualizacoes = {}  # colunas do SET -> parâmetros, um executemany por grupo
+    mudancas_produto = []
+    atualizados = []
+    for _, valores in bloco:
+        valores = dict(valores, data_atualizacao=agora)
+        if 'comentarios' in valores:
+            valores['data_ultimo_comentario'] = agora
+
+        existente = existentes.get(valores['telefone_normalizado'])
+        if existente is None:
+            # Todas as linhas do INSERT em executemany precisam das mesmas colunas
+            novo = {campo: None for campo in CAMPOS_OPCIONAIS}
+            novo.update(aviso_ativo=True, dias_aviso_antecedencia=3, ativo=True,
+                        data_ultimo_comentario=None, data_criacao=agora)
+            novo.update(valores)
+            novos.append(novo)
+            continue
+
+        cliente_id, produto_anterior = existente
+        if produto_anterior != valores['tipo_produto']:
+            mudancas_produto.append((cliente_id, produto_anterior, valores['tipo_produto']))
+        atualizacoes.setdefault(tuple(sorted(valores)), []).append(dict(valores, b_id=cliente_id))
+        atualizados.append(cliente_id)
+
+    criados = []
+    if novos:
+        criados = db.session.scalars(
+            insert(Cliente).returning(Cliente.id, sort_by_parameter_order=True), novos
+        ).all()
+    for parametros in atualizacoes.values():
+        db.session.execute(ATUALIZAR_CLIENTE, parametros)
+    for cliente_id, produto_anterior, produto_novo in mudancas_produto:
+        resumo_diario.mover_cliente(cliente_id, produto_anterior, produto_novo)
+    return list(criados), atualizados
+
+
+def importar(linhas, tamanho_lote=TAMANHO_LOTE):
+    """Valida e grava as linhas (upsert pelo telefone normalizado).
+
+    Retorna {'criados', 'atualizados', 'erros', 'ids'}; `erros` lista
+    {'linha', 'telefone', 'erro'} com a linha contada a partir de 1 e `ids`
+    são os clientes criados ou alterados, para o reagendamento.
+    """
+    templates = _templates_referenciados(linhas)
+
+    validas = []
+    erros = []
+    vistos = {}
+    for numero, dados in enumerate(linhas, start=1):
+        try:
+            valores = validar(dados, templates)
+        except ErroLinha as e:
+            erros.append({
+                'linha': numero,
+                'telefone': dados.get('telefone') if isinstance(dados, dict) else None,
+                'erro': str(e)
+            })
+            continue
+        if valores['telefone_normalizado'] in vistos:
+            erros.append({
+                'linha': numero,
+                'telefone': valores['telefone'],
+                'erro': f"Telefone repetido na importação (linha {vistos[valores['telefone_normalizado']]})"
+            })
+            continue
+        vistos[valores['telefone_normalizado']] = numero
+        validas.append((numero, valores))
+
+    existentes = _existentes(vistos)
+    criados = 0
+    atualizados = 0
+    ids = []
+    for inicio in range(0, len(validas), tamanho_lote):
+        bloco = validas[inicio:inicio + tamanho_lote]
+        try:
+            ids_criados, ids_atualizados = _gravar_bloco(bloco, existentes, datetime.utcnow())
+            dashboard.invalidar('clientes')
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            erros.extend(
+                {'linha': numero, 'telefone': valores['telefone'], 'erro': str(e)}
+                for numero, valores in bloco
+            )
+            continue
+        criados += len(ids_criados)
+        atualizados += len(ids_atualizados)
+        ids.extend(ids_criados)
+        ids.extend(ids_atualizados)
+
+    erros.sort(key=lambda erro: erro['linha'])
+    return {'criados': criados, 'atualizados': atualizados, 'erros': erros, 'ids': ids}
@@ -0,0 +1,132 @@
+"""
+Limitador de taxa adaptativo (token bucket com ajuste AIMD) para o envio
+de mensagens pelo WhatsApp
+
+A taxa sobe aos poucos enquanto a ponte responde bem (aumento aditivo) e cai
+pela metade quando surgem erros ou a latência passa do alvo (redução
+multiplicativa).
+"""
+import threading
+import time
+from collections import deque
+
+
+class LimitadorTaxa:
+    def __init__(self, taxa_por_minuto=12, rajada=3, taxa_minima=2, taxa_maxima=30,
+                 latencia_alvo_ms=3000, incremento=1, fator_reducao=0.5):
+        self._lock = threading.Condition()
+        self.taxa_minima = float(taxa_minima)
+        self.taxa_maxima = float(taxa_maxima)
+        self.taxa_atual = min(max(float(taxa_por_minuto), self.taxa_minima), self.taxa_maxima)
+        self.rajada = max(1, int(rajada))
+        self.latencia_alvo_ms = float(latencia_alvo_ms)
+        self.incremento = float(incremento)
+        self.fator_reducao = float(fator_reducao)
+
+        self._tokens = float(self.rajada)
+        self._ultimo_reabastecimento = time.monotonic()
+        self._sucessos_seguidos = 0
+        self._ultima_reducao = 0.0
+        self._aguardando = 0
+
+        # Janela das últimas observações para as métricas expostas
+        self._resultados = deque(maxlen=100)  # (sucesso, latencia_ms)
+        self._esperas = deque(maxlen=100)  # segundos aguardados em adquirir()
+
+    def configurar(self, taxa_minima=None, taxa_maxima=None, rajada=None, latencia_alvo_ms=None,
+                   taxa_por_minuto=None):
+        """Atualiza os limites sem perder a taxa aprendida.
+
+        `taxa_por_minuto` descarta a taxa aprendida e recomeça da informada
+        (usado quando o usuário muda a taxa configurada).
+        """
+        with self._lock:
+            if taxa_por_minuto is not None:
+                self.taxa_atual = float(taxa_por_minuto)
+            if taxa_minima is not None:
+                self.taxa_minima = float(taxa_minima)
+            if taxa_maxima is not None:
+                self.taxa_maxima = float(taxa_maxima)
+            if rajada is not None:
+                self.rajada = max(1, int(rajada))
+                self._tokens = min(self._tokens, self.rajada)
+            if latencia_alvo_ms is not None:
+                self.latencia_alvo_ms = float(latencia_alvo_ms)
+            self.taxa_atual = min(max(self.taxa_atual, self.taxa_minima), self.taxa_maxima)
+            self._lock.notify_all()
+
+    def _reabastecer(self):
+        agora = time.monotonic()
+        decorrido = agora - self._ultimo_reabastecimento
+        self._ultimo_reabastecimento = agora
+        self._tokens = min(self.rajada, self._tokens + decorrido * self.taxa_atual / 60.0)
+
+    def adquirir(self, timeout=None):
+        """Bloqueia até haver um token disponível.
+
+        Retorna False se `timeout` (segundos) expirar antes disso.
+        """
+        inicio = time.monotonic()
+        with self._lock:
+            self._aguardando += 1
+            try:
+                while True:
+                    self._reabastecer()
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self._esperas.append(time.monotonic() - inicio)
+                        return True
+
+                    espera = (1 - self._tokens) * 60.0 / self.taxa_atual
+                    if timeout is not None:
+                        restante = timeout - (time.monotonic() - inicio)
+                        if restante <= 0:
+                            return False
+                        espera = min(espera, restante)
+                    self._lock.wait(espera)
+            finally:
+                self._aguardando -= 1
+
+    def registrar_resultado(self, sucesso, latencia_segundos):
+        """Ajusta a taxa a partir do resultado de um envio"""
+        latencia_ms = latencia_segundos * 1000
+        with self._lock:
+            self._resultados.append((sucesso, latencia_ms))
+
+            if not sucesso or latencia_ms > self.latencia_alvo_ms:
+                self._sucessos_seguidos = 0
+                # No máximo uma redução por janela de envio, para não despencar
+                # com vários erros da mesma rajada
+                agora = time.monotonic()
+                if agora - self._ultima_reducao >= 60.0 / self.taxa_atual:
+                    self.taxa_atual = max(self.taxa_minima, self.taxa_atual * self.fator_reducao)
+                    self._tokens = min(self._tokens, 0.0)
+                    self._ultima_reducao = agora
+                return
+
+            # Aumento aditivo a cada rodada completa de envios bem-sucedidos
+            self._sucessos_seguidos += 1
+            if self._sucessos_seguidos >= self.rajada:
+                self._sucessos_seguidos = 0
+                self.taxa_atual = min(self.taxa_maxima, self.taxa_atual + self.incremento)
+                self._lock.notify_all()
+
+    def estado(self):
+        """Métricas atuais do limitador"""
+        with self._lock:
+            self._reabastecer()
+            resultados = list(self._resultados)
+            esperas = list(self._esperas)
+            falhas = sum(1 for sucesso, _ in resultados if not sucesso)
+
+            return {
+                'taxa_por_minuto': round(self.taxa_atual, 2),
+                'taxa_minima': self.taxa_minima,
+                'taxa_maxima': self.taxa_maxima,
+                'rajada': self.rajada,
+                'tokens_disponiveis': round(self._tokens, 2),
+                'aguardando': self._aguardando,
+                'espera_media_ms': round(sum(esperas) / len(esperas) * 1000, 1) if esperas else 0,
+                'latencia_media_ms': round(sum(l for _, l in resultados) / len(resultados), 1) if resultados else 0,
+                'taxa_erro': round(falhas / len(resultados) * 100, 2) if resultados else 0
+            }
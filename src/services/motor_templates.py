@@ -0,0 +1,111 @@
+"""
+Motor de renderização dos templates de mensagem
+
+Cada template é analisado uma única vez e convertido em trechos literais e
+variáveis, guardados em cache por id e data_atualizacao. A renderização é
+feita em uma só passada, juntando os trechos, em vez de um replace por
+variável sobre o texto inteiro.
+"""
+import re
+import threading
+from datetime import date
+
+VARIAVEIS = ('nome', 'plano', 'valor', 'dias')
+PADRAO_VARIAVEL = re.compile(r'\{(' + '|'.join(VARIAVEIS) + r')\}')
+
+
+class TemplateCompilado:
+    def __init__(self, conteudo):
+        self.trechos = []  # ('texto', literal) ou ('variavel', nome)
+        posicao = 0
+        for encontro in PADRAO_VARIAVEL.finditer(conteudo):
+            if encontro.start() > posicao:
+                self.trechos.append(('texto', conteudo[posicao:encontro.start()]))
+            self.trechos.append(('variavel', encontro.group(1)))
+            posicao = encontro.end()
+        if posicao < len(conteudo):
+            self.trechos.append(('texto', conteudo[posicao:]))
+
+        self.variaveis = {valor for tipo, valor in self.trechos if tipo == 'variavel'}
+        # Lista base com os literais; as posições das variáveis são preenchidas
+        # a cada renderização
+        self._partes = [valor if tipo == 'texto' else None for tipo, valor in self.trechos]
+        self._posicoes = [(posicao, valor) for posicao, (tipo, valor) in enumerate(self.trechos)
+                          if tipo == 'variavel']
+
+    def renderizar(self, valores):
+        partes = self._partes[:]
+        for posicao, variavel in self._posicoes:
+            partes[posicao] = valores[variavel]
+        return ''.join(partes)
+
+
+_cache = {}  # template_id -> (data_atualizacao, TemplateCompilado)
+_lock = threading.Lock()
+
+
+def compilar(template):
+    """Retorna a forma compilada do template, reaproveitando o cache"""
+    if template.id is None:
+        return TemplateCompilado(template.conteudo)
+
+    with _lock:
+        em_cache = _cache.get(template.id)
+    if em_cache and em_cache[0] == template.data_atualizacao:
+        return em_cache[1]
+
+    compilado = TemplateCompilado(template.conteudo)
+    with _lock:
+        _cache[template.id] = (template.data_atualizacao, compilado)
+    return compilado
+
+
+def invalidar(template_id=None):
+    """Remove um template (ou todos) do cache"""
+    with _lock:
+        if template_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(template_id, None)
+
+
+def valores_cliente(cliente, dias_vencimento=None, variaveis=VARIAVEIS):
+    """Valores das variáveis para o cliente; {dias} fica intacto sem dias_vencimento"""
+    valores = {}
+    if 'nome' in variaveis:
+        valores['nome'] = cliente.nome_completo
+    if 'plano' in variaveis:
+        valores['plano'] = cliente.plano_contratado
+    if 'valor' in variaveis:
+        valores['valor'] = f'R$ {cliente.valor_plano:.2f}'
+    if 'dias' in variaveis:
+        valores['dias'] = str(abs(dias_vencimento)) if dias_vencimento is not None else '{dias}'
+    return valores
+
+
+def renderizar(template, cliente, dias_vencimento=None):
+    """Renderiza o template para um cliente"""
+    compilado = compilar(template)
+    return compilado.renderizar(valores_cliente(cliente, dias_vencimento, compilado.variaveis))
+
+
+def renderizar_lote(template, clientes, hoje=None):
+    """Renderiza o template para vários clientes de uma vez.
+
+    Os dias para o vencimento são calculados a partir de `hoje` e da
+    data_vencimento de cada cliente.
+    """
+    if hoje is None:
+        hoje = date.today()
+
+    compilado = compilar(template)
+    variaveis = compilado.variaveis
+    precisa_dias = 'dias' in variaveis
+
+    mensagens = []
+    for cliente in clientes:
+        dias = None
+        if precisa_dias and cliente.data_vencimento:
+            dias = (cliente.data_vencimento - hoje).days
+        mensagens.append(compilado.renderizar(valores_cliente(cliente, dias, variaveis)))
+    return mensagens
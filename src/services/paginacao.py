@@ -0,0 +1,96 @@
+"""
+Paginação por cursor (keyset) para as listagens
+
+Em vez de OFFSET, a próxima página começa logo depois da última linha
+entregue, comparando a tupla de ordenação (por exemplo data_criacao, id)
+com a da última linha. O custo não cresce com a profundidade da página e
+não há COUNT(*) a cada requisição. O cursor é a tupla da última linha em
+JSON codificado em base64 url-safe, opaco para o cliente.
+"""
+import base64
+import json
+from datetime import date, datetime
+from sqlalchemy import Date, DateTime, literal, tuple_
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def _serializar(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+
+def _converter(valor, coluna):
+    if valor is None:
+        return None
+    if isinstance(coluna.type, DateTime):
+        return datetime.fromisoformat(valor)
+    if isinstance(coluna.type, Date):
+        return date.fromisoformat(valor)
+    return valor
+
+
+def codificar_cursor(valores):
+    texto = json.dumps([_serializar(valor) for valor in valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, colunas):
+    """Valores do cursor convertidos para os tipos das colunas de ordenação"""
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        valores = json.loads(texto)
+        if not isinstance(valores, list) or len(valores) != len(colunas):
+            raise ValueError
+        return [_converter(valor, coluna) for valor, coluna in zip(valores, colunas)]
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise CursorInvalido('Cursor inválido')
+
+
+def pagina_por_cursor(query, colunas, cursor, por_pagina, chave=None, ascendente=False):
+    """Busca uma página em ordem decrescente (ou crescente) de `colunas`.
+
+    `cursor` vazio ou None começa do início. `chave(linha)` devolve os
+    valores de ordenação de uma linha; por padrão são lidos do primeiro
+    elemento da linha (a entidade). Retorna (linhas, proximo_cursor), com
+    proximo_cursor None na última página.
+    """
+    if chave is None:
+        chave = lambda linha: [getattr(linha[0], coluna.key) for coluna in colunas]
+
+    if cursor:
+        valores = decodificar_cursor(cursor, colunas)
+        chave_cursor = tuple_(*[literal(valor, coluna.type) for valor, coluna in zip(valores, colunas)])
+        if ascendente:
+            query = query.filter(tuple_(*colunas) > chave_cursor)
+        else:
+            query = query.filter(tuple_(*colunas) < chave_cursor)
+
+    ordem = [coluna.asc() if ascendente else coluna.desc() for coluna in colunas]
+    linhas = query.order_by(*ordem).limit(por_pagina + 1).all()
+    if len(linhas) <= por_pagina:
+        return linhas, None
+    linhas = linhas[:por_pagina]
+    return linhas, codificar_cursor(chave(linhas[-1]))
+
+
+def pagina_por_offset(query, query_itens, ordem, pagina, por_pagina):
+    """Paginação por número de página, mantida por compatibilidade.
+
+    O total é contado em `query`, sem joins. O OFFSET percorre só os ids de
+    `query` (o último elemento de `ordem`), e os joins de `query_itens` são
+    feitos apenas para as linhas da página. Retorna (linhas, total, paginas).
+    """
+    coluna_id = ordem[-1]
+    total = query.order_by(None).count()
+    ids = query.with_entities(coluna_id).order_by(*[coluna.desc() for coluna in ordem]).limit(
+        por_pagina
+    ).offset((pagina - 1) * por_pagina)
+    linhas = query_itens.filter(coluna_id.in_(ids.subquery().select())).order_by(
+        *[coluna.desc() for coluna in ordem]
+    ).all()
+    paginas = -(-total // por_pagina) if total else 0
+    return linhas, total, paginas
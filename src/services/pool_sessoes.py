@@ -0,0 +1,188 @@
+"""
+Pool de sessões da ponte do WhatsApp
+
+Cada sessão é um processo Node próprio, com porta, diretório de sessão (e
+portanto número de WhatsApp e Chromium) próprios, seu cliente HTTP e seu
+limitador de taxa. Os destinatários são distribuídos por hashing
+consistente: o mesmo número sai sempre pela mesma sessão enquanto ela
+estiver saudável, e a conversa fica em um só número. Quando uma sessão cai,
+só os números dela passam para a próxima sessão saudável do anel; os das
+demais não mudam de sessão.
+"""
+import bisect
+import hashlib
+import subprocess
+import threading
+import time
+from collections import deque
+from src.services.cliente_ponte import ClientePonteWhatsApp
+from src.services.limitador_taxa import LimitadorTaxa
+
+PORTA_BASE = 3001
+DIRETORIO_SESSAO = 'whatsapp-session'
+NOS_VIRTUAIS = 64  # pontos de cada sessão no anel, para equilibrar a divisão
+ESPERA_FALHA = 60  # segundos fora do anel depois de uma falha de conexão
+INTERVALO_VERIFICACAO = 30  # segundos entre as verificações de saúde das sessões
+
+
+def _hash(chave):
+    return int.from_bytes(hashlib.md5(chave.encode('utf-8')).digest()[:8], 'big')
+
+
+class SessaoPonte:
+    def __init__(self, indice, porta, diretorio):
+        self.indice = indice
+        self.nome = f'sessao-{indice}'
+        self.porta = porta
+        self.diretorio = diretorio
+        self.ponte = ClientePonteWhatsApp(f"http://localhost:{porta}")
+        self.limitador = LimitadorTaxa()
+        self.processo = None
+        self.conectado = False
+        self.qr_code = None
+        self.indisponivel_ate = 0.0
+        self.enviadas = 0
+        self.falhas = 0
+        self.redirecionadas = 0  # mensagens de outras sessões recebidas por failover
+        self._envios = deque(maxlen=1000)  # instantes dos envios bem-sucedidos
+        self._lock = threading.Lock()
+
+    @property
+    def saudavel(self):
+        return self.conectado and time.monotonic() >= self.indisponivel_ate
+
+    def verificar(self):
+        """Consulta o status da ponte e atualiza `conectado`"""
+        try:
+            response = self.ponte.status()
+            self.conectado = response.status_code == 200 and response.json().get('connected', False)
+        except Exception:
+            self.conectado = False
+        if self.conectado:
+            self.qr_code = None
+        return self.conectado
+
+    def marcar_indisponivel(self, segundos=ESPERA_FALHA):
+        """Tira a sessão do anel até a próxima verificação depois de `segundos`"""
+        self.indisponivel_ate = time.monotonic() + segundos
+
+    def registrar_envio(self, sucesso, redirecionada=False):
+        with self._lock:
+            if sucesso:
+                self.enviadas += 1
+                self._envios.append(time.monotonic())
+            else:
+                self.falhas += 1
+            if redirecionada:
+                self.redirecionadas += 1
+
+    def estado(self):
+        """Saúde e vazão da sessão"""
+        with self._lock:
+            limite = time.monotonic() - 60
+            ultimo_minuto = len(self._envios) - bisect.bisect_left(self._envios, limite)
+            contadores = {
+                'enviadas': self.enviadas,
+                'falhas': self.falhas,
+                'redirecionadas': self.redirecionadas,
+                'mensagens_ultimo_minuto': ultimo_minuto
+            }
+        return dict(
+            contadores,
+            nome=self.nome,
+            porta=self.porta,
+            diretorio=self.diretorio,
+            executando=self.processo is not None and self.processo.poll() is None,
+            conectado=self.conectado,
+            saudavel=self.saudavel,
+            qr_disponivel=self.qr_code is not None,
+            limitador=self.limitador.estado(),
+            ponte=self.ponte.estatisticas()
+        )
+
+    def parar(self, tempo_limite=10):
+        """Encerra o processo Node da sessão, à força se não sair em `tempo_limite`"""
+        if self.processo is not None:
+            self.processo.terminate()
+            try:
+                self.processo.wait(timeout=tempo_limite)
+            except subprocess.TimeoutExpired:
+                self.processo.kill()
+                self.processo.wait()
+            self.processo = None
+        self.conectado = False
+
+    def fechar(self):
+        self.ponte.fechar()
+
+
+class PoolSessoes:
+    def __init__(self):
+        self.sessoes = []
+        self._anel = []  # [(hash, sessao)] ordenado pelo hash
+        self._chaves = []
+
+    def configurar(self, quantidade, porta_base=PORTA_BASE):
+        """Monta `quantidade` sessões; as que já existem são mantidas.
+
+        A sessão 0 usa o diretório e a porta de antes do pool, de modo que o
+        número já pareado continua conectado. As sessões removidas têm o
+        processo Node encerrado, senão ele ficaria rodando sem dono.
+        """
+        quantidade = max(1, int(quantidade))
+        for sessao in self.sessoes[quantidade:]:
+            sessao.parar()
+            sessao.fechar()
+        sessoes = self.sessoes[:quantidade]
+        for indice in range(len(sessoes), quantidade):
+            diretorio = DIRETORIO_SESSAO if indice == 0 else f'{DIRETORIO_SESSAO}-{indice}'
+            sessoes.append(SessaoPonte(indice, porta_base + indice, diretorio))
+        self.sessoes = sessoes
+
+        self._anel = sorted(
+            ((_hash(f'{sessao.nome}#{no}'), sessao) for sessao in sessoes for no in range(NOS_VIRTUAIS)),
+            key=lambda ponto: ponto[0]
+        )
+        self._chaves = [ponto for ponto, _ in self._anel]
+        return self.sessoes
+
+    def sessao(self, nome):
+        for sessao in self.sessoes:
+            if sessao.nome == nome:
+                return sessao
+        return None
+
+    def sessao_preferida(self, numero):
+        """Sessão dona do número no anel, saudável ou não"""
+        if not self._anel:
+            return None
+        posicao = bisect.bisect(self._chaves, _hash(numero)) % len(self._anel)
+        return self._anel[posicao][1]
+
+    def sessao_para(self, numero, excluir=()):
+        """Primeira sessão saudável a partir da posição do número no anel"""
+        if not self._anel:
+            return None
+        inicio = bisect.bisect(self._chaves, _hash(numero))
+        vistas = set()
+        for deslocamento in range(len(self._anel)):
+            sessao = self._anel[(inicio + deslocamento) % len(self._anel)][1]
+            if sessao.nome in vistas:
+                continue
+            vistas.add(sessao.nome)
+            if sessao.saudavel and sessao not in excluir:
+                return sessao
+            if len(vistas) == len(self.sessoes):
+                break
+        return None
+
+    def verificar(self):
+        """Atualiza o status de todas as sessões; True se alguma estiver conectada"""
+        return any([sessao.verificar() for sessao in self.sessoes])
+
+    @property
+    def conectado(self):
+        return any(sessao.saudavel for sessao in self.sessoes)
+
+    def estado(self):
+        return [sessao.estado() for sessao in self.sessoes]
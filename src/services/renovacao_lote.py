@@ -0,0 +1,129 @@
+"""
+Renovação de vários clientes em uma única transação
+
+Segue a regra de POST /clientes/<id>/renovar: cliente já vencido renova a
+partir de hoje, os demais a partir do vencimento atual. Os clientes são
+lidos em uma consulta e o novo vencimento é calculado uma vez, aqui, para
+cada cliente; as renovações entram com um único INSERT e os vencimentos com
+um único UPDATE, ambos em executemany.
+"""
+from datetime import date, datetime, timedelta
+from sqlalchemy import insert, update, bindparam
+from src.models.user import db
+from src.models.cliente import Cliente
+from src.models.renovacao import Renovacao
+from src.services import dashboard
+from src.services import resumo_diario
+
+_clientes = Cliente.__table__
+
+ATUALIZAR_VENCIMENTO = update(_clientes).where(_clientes.c.id == bindparam('b_id'))
+
+PERIODOS = (30, 60, 90, 180, 365)
+MAXIMO_ITENS = 5000
+
+
+class ErroRenovacao(ValueError):
+    """Itens inválidos; `erros` lista {'indice', 'cliente_id', 'erro'}"""
+
+    def __init__(self, erros):
+        super().__init__('Renovação em lote com itens inválidos')
+        self.erros = erros
+
+
+def _validar(itens):
+    """[(cliente_id, dias, valor_pago ou None, observacoes)] ou ErroRenovacao"""
+    erros = []
+    validos = []
+    vistos = set()
+    for indice, item in enumerate(itens):
+        if not isinstance(item, dict):
+            erros.append({'indice': indice, 'cliente_id': None, 'erro': 'Item deve ser um objeto'})
+            continue
+        cliente_id = item.get('cliente_id')
+        dias = item.get('dias_renovacao', item.get('dias'))
+        valor_pago = item.get('valor_pago')
+
+        if not isinstance(cliente_id, int) or isinstance(cliente_id, bool):
+            erro = 'Campo cliente_id é obrigatório'
+        elif cliente_id in vistos:
+            erro = 'Cliente repetido no lote'
+        elif dias not in PERIODOS:
+            erro = 'Dias de renovação deve ser 30, 60, 90, 180 ou 365'
+        elif valor_pago is not None and (isinstance(valor_pago, bool) or not isinstance(valor_pago, (int, float))):
+            erro = 'Campo valor_pago deve ser numérico'
+        else:
+            erro = None
+
+        if erro:
+            erros.append({'indice': indice, 'cliente_id': cliente_id, 'erro': erro})
+            continue
+        vistos.add(cliente_id)
+        validos.append((cliente_id, dias, valor_pago, item.get('observacoes', '')))
+
+    if erros:
+        raise ErroRenovacao(erros)
+    return validos
+
+
+def renovar(itens, hoje=None):
+    """Renova os clientes dos itens ({cliente_id, dias_renovacao, valor_pago, observacoes}).
+
+    Tudo ou nada: qualquer item inválido ou cliente inexistente levanta
+    ErroRenovacao sem gravar. O commit fica com quem chamou. Retorna a
+    lista de renovações criadas, na ordem dos itens.
+    """
+    if hoje is None:
+        hoje = date.today()
+    validos = _validar(itens)
+
+    clientes = {
+        cliente_id: (data_vencimento, tipo_produto, valor_plano)
+        for cliente_id, data_vencimento, tipo_produto, valor_plano in db.session.query(
+            Cliente.id, Cliente.data_vencimento, Cliente.tipo_produto, Cliente.valor_plano
+        ).filter(Cliente.id.in_([cliente_id for cliente_id, _, _, _ in validos]))
+    }
+    faltando = [
+        {'indice': indice, 'cliente_id': cliente_id, 'erro': 'Cliente não encontrado'}
+        for indice, (cliente_id, _, _, _) in enumerate(validos) if cliente_id not in clientes
+    ]
+    if faltando:
+        raise ErroRenovacao(faltando)
+
+    agora = datetime.utcnow()
+    renovacoes = []
+    for cliente_id, dias, valor_pago, observacoes in validos:
+        data_vencimento, tipo_produto, valor_plano = clientes[cliente_id]
+        base = hoje if data_vencimento < hoje else data_vencimento
+        renovacoes.append({
+            'cliente_id': cliente_id,
+            'data_renovacao': hoje,
+            'data_vencimento_anterior': data_vencimento,
+            'data_vencimento_nova': base + timedelta(days=dias),
+            'dias_renovados': dias,
+            'valor_pago': valor_plano if valor_pago is None else valor_pago,
+            'observacoes': observacoes,
+            'data_criacao': agora
+        })
+
+    ids = db.session.scalars(
+        insert(Renovacao).returning(Renovacao.id, sort_by_parameter_order=True), renovacoes
+    ).all()
+
+    db.session.execute(ATUALIZAR_VENCIMENTO, [
+        {
+            'b_id': renovacao['cliente_id'],
+            'data_vencimento': renovacao['data_vencimento_nova'],
+            'ativo': True,
+            'data_atualizacao': agora
+        }
+        for renovacao in renovacoes
+    ])
+
+    resumo_diario.ajustar_renovacoes([
+        (hoje, clientes[renovacao['cliente_id']][1], renovacao['dias_renovados'], 1, renovacao['valor_pago'])
+        for renovacao in renovacoes
+    ])
+    dashboard.invalidar('clientes', 'renovacoes')
+
+    return [dict(renovacao, id=renovacao_id) for renovacao, renovacao_id in zip(renovacoes, ids)]
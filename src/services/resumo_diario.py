@@ -0,0 +1,238 @@
+"""
+Manutenção dos resumos diários de renovações e mensagens
+
+Os resumos guardam contagens (e receita, no caso das renovações) por dia,
+produto e período/status, para que estatísticas e dashboard custem
+proporcionalmente ao número de dias e não ao número de linhas. Cada escrita
+em renovacoes ou logs_mensagem ajusta o resumo na mesma transação; o
+arquivamento de logs, de propósito, não mexe nos resumos, que continuam
+valendo para o histórico. `reconstruir()` (comando `flask reconstruir-resumos`)
+refaz tudo a partir das tabelas brutas e dos logs arquivados.
+"""
+from datetime import date, datetime
+from sqlalchemy import select, func, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.models.user import db
+from src.models.cliente import Cliente
+from src.models.renovacao import Renovacao
+from src.models.log_mensagem import LogMensagem
+from src.models.resumo_diario import ResumoRenovacaoDiario, ResumoMensagemDiario
+
+_renovacoes = ResumoRenovacaoDiario.__table__
+_mensagens = ResumoMensagemDiario.__table__
+
+_inserir_renovacoes = sqlite_insert(_renovacoes)
+SOMAR_RENOVACOES = _inserir_renovacoes.on_conflict_do_update(
+    index_elements=['dia', 'tipo_produto', 'dias_renovados'],
+    set_={
+        'quantidade': _renovacoes.c.quantidade + _inserir_renovacoes.excluded.quantidade,
+        'receita': _renovacoes.c.receita + _inserir_renovacoes.excluded.receita
+    }
+)
+
+_inserir_mensagens = sqlite_insert(_mensagens)
+SOMAR_MENSAGENS = _inserir_mensagens.on_conflict_do_update(
+    index_elements=['dia', 'tipo_produto', 'status', 'tipo_notificacao'],
+    set_={'quantidade': _mensagens.c.quantidade + _inserir_mensagens.excluded.quantidade}
+)
+
+
+def _dia(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return date.fromisoformat(str(valor)[:10])
+
+
+def ajustar_renovacoes(deltas, conexao=None):
+    """Soma deltas (dia, tipo_produto, dias_renovados, quantidade, receita) ao resumo"""
+    agregados = {}
+    for dia, tipo_produto, dias_renovados, quantidade, receita in deltas:
+        chave = (_dia(dia), tipo_produto or '', dias_renovados)
+        atual = agregados.get(chave, (0, 0.0))
+        agregados[chave] = (atual[0] + quantidade, atual[1] + (receita or 0))
+
+    linhas = [
+        {'dia': dia, 'tipo_produto': tipo_produto, 'dias_renovados': dias_renovados,
+         'quantidade': quantidade, 'receita': receita}
+        for (dia, tipo_produto, dias_renovados), (quantidade, receita) in agregados.items()
+        if dia is not None and (quantidade or receita)
+    ]
+    if linhas:
+        (conexao or db.session).execute(SOMAR_RENOVACOES, linhas)
+
+
+def ajustar_mensagens(deltas, conexao=None):
+    """Soma deltas (dia, tipo_produto, status, tipo_notificacao, quantidade) ao resumo"""
+    agregados = {}
+    for dia, tipo_produto, status, tipo_notificacao, quantidade in deltas:
+        chave = (_dia(dia), tipo_produto or '', status, tipo_notificacao or '')
+        agregados[chave] = agregados.get(chave, 0) + quantidade
+
+    linhas = [
+        {'dia': dia, 'tipo_produto': tipo_produto, 'status': status,
+         'tipo_notificacao': tipo_notificacao, 'quantidade': quantidade}
+        for (dia, tipo_produto, status, tipo_notificacao), quantidade in agregados.items()
+        if dia is not None and quantidade
+    ]
+    if linhas:
+        (conexao or db.session).execute(SOMAR_MENSAGENS, linhas)
+
+
+def registrar_renovacao(renovacao, tipo_produto, sinal=1, valor_anterior=None):
+    """Conta (sinal=1) ou desconta (sinal=-1) uma renovação.
+
+    Com `valor_anterior` apenas a diferença de receita é aplicada.
+    """
+    if valor_anterior is not None:
+        ajustar_renovacoes([(renovacao.data_renovacao, tipo_produto, renovacao.dias_renovados,
+                             0, (renovacao.valor_pago or 0) - valor_anterior)])
+        return
+    ajustar_renovacoes([(renovacao.data_renovacao, tipo_produto, renovacao.dias_renovados,
+                         sinal, sinal * (renovacao.valor_pago or 0))])
+
+
+def registrar_log(log, tipo_produto, status_anterior=None):
+    """Conta um log novo ou, com `status_anterior`, a sua mudança de status"""
+    deltas = [(log.data_criacao, tipo_produto, log.status, log.tipo_notificacao, 1)]
+    if status_anterior is not None:
+        if status_anterior == log.status:
+            return
+        deltas.append((log.data_criacao, tipo_produto, status_anterior, log.tipo_notificacao, -1))
+    ajustar_mensagens(deltas)
+
+
+def produtos_dos_clientes(cliente_ids, conexao=None):
+    ids = list(set(cliente_ids))
+    if not ids:
+        return {}
+    consulta = select(Cliente.id, Cliente.tipo_produto).where(Cliente.id.in_(ids))
+    return dict((conexao or db.session).execute(consulta).all())
+
+
+def registrar_logs_inseridos(linhas, conexao=None):
+    """Conta logs inseridos em lote (dicionários com as colunas do log)"""
+    produtos = produtos_dos_clientes([linha['cliente_id'] for linha in linhas], conexao)
+    ajustar_mensagens([
+        (linha.get('data_criacao'), produtos.get(linha['cliente_id']), linha['status'],
+         linha.get('tipo_notificacao'), 1)
+        for linha in linhas
+    ], conexao)
+
+
+def registrar_transicoes_logs(transicoes, conexao=None):
+    """Aplica mudanças de status [(log_id, status_novo)] antes do UPDATE correspondente.
+
+    Lê o status atual no banco, por isso deve ser chamado na mesma transação
+    e antes de gravar os novos status.
+    """
+    ids = list({log_id for log_id, _ in transicoes})
+    if not ids:
+        return
+    consulta = select(
+        LogMensagem.id, LogMensagem.status, LogMensagem.data_criacao,
+        LogMensagem.tipo_notificacao, Cliente.tipo_produto
+    ).outerjoin(Cliente, Cliente.id == LogMensagem.cliente_id).where(LogMensagem.id.in_(ids))
+    atuais = {linha[0]: list(linha[1:]) for linha in (conexao or db.session).execute(consulta).all()}
+
+    deltas = []
+    for log_id, status_novo in transicoes:
+        atual = atuais.get(log_id)
+        if atual is None or atual[0] == status_novo:
+            continue
+        status_antigo, data_criacao, tipo_notificacao, tipo_produto = atual
+        deltas.append((data_criacao, tipo_produto, status_antigo, tipo_notificacao, -1))
+        deltas.append((data_criacao, tipo_produto, status_novo, tipo_notificacao, 1))
+        atual[0] = status_novo
+    ajustar_mensagens(deltas, conexao)
+
+
+def _agregados_cliente(cliente_id):
+    renovacoes = db.session.query(
+        Renovacao.data_renovacao, Renovacao.dias_renovados,
+        func.count(Renovacao.id), func.sum(Renovacao.valor_pago)
+    ).filter(Renovacao.cliente_id == cliente_id).group_by(
+        Renovacao.data_renovacao, Renovacao.dias_renovados
+    ).all()
+
+    dia_log = func.date(LogMensagem.data_criacao)
+    mensagens = db.session.query(
+        dia_log, LogMensagem.status, LogMensagem.tipo_notificacao, func.count(LogMensagem.id)
+    ).filter(LogMensagem.cliente_id == cliente_id).group_by(
+        dia_log, LogMensagem.status, LogMensagem.tipo_notificacao
+    ).all()
+    return renovacoes, mensagens
+
+
+def mover_cliente(cliente_id, produto_anterior, produto_novo):
+    """Transfere os números do cliente para outro produto (mudança de tipo_produto)"""
+    if produto_anterior == produto_novo:
+        return
+    renovacoes, mensagens = _agregados_cliente(cliente_id)
+
+    deltas = []
+    for dia, dias_renovados, quantidade, receita in renovacoes:
+        deltas.append((dia, produto_anterior, dias_renovados, -quantidade, -(receita or 0)))
+        deltas.append((dia, produto_novo, dias_renovados, quantidade, receita or 0))
+    ajustar_renovacoes(deltas)
+
+    deltas = []
+    for dia, status, tipo_notificacao, quantidade in mensagens:
+        deltas.append((dia, produto_anterior, status, tipo_notificacao, -quantidade))
+        deltas.append((dia, produto_novo, status, tipo_notificacao, quantidade))
+    ajustar_mensagens(deltas)
+
+
+def remover_cliente(cliente_id, tipo_produto):
+    """Desconta renovações e logs que serão apagados junto com o cliente"""
+    renovacoes, mensagens = _agregados_cliente(cliente_id)
+    ajustar_renovacoes([
+        (dia, tipo_produto, dias_renovados, -quantidade, -(receita or 0))
+        for dia, dias_renovados, quantidade, receita in renovacoes
+    ])
+    ajustar_mensagens([
+        (dia, tipo_produto, status, tipo_notificacao, -quantidade)
+        for dia, status, tipo_notificacao, quantidade in mensagens
+    ])
+
+
+RECONSTRUIR = [
+    'DELETE FROM resumo_renovacoes_diario',
+    'INSERT INTO resumo_renovacoes_diario (dia, tipo_produto, dias_renovados, quantidade, receita) '
+    'SELECT r.data_renovacao, COALESCE(c.tipo_produto, \'\'), r.dias_renovados, '
+    'COUNT(*), COALESCE(SUM(r.valor_pago), 0) '
+    'FROM renovacoes r LEFT JOIN clientes c ON c.id = r.cliente_id '
+    'WHERE r.data_renovacao IS NOT NULL '
+    'GROUP BY r.data_renovacao, COALESCE(c.tipo_produto, \'\'), r.dias_renovados',
+    'DELETE FROM resumo_mensagens_diario',
+    'INSERT INTO resumo_mensagens_diario (dia, tipo_produto, status, tipo_notificacao, quantidade) '
+    'SELECT date(l.data_criacao), COALESCE(c.tipo_produto, \'\'), l.status, '
+    'COALESCE(l.tipo_notificacao, \'\'), COUNT(*) '
+    'FROM logs_mensagem l LEFT JOIN clientes c ON c.id = l.cliente_id '
+    'WHERE l.data_criacao IS NOT NULL '
+    'GROUP BY date(l.data_criacao), COALESCE(c.tipo_produto, \'\'), l.status, '
+    'COALESCE(l.tipo_notificacao, \'\')',
+]
+
+
+def reconstruir(conexao=None):
+    """Refaz os resumos a partir de renovacoes, logs_mensagem e dos logs arquivados"""
+    from src.services import arquivo_logs
+
+    if conexao is not None:
+        for comando in RECONSTRUIR:
+            conexao.execute(text(comando))
+        ajustar_mensagens(arquivo_logs.deltas_resumo(), conexao)
+        return
+
+    try:
+        for comando in RECONSTRUIR:
+            db.session.execute(text(comando))
+        ajustar_mensagens(arquivo_logs.deltas_resumo())
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
@@ -0,0 +1,50 @@
+"""
+Normalização de telefones para o WhatsApp
+
+O telefone do cliente é texto livre ("(11) 98765-4321", "+55 11 98765 4321",
+"11987654321"...). A forma normalizada tem só dígitos, com o código do país
+(E.164 sem o '+'), e é gravada em clientes.telefone_normalizado sempre que o
+telefone muda: é a chave do upsert da importação, das buscas por telefone e
+da remoção de destinatários repetidos no envio.
+
+Com 10 ou 11 dígitos o número é nacional (DDD + número local) e recebe só o
+55 na frente; números mais longos já trazem o código do país e ficam com os
+dígitos como estão. Não há validação de plano de numeração: números antigos
+de celular sem o 9, por exemplo, continuam recebendo mensagens. Só o que não
+tem como ser enviado normaliza para None: vazio, curto demais, longo demais
+para o E.164 ou com '+'/'00' de outro país.
+"""
+
+SUFIXO_JID = '@c.us'
+CODIGO_PAIS = '55'
+DIGITOS_NACIONAIS = (10, 11)  # DDD + fixo, DDD + celular
+MAXIMO_DIGITOS = 15  # E.164
+
+
+def normalizar(numero):
+    """Dígitos do número com o código do país; None se o número for inutilizável.
+
+    Aplicar de novo a um número já normalizado não o altera.
+    """
+    texto = str(numero or '').strip()
+    numero_limpo = ''.join(filter(str.isdigit, texto))
+    internacional = texto.startswith('+') or numero_limpo.startswith('00')
+    # Prefixos de discagem (0 de DDD, 00 internacional) não fazem parte do número
+    numero_limpo = numero_limpo.lstrip('0')
+
+    if len(numero_limpo) < min(DIGITOS_NACIONAIS) or len(numero_limpo) > MAXIMO_DIGITOS:
+        return None
+    if internacional:
+        # Código do país explícito: só o Brasil é atendido
+        return numero_limpo if numero_limpo.startswith(CODIGO_PAIS) else None
+    if len(numero_limpo) in DIGITOS_NACIONAIS:
+        return CODIGO_PAIS + numero_limpo
+    return numero_limpo
+
+
+def jid(numero):
+    """Identificador do WhatsApp (numero@c.us) para o telefone; None se for inválido"""
+    numero_normalizado = normalizar(numero)
+    if numero_normalizado is None:
+        return None
+    return numero_normalizado + SUFIXO_JID
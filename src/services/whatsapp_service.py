@@ -6,23 +6,44 @@ import json
 import time
 import threading
 import subprocess
-import requests
-from datetime import datetime, timedelta
+from contextlib import contextmanager
+from datetime import datetime
 from src.models.user import db
-from src.models.cliente import Cliente
-from src.models.log_mensagem import LogMensagem
 from src.models.configuracao import Configuracao
-from src.models.template_mensagem import TemplateMensagem
+from src.services import aviso_service
+from src.services import fila_envio
+from src.services import telefone
+from src.services.cliente_ponte import falhou_antes_do_envio
+from src.services.limitador_taxa import LimitadorTaxa
+from src.services.pool_sessoes import PoolSessoes, INTERVALO_VERIFICACAO
+from src.services.agendador_envio import agendador_envio
+from src.services.escritor_lote import escritor_lote
 
 class WhatsAppService:
     def __init__(self):
-        self.processo_whatsapp = None
+        self.app = None
         self.conectado = False
-        self.qr_code = None
-        self.porta = 3001
-        self.base_url = f"http://localhost:{self.porta}"
-        self.thread_envio = None
+        # Uma sessão (ponte Node e número de WhatsApp) por padrão; o tamanho
+        # do pool vem de whatsapp_sessoes ao iniciar o serviço
+        self.pool = PoolSessoes()
+        self.pool.configurar(1)
+        self.trabalhadores = []
+        self.monitor = None
+        self._taxa_aplicada = None  # taxa configurada com que os limitadores foram criados
         self.executando = False
+        self.drenando = False
+        self._parada = threading.Event()
+        self._fila_alimentada = threading.Event()
+        # Pausa dos trabalhadores (restauração de backup): nenhum lote novo é
+        # reivindicado enquanto houver pausas e quem pausa espera os lotes em
+        # andamento terminarem
+        self._cond_pausa = threading.Condition()
+        self._pausas = 0
+        self._lotes_em_andamento = 0
+    
+    def init_app(self, app):
+        """Associa a aplicação Flask usada pelas threads de envio"""
+        self.app = app
         
     def iniciar_servico(self):
         """Inicia o serviço do WhatsApp"""
@@ -42,23 +63,33 @@ class WhatsAppService:
             # Instalar dependências
             self._instalar_dependencias(whatsapp_dir)
             
-            # Criar servidor WhatsApp se não existir
+            # Criar servidor WhatsApp se não existir; o gerado por versões
+            # anteriores tem porta e diretório de sessão fixos e é recriado
             server_js_path = os.path.join(whatsapp_dir, 'server.js')
-            if not os.path.exists(server_js_path):
+            if not os.path.exists(server_js_path) or not self._servidor_aceita_sessoes(server_js_path):
                 self._criar_servidor_whatsapp(server_js_path)
             
-            # Iniciar o processo
-            self.processo_whatsapp = subprocess.Popen(
-                ['node', 'server.js'],
-                cwd=whatsapp_dir,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
+            with self.app.app_context():
+                quantidade = Configuracao.get_configuracao('whatsapp_sessoes', 1)
+            self.pool.configurar(quantidade)
+            
+            # Iniciar um processo por sessão, cada um com sua porta e seu
+            # diretório de sessão
+            for sessao in self.pool.sessoes:
+                if sessao.processo is not None and sessao.processo.poll() is None:
+                    continue
+                sessao.processo = subprocess.Popen(
+                    ['node', 'server.js'],
+                    cwd=whatsapp_dir,
+                    env=dict(os.environ, PORT=str(sessao.porta), WHATSAPP_SESSAO_DIR=f'./{sessao.diretorio}'),
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE
+                )
             
             # Aguardar inicialização
             time.sleep(5)
             
-            # Verificar se está rodando
+            # Verificar se está rodando (basta uma sessão responder)
             if self._verificar_servico():
                 self.executando = True
                 self._iniciar_thread_envio()
@@ -73,14 +104,19 @@ class WhatsAppService:
     def parar_servico(self):
         """Para o serviço do WhatsApp"""
         try:
+            # Parar o produtor e deixar os trabalhadores esvaziarem a fila
+            self.drenando = True
             self.executando = False
+            self._parada.set()
+            self._fila_alimentada.set()
+            
+            agendador_envio.parar()
             
-            if self.thread_envio:
-                self.thread_envio.join(timeout=5)
+            self._drenar_fila()
+            escritor_lote.descarregar()
             
-            if self.processo_whatsapp:
-                self.processo_whatsapp.terminate()
-                self.processo_whatsapp.wait(timeout=10)
+            for sessao in self.pool.sessoes:
+                sessao.parar()
                 
             self.conectado = False
             return True
@@ -89,232 +125,423 @@ class WhatsAppService:
             self._log_erro(f"Erro ao parar serviço WhatsApp: {str(e)}")
             return False
     
-    def obter_qr_code(self):
-        """Obtém o QR code para conexão"""
+    def obter_qr_code(self, nome_sessao=None):
+        """Obtém o QR code para conexão de uma sessão.
+        
+        Sem `nome_sessao`, usa a primeira sessão ainda não conectada.
+        Retorna (sessao, qr_code), com None no que não estiver disponível.
+        """
+        if nome_sessao:
+            sessao = self.pool.sessao(nome_sessao)
+        else:
+            sessao = next((s for s in self.pool.sessoes if not s.conectado), self.pool.sessoes[0])
+        if sessao is None:
+            return None, None
+        
         try:
-            response = requests.get(f"{self.base_url}/qr", timeout=10)
+            response = sessao.ponte.qr()
             if response.status_code == 200:
                 data = response.json()
-                self.qr_code = data.get('qr')
-                return self.qr_code
-            return None
+                sessao.qr_code = data.get('qr')
+                return sessao, sessao.qr_code
+            return sessao, None
         except Exception as e:
-            self._log_erro(f"Erro ao obter QR code: {str(e)}")
-            return None
+            self._log_erro(f"Erro ao obter QR code da {sessao.nome}: {str(e)}")
+            return sessao, None
     
     def verificar_conexao(self):
-        """Verifica se está conectado ao WhatsApp"""
+        """Verifica as sessões; conectado se ao menos uma estiver conectada"""
         try:
-            response = requests.get(f"{self.base_url}/status", timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                self.conectado = data.get('connected', False)
-                return self.conectado
-            return False
+            self.conectado = self.pool.verificar()
+            return self.conectado
         except Exception as e:
             self._log_erro(f"Erro ao verificar conexão: {str(e)}")
             return False
     
     def enviar_mensagem(self, numero, mensagem, cliente_id=None):
         """Envia uma mensagem via WhatsApp"""
+        sucesso, erro_detalhes, _ = self._enviar_para_ponte(numero, mensagem)
+        
+        # Criar log
+        self._criar_log_mensagem(
+            cliente_id=cliente_id,
+            telefone_destino=numero,
+            mensagem=mensagem,
+            status='enviada' if sucesso else 'falha',
+            erro_detalhes=erro_detalhes
+        )
+        
+        return sucesso
+    
+    def _enviar_para_ponte(self, numero, mensagem, sessao=None):
+        """Entrega a mensagem ao servidor Node; retorna (sucesso, erro_detalhes, incerto).
+        
+        A mensagem sai pela sessão dona do número no anel (ou por `sessao`,
+        já escolhida pelo chamador). Se a sessão cair antes de a ponte
+        receber o pedido, segue pela próxima sessão saudável. `incerto` indica
+        uma falha em que a ponte pode ter enviado a mensagem: ela não deve
+        ser reenviada.
+        """
+        tentadas = []
         try:
             # Formatar número
             numero_formatado = self._formatar_numero(numero)
+            if numero_formatado is None:
+                return False, f'Telefone inválido: {numero}', False
+            preferida = self.pool.sessao_preferida(numero_formatado)
+            
+            erro_msg = 'Nenhuma sessão do WhatsApp disponível'
+            sessao = sessao or self.pool.sessao_para(numero_formatado)
+            while sessao is not None:
+                tentadas.append(sessao)
+                sucesso, erro_msg, sessao_caiu, incerto = self._enviar_pela_sessao(
+                    sessao, numero_formatado, mensagem
+                )
+                sessao.registrar_envio(sucesso, redirecionada=sessao is not preferida)
+                if not sessao_caiu:
+                    return sucesso, erro_msg, incerto
+                sessao = self.pool.sessao_para(numero_formatado, excluir=tentadas)
             
-            # Dados para envio
-            dados = {
-                'number': numero_formatado,
-                'message': mensagem
-            }
-            
-            # Enviar mensagem
-            response = requests.post(
-                f"{self.base_url}/send-message",
-                json=dados,
-                timeout=30
-            )
-            
-            # Criar log
-            status = 'enviada' if response.status_code == 200 else 'falha'
-            erro_detalhes = None
-            
-            if response.status_code != 200:
-                erro_detalhes = f"HTTP {response.status_code}: {response.text}"
-            
-            self._criar_log_mensagem(
-                cliente_id=cliente_id,
-                telefone_destino=numero,
-                mensagem=mensagem,
-                status=status,
-                erro_detalhes=erro_detalhes
-            )
-            
-            return response.status_code == 200
+            return False, erro_msg, False
             
         except Exception as e:
             erro_msg = str(e)
             self._log_erro(f"Erro ao enviar mensagem: {erro_msg}")
-            
-            # Criar log de erro
-            self._criar_log_mensagem(
-                cliente_id=cliente_id,
-                telefone_destino=numero,
-                mensagem=mensagem,
-                status='falha',
-                erro_detalhes=erro_msg
-            )
-            
-            return False
+            # Depois de chegar a uma sessão, não dá para saber se a mensagem saiu
+            return False, erro_msg, bool(tentadas)
     
-    def processar_avisos_automaticos(self):
-        """Processa e envia avisos automáticos"""
+    def _enviar_pela_sessao(self, sessao, numero_formatado, mensagem):
+        """Envia por uma sessão; retorna (sucesso, erro_detalhes, sessao_caiu, incerto).
+        
+        Só vale passar a mensagem para outra sessão quando esta certamente
+        não a enviou: conexão recusada ou não estabelecida, ou ponte que
+        recusou o pedido (4xx) porque o WhatsApp está desconectado. Timeout de
+        leitura, conexão derrubada no meio e erro 5xx da ponte são incertos:
+        a falha fica nesta sessão e a mensagem não é reenviada.
+        """
+        inicio = time.monotonic()
+        try:
+            response = sessao.ponte.enviar_mensagem(numero_formatado, mensagem)
+        except Exception as e:
+            sessao.limitador.registrar_resultado(False, time.monotonic() - inicio)
+            if falhou_antes_do_envio(e):
+                # Ponte fora do ar: a sessão sai do anel até voltar a responder
+                sessao.marcar_indisponivel()
+                self._log_erro(f"Erro ao enviar mensagem pela {sessao.nome}: {str(e)}")
+                return False, str(e), True, False
+            erro = f"Envio incerto pela {sessao.nome} (a ponte pode ter enviado a mensagem): {str(e)}"
+            self._log_erro(erro)
+            return False, erro, False, True
+        
+        sessao.limitador.registrar_resultado(response.status_code == 200, time.monotonic() - inicio)
+        
+        if response.status_code == 200:
+            return True, None, False, False
+        
+        erro = f"HTTP {response.status_code}: {response.text}"
+        if response.status_code >= 500:
+            erro = f"Envio incerto pela {sessao.nome} (a ponte pode ter enviado a mensagem): {erro}"
+            self._log_erro(erro)
+            return False, erro, False, True
+        # Pedido recusado pela ponte com o WhatsApp desconectado: também
+        # conta como queda
+        if not sessao.verificar():
+            sessao.marcar_indisponivel()
+            return False, erro, True, False
+        return False, erro, False, False
+    
+    def processar_avisos_automaticos(self, cliente_ids=None):
+        """Gera os avisos do dia e os coloca na fila de envio.
+        
+        Sem `cliente_ids` todos os clientes são avaliados; o agendador passa
+        apenas os clientes cujo horário de aviso chegou.
+        
+        Retorna os IDs dos clientes cujo aviso de hoje ficou resolvido:
+        enfileirados agora, já cobertos por uma mensagem na fila (do próprio
+        cliente ou do mesmo número) ou descartados por telefone inválido. Quem
+        ficou de fora por desconexão, fora do horário, falta de template ou
+        erro não entra na lista.
+        """
         try:
             if not self.conectado:
-                return
-            
-            # Buscar clientes que precisam de aviso
-            response = requests.get('http://localhost:5000/api/clientes/avisos-pendentes')
-            if response.status_code != 200:
-                return
+                return []
             
-            dados = response.json()
-            clientes_para_aviso = dados.get('clientes_para_aviso', [])
-            
-            if not clientes_para_aviso:
-                return
-            
-            # Obter intervalo entre mensagens
-            intervalo = Configuracao.get_configuracao('whatsapp_intervalo_mensagens', 60)
-            
-            for aviso in clientes_para_aviso:
-                try:
-                    cliente_data = aviso['cliente']
-                    tipo_aviso = aviso['tipo_aviso']
-                    
-                    # Verificar se está no horário correto
-                    if not self._esta_no_horario_funcionamento():
+            # Cada thread usa seu próprio contexto e sessão do banco
+            with self.app.app_context():
+                # Fora do horário os avisos não são gerados
+                if not self._esta_no_horario_funcionamento():
+                    return []
+                
+                avisos = aviso_service.buscar_avisos_pendentes(cliente_ids=cliente_ids)
+                if not avisos:
+                    return []
+                
+                # Clientes com mensagem ainda na fila não recebem outra, e cada
+                # número recebe um aviso por execução: o mesmo contato
+                # cadastrado duas vezes (em formatos diferentes) não é avisado
+                # em dobro
+                ja_na_fila = fila_envio.clientes_na_fila()
+                numeros = fila_envio.numeros_na_fila()
+                selecionados = []
+                cobertos = []
+                invalidos = []
+                for aviso in avisos:
+                    cliente = aviso['cliente']
+                    numero = cliente.telefone_normalizado or telefone.normalizar(cliente.telefone)
+                    if numero is None:
+                        invalidos.append(cliente.id)
                         continue
-                    
-                    # Gerar mensagem
-                    mensagem = self._gerar_mensagem_aviso(cliente_data, tipo_aviso)
-                    
-                    if mensagem:
-                        # Enviar mensagem
-                        sucesso = self.enviar_mensagem(
-                            cliente_data['telefone'],
-                            mensagem,
-                            cliente_data['id']
-                        )
-                        
-                        if sucesso:
-                            # Marcar como enviada
-                            requests.post(
-                                f"http://localhost:5000/api/clientes/marcar-mensagem-enviada/{cliente_data['id']}"
-                            )
-                        
-                        # Aguardar intervalo entre mensagens
-                        time.sleep(intervalo)
+                    if cliente.id in ja_na_fila or (numero and numero in numeros):
+                        cobertos.append(cliente.id)
+                        continue
+                    numeros.add(numero)
+                    selecionados.append(aviso)
+                avisos = selecionados
+                if invalidos:
+                    self._log_erro(f"Avisos não enviados, telefone inválido nos clientes {invalidos}")
                 
-                except Exception as e:
-                    self._log_erro(f"Erro ao processar aviso para cliente {cliente_data.get('id', 'N/A')}: {str(e)}")
-                    continue
+                itens = [{
+                    'cliente_id': aviso['cliente'].id,
+                    'telefone_destino': aviso['cliente'].telefone_normalizado or aviso['cliente'].telefone,
+                    'mensagem': mensagem,
+                    'tipo_notificacao': 'automatica'
+                } for aviso, mensagem in aviso_service.gerar_mensagens_avisos(avisos)]
+                
+                fila_envio.enfileirar_lote(itens)
+                
+            if itens:
+                self._fila_alimentada.set()
+            return cobertos + invalidos + [item['cliente_id'] for item in itens]
         
         except Exception as e:
             self._log_erro(f"Erro no processamento automático: {str(e)}")
+            return []
     
     def _iniciar_thread_envio(self):
-        """Inicia thread para envio automático"""
-        def loop_envio():
-            while self.executando:
+        """Inicia o agendador de avisos e o pool de trabalhadores de envio"""
+        self.drenando = False
+        self._parada.clear()
+        
+        # O agendador dorme até o próximo horário de aviso de algum cliente
+        agendador_envio.iniciar(self.processar_avisos_automaticos)
+        
+        with self.app.app_context():
+            quantidade = Configuracao.get_configuracao('whatsapp_trabalhadores_envio', 1)
+            # Cada sessão tem o seu próprio orçamento de envio
+            for sessao in self.pool.sessoes:
+                sessao.limitador = self._criar_limitador()
+        
+        # A saúde das sessões é acompanhada em segundo plano: as que caem
+        # saem do anel e as que voltam retornam a ele
+        self.verificar_conexao()
+        self.monitor = threading.Thread(target=self._loop_saude, name='whatsapp-saude', daemon=True)
+        self.monitor.start()
+        
+        # Ao menos um trabalhador por sessão, para uma sessão lenta não
+        # segurar as demais
+        self.trabalhadores = []
+        for indice in range(max(1, int(quantidade), len(self.pool.sessoes))):
+            trabalhador = threading.Thread(
+                target=self._loop_trabalhador,
+                name=f'whatsapp-envio-{indice}',
+                daemon=True
+            )
+            trabalhador.start()
+            self.trabalhadores.append(trabalhador)
+    
+    def _loop_trabalhador(self):
+        """Reivindica lotes da fila e envia as mensagens"""
+        with self.app.app_context():
+            while self.executando or self.drenando:
                 try:
-                    if self.conectado:
-                        self.processar_avisos_automaticos()
-                    time.sleep(300)  # Verificar a cada 5 minutos
+                    if not self.pool.conectado or not self._esta_no_horario_funcionamento():
+                        if self.drenando:
+                            break
+                        self._parada.wait(60)
+                        continue
+                    
+                    if not self._iniciar_lote():
+                        continue
+                    try:
+                        tamanho_lote = Configuracao.get_configuracao('whatsapp_tamanho_lote', 10)
+                        duracao_lease = Configuracao.get_configuracao('whatsapp_lease_segundos', 300)
+                        itens = fila_envio.reivindicar_lote(tamanho_lote, duracao_lease)
+                        if itens:
+                            self._enviar_lote(itens)
+                    finally:
+                        self._terminar_lote()
+                    
+                    if not itens:
+                        if self.drenando:
+                            break
+                        self._fila_alimentada.wait(30)
+                        self._fila_alimentada.clear()
+                
                 except Exception as e:
-                    self._log_erro(f"Erro na thread de envio: {str(e)}")
-                    time.sleep(60)
-        
-        self.thread_envio = threading.Thread(target=loop_envio, daemon=True)
-        self.thread_envio.start()
+                    db.session.rollback()
+                    self._log_erro(f"Erro no trabalhador de envio: {str(e)}")
+                    if self.drenando:
+                        break
+                    self._parada.wait(10)
     
-    def _verificar_servico(self):
-        """Verifica se o serviço está rodando"""
+    @contextmanager
+    def pausado(self):
+        """Suspende a reivindicação de lotes enquanto o bloco executa.
+        
+        Espera os lotes em andamento terminarem antes de entrar no bloco.
+        """
+        with self._cond_pausa:
+            self._pausas += 1
+            self._cond_pausa.wait_for(lambda: self._lotes_em_andamento == 0)
         try:
-            response = requests.get(f"{self.base_url}/health", timeout=5)
-            return response.status_code == 200
-        except:
-            return False
+            yield
+        finally:
+            with self._cond_pausa:
+                self._pausas -= 1
+                self._cond_pausa.notify_all()
     
-    def _formatar_numero(self, numero):
-        """Formata número para WhatsApp"""
-        # Remove caracteres especiais
-        numero_limpo = ''.join(filter(str.isdigit, numero))
+    def _iniciar_lote(self, espera=1):
+        """Registra um lote em andamento; False se os trabalhadores seguirem pausados após `espera`"""
+        with self._cond_pausa:
+            if not self._cond_pausa.wait_for(lambda: not self._pausas, timeout=espera):
+                return False
+            self._lotes_em_andamento += 1
+            return True
+    
+    def _terminar_lote(self):
+        with self._cond_pausa:
+            self._lotes_em_andamento -= 1
+            self._cond_pausa.notify_all()
+    
+    def _enviar_lote(self, itens):
+        """Envia os itens reivindicados, cada um pela sessão do seu número e no
+        ritmo liberado pelo limitador de taxa dessa sessão"""
+        max_tentativas = Configuracao.get_configuracao('whatsapp_max_tentativas', 3)
+        taxa = self.taxa_configurada()
+        limites = self._limites_limitador(taxa)
+        # Taxa alterada pelo usuário com o serviço rodando: recomeçar dela;
+        # sem alteração, manter a taxa aprendida por cada sessão
+        if taxa != self._taxa_aplicada:
+            limites['taxa_por_minuto'] = taxa
+            self._taxa_aplicada = taxa
+        for sessao in self.pool.sessoes:
+            sessao.limitador.configurar(**limites)
+        
+        for posicao, item in enumerate(itens):
+            # Aguardar um token, devolvendo o restante à fila se o serviço
+            # parar ou se nenhuma sessão estiver saudável
+            numero_formatado = self._formatar_numero(item.telefone_destino)
+            if numero_formatado is None:
+                # Tentar de novo não torna o número válido
+                fila_envio.registrar_falha(item, f'Telefone inválido: {item.telefone_destino}', max_tentativas=0)
+                continue
+            sessao = self._aguardar_sessao(numero_formatado)
+            if sessao is None:
+                fila_envio.liberar(itens[posicao:])
+                return
+            
+            sucesso, erro_detalhes, incerto = self._enviar_para_ponte(item.telefone_destino, item.mensagem, sessao)
+            
+            if sucesso:
+                fila_envio.concluir(item)
+            elif incerto:
+                # A mensagem pode ter saído: uma nova tentativa poderia duplicá-la
+                fila_envio.registrar_falha(item, erro_detalhes, max_tentativas=0)
+            else:
+                fila_envio.registrar_falha(item, erro_detalhes, max_tentativas)
+    
+    def _aguardar_sessao(self, numero_formatado):
+        """Sessão saudável do número, já com um token do seu limitador"""
+        while self.executando or self.drenando:
+            sessao = self.pool.sessao_para(numero_formatado)
+            if sessao is None:
+                return None
+            # A sessão pode cair durante a espera: escolher de novo a cada segundo
+            if sessao.limitador.adquirir(timeout=1):
+                return sessao
+        return None
+    
+    def _loop_saude(self):
+        """Verifica as sessões periodicamente enquanto o serviço roda"""
+        while not self._parada.wait(INTERVALO_VERIFICACAO):
+            self.verificar_conexao()
+    
+    def taxa_configurada(self):
+        """Taxa inicial de envio (mensagens por minuto) configurada.
         
-        # Adiciona código do país se necessário
-        if len(numero_limpo) == 11 and numero_limpo.startswith('11'):
-            numero_limpo = '55' + numero_limpo
-        elif len(numero_limpo) == 10:
-            numero_limpo = '5511' + numero_limpo
-        elif not numero_limpo.startswith('55'):
-            numero_limpo = '55' + numero_limpo
+        whatsapp_taxa_mensagens_minuto e whatsapp_intervalo_mensagens são duas
+        formas de informar o mesmo ritmo (12/min = uma mensagem a cada 5 s);
+        vale a que foi alterada por último, de modo que mudar o intervalo na
+        tela do WhatsApp também muda a taxa.
+        """
+        taxa = Configuracao.get_configuracao('whatsapp_taxa_mensagens_minuto')
+        intervalo = Configuracao.get_configuracao('whatsapp_intervalo_mensagens')
         
-        return numero_limpo + '@c.us'
+        if intervalo:
+            alteracao_taxa = Configuracao.atualizacao_em_cache('whatsapp_taxa_mensagens_minuto')
+            alteracao_intervalo = Configuracao.atualizacao_em_cache('whatsapp_intervalo_mensagens')
+            if taxa is None or (alteracao_intervalo or datetime.min) > (alteracao_taxa or datetime.min):
+                return 60.0 / intervalo
+        if taxa:
+            return float(taxa)
+        return 1.0  # sem configuração: uma mensagem por minuto, como o intervalo padrão de 60 s
     
-    def _gerar_mensagem_aviso(self, cliente_data, tipo_aviso):
-        """Gera mensagem de aviso para o cliente"""
+    def _limites_limitador(self, taxa=None):
+        """Limites do limitador de taxa lidos das configurações.
+        
+        Uma taxa configurada abaixo da mínima baixa o piso: quem pediu envio
+        mais lento não é acelerado. O teto continua valendo.
+        """
+        taxa_minima = Configuracao.get_configuracao('whatsapp_taxa_minima', 2)
+        if taxa is not None:
+            taxa_minima = min(taxa_minima, taxa)
+        return {
+            'taxa_minima': taxa_minima,
+            'taxa_maxima': Configuracao.get_configuracao('whatsapp_taxa_maxima', 30),
+            'rajada': Configuracao.get_configuracao('whatsapp_rajada', 3),
+            'latencia_alvo_ms': Configuracao.get_configuracao('whatsapp_latencia_alvo_ms', 3000)
+        }
+    
+    def _criar_limitador(self):
+        """Cria o limitador da sessão de envio a partir das configurações"""
+        taxa = self.taxa_configurada()
+        self._taxa_aplicada = taxa
+        return LimitadorTaxa(taxa_por_minuto=taxa, **self._limites_limitador(taxa))
+    
+    def _drenar_fila(self):
+        """Aguarda os trabalhadores esvaziarem a fila, até o tempo limite"""
         try:
-            # Buscar template apropriado
-            template_id = cliente_data.get('template_mensagem_id')
-            
-            if template_id:
-                response = requests.get(f"http://localhost:5000/api/templates/{template_id}")
-                if response.status_code == 200:
-                    template_data = response.json()['template']
-                else:
-                    template_data = None
-            else:
-                template_data = None
-            
-            # Se não tem template específico, buscar padrão
-            if not template_data:
-                tipo_template = 'vencimento' if tipo_aviso in ['vencimento', 'antecedencia'] else 'personalizada'
-                response = requests.get(
-                    f"http://localhost:5000/api/templates/padrao/{cliente_data['tipo_produto']}/{tipo_template}"
-                )
-                if response.status_code == 200:
-                    template_data = response.json()['template']
-                else:
-                    return None
-            
-            # Processar template
-            if template_data:
-                from src.models.template_mensagem import TemplateMensagem
-                
-                # Criar objeto cliente fictício
-                class ClienteFicticio:
-                    def __init__(self, data):
-                        self.nome_completo = data['nome_completo']
-                        self.plano_contratado = data['plano_contratado']
-                        self.valor_plano = data['valor_plano']
-                
-                cliente_obj = ClienteFicticio(cliente_data)
-                
-                # Calcular dias para vencimento
-                from datetime import datetime
-                data_vencimento = datetime.fromisoformat(cliente_data['data_vencimento']).date()
-                dias_vencimento = (data_vencimento - datetime.now().date()).days
-                
-                # Processar template
-                template = TemplateMensagem()
-                template.conteudo = template_data['conteudo']
-                
-                return template.processar_template(cliente_obj, dias_vencimento)
-            
-            return None
-            
-        except Exception as e:
-            self._log_erro(f"Erro ao gerar mensagem: {str(e)}")
-            return None
+            with self.app.app_context():
+                tempo_limite = Configuracao.get_configuracao('whatsapp_tempo_drenagem', 60)
+            
+            limite = time.monotonic() + tempo_limite
+            for trabalhador in self.trabalhadores:
+                trabalhador.join(timeout=max(0, limite - time.monotonic()))
+        finally:
+            # O que não foi enviado continua na fila para a próxima execução
+            self.drenando = False
+            self.trabalhadores = [t for t in self.trabalhadores if t.is_alive()]
+    
+    def _verificar_servico(self):
+        """Verifica se o serviço está rodando (alguma sessão responde)"""
+        for sessao in self.pool.sessoes:
+            try:
+                if sessao.ponte.saude().status_code == 200:
+                    return True
+            except:
+                pass
+        return False
+    
+    def _servidor_aceita_sessoes(self, caminho):
+        """Se o server.js lê porta e diretório de sessão do ambiente"""
+        with open(caminho, encoding='utf-8') as f:
+            return 'WHATSAPP_SESSAO_DIR' in f.read()
+    
+    def _formatar_numero(self, numero):
+        """Formata número para WhatsApp"""
+        # Números já normalizados (os da fila) saem inalterados; None se o
+        # número for inválido
+        return telefone.jid(numero)
     
     def _esta_no_horario_funcionamento(self):
         """Verifica se está no horário de funcionamento"""
@@ -349,24 +576,18 @@ class WhatsAppService:
             return True  # Em caso de erro, permitir envio
     
     def _criar_log_mensagem(self, cliente_id, telefone_destino, mensagem, status, erro_detalhes=None):
-        """Cria log de mensagem no banco"""
+        """Registra o log da mensagem pelo escritor em lote"""
         try:
-            from src.main import app
-            
-            with app.app_context():
-                log = LogMensagem(
-                    cliente_id=cliente_id,
-                    telefone_destino=telefone_destino,
-                    mensagem=mensagem,
-                    status=status,
-                    tipo_notificacao='automatica',
-                    data_envio=datetime.utcnow() if status == 'enviada' else None,
-                    erro_detalhes=erro_detalhes,
-                    tentativas=1
-                )
-                
-                db.session.add(log)
-                db.session.commit()
+            escritor_lote.registrar_log(
+                cliente_id=cliente_id,
+                telefone_destino=telefone_destino,
+                mensagem=mensagem,
+                status=status,
+                tipo_notificacao='automatica',
+                data_envio=datetime.utcnow() if status == 'enviada' else None,
+                erro_detalhes=erro_detalhes,
+                tentativas=1
+            )
                 
         except Exception as e:
             print(f"Erro ao criar log: {str(e)}")
@@ -422,7 +643,9 @@ const QRCode = require('qrcode');
 const cors = require('cors');
 
 const app = express();
-const port = 3001;
+// Porta e diretório de sessão vêm do pool de sessões (uma ponte por número)
+const port = parseInt(process.env.PORT || '3001', 10);
+const sessionDir = process.env.WHATSAPP_SESSAO_DIR || './whatsapp-session';
 
 app.use(cors());
 app.use(express.json());
@@ -435,7 +658,7 @@ let isConnected = false;
 function initializeClient() {
     client = new Client({
         authStrategy: new LocalAuth({
-            dataPath: './whatsapp-session'
+            dataPath: sessionDir
         }),
         puppeteer: {
             headless: true,
@@ -0,0 +1,140 @@
+"""
+Fixtures dos testes: aplicação Flask com um banco SQLite temporário
+
+Os testes não usam src/database/app.db nem importam src.main (que cria o
+banco e as configurações padrão ao ser importado).
+"""
+import json
+import threading
+import time
+from datetime import date
+from datetime import time as hora
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from flask import Flask
+from src.models.user import db
+from src.models.cliente import Cliente
+from src.models import renovacao, log_mensagem, template_mensagem, versao_recurso, fila_envio, resumo_diario
+from src.routes.cliente import cliente_bp
+from src.routes.configuracao import configuracao_bp
+from src.routes.log_mensagem import log_mensagem_bp
+from src.routes.renovacao import renovacao_bp
+from src.database.migracoes import aplicar_migracoes
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'app.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['DIRETORIO_ARQUIVO_LOGS'] = str(tmp_path / 'arquivo_logs')
+    app.config['DIRETORIO_BACKUPS'] = str(tmp_path / 'backups')
+    app.register_blueprint(cliente_bp, url_prefix='/api')
+    app.register_blueprint(configuracao_bp, url_prefix='/api')
+    app.register_blueprint(log_mensagem_bp, url_prefix='/api')
+    app.register_blueprint(renovacao_bp, url_prefix='/api')
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        aplicar_migracoes()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def criar_cliente(**campos):
+    """Cria e grava um cliente com valores padrão para os campos obrigatórios"""
+    dados = {
+        'nome_completo': 'Cliente Teste',
+        'telefone': '11987654321',
+        'tipo_produto': 'IPTV',
+        'plano_contratado': 'Mensal',
+        'valor_plano': 30.0,
+        'data_vencimento': date.today(),
+        'horario_envio': hora(9, 0),
+        'aviso_ativo': True,
+        'dias_aviso_antecedencia': 3,
+        'ativo': True
+    }
+    dados.update(campos)
+    cliente = Cliente(**dados)
+    db.session.add(cliente)
+    db.session.commit()
+    return cliente
+
+
+class PonteFalsa:
+    """Ponte Node de mentira, servida em uma porta local.
+
+    `programar(caminho, (status, atraso), ...)` define as respostas do
+    caminho, consumidas em ordem; a última se repete. `chamadas` guarda
+    (método, caminho, porta do cliente) de cada requisição recebida.
+    """
+
+    def __init__(self):
+        self.respostas = {}
+        self.chamadas = []
+        self._lock = threading.Lock()
+        ponte = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _responder(self):
+                tamanho = int(self.headers.get('Content-Length') or 0)
+                if tamanho:
+                    self.rfile.read(tamanho)
+                status, atraso = ponte._proxima(self.command, self.path, self.client_address[1])
+                time.sleep(atraso)
+                corpo = json.dumps({'success': status == 200, 'connected': True}).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(corpo)))
+                    self.end_headers()
+                    self.wfile.write(corpo)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            do_GET = _responder
+            do_POST = _responder
+
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.servidor.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.servidor.server_port}'
+        threading.Thread(target=self.servidor.serve_forever, args=(0.05,), daemon=True).start()
+
+    def programar(self, caminho, *respostas):
+        with self._lock:
+            self.respostas[caminho] = list(respostas)
+
+    def contar(self, caminho):
+        with self._lock:
+            return sum(1 for _, chamado, _ in self.chamadas if chamado == caminho)
+
+    def _proxima(self, metodo, caminho, porta):
+        with self._lock:
+            self.chamadas.append((metodo, caminho, porta))
+            respostas = self.respostas.get(caminho, [(200, 0)])
+            return respostas.pop(0) if len(respostas) > 1 else respostas[0]
+
+    def fechar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+@pytest.fixture
+def ponte_falsa():
+    ponte = PonteFalsa()
+    yield ponte
+    ponte.fechar()
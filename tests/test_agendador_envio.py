@@ -0,0 +1,92 @@
+"""
+Reagendamento dos clientes devidos conforme o resultado do disparo
+"""
+from datetime import date, datetime, timedelta
+import pytest
+from src.models.user import db
+from src.models.configuracao import Configuracao
+from src.models.renovacao import Renovacao
+from src.services import agendador_envio as modulo
+from src.services.agendador_envio import AgendadorEnvio
+from tests.conftest import criar_cliente
+
+
+@pytest.fixture
+def agendador(app, monkeypatch):
+    # Janela aberta o dia todo, todos os dias, para o teste rodar a qualquer hora
+    Configuracao.set_configuracao('whatsapp_horario_inicio', '00:00')
+    Configuracao.set_configuracao('whatsapp_horario_fim', '23:59')
+    Configuracao.set_configuracao('whatsapp_dias_funcionamento', modulo.DIAS_SEMANA, tipo='json')
+    monkeypatch.setattr(modulo, 'ESPERA_NOVA_TENTATIVA', 1)
+
+    agendador = AgendadorEnvio()
+    agendador.init_app(app)
+    return agendador
+
+
+def devidos_agora(agendador):
+    agendador.reconstruir()
+    with agendador._cond:
+        return sorted(agendador._retirar_devidos(datetime.now()))
+
+
+def test_so_os_resolvidos_vao_para_o_proximo_dia(agendador):
+    hoje = date.today()
+    # Aviso de antecedência hoje; o próximo é o do vencimento, daqui a 3 dias
+    enfileirado = criar_cliente(data_vencimento=hoje + timedelta(days=3))
+    nao_enfileirado = criar_cliente(data_vencimento=hoje + timedelta(days=3), telefone='11987650000')
+    renovado = criar_cliente(data_vencimento=hoje + timedelta(days=3), telefone='11987651111')
+
+    devidos = devidos_agora(agendador)
+    assert devidos == [enfileirado.id, nao_enfileirado.id, renovado.id]
+
+    # Renovado depois de ficar devido: deixou de ser elegível
+    db.session.add(Renovacao(
+        cliente_id=renovado.id, data_renovacao=hoje,
+        data_vencimento_anterior=renovado.data_vencimento,
+        data_vencimento_nova=renovado.data_vencimento,
+        dias_renovados=30, valor_pago=30.0
+    ))
+    db.session.commit()
+
+    agendador.disparar = lambda ids: [enfileirado.id]
+    antes = datetime.now()
+    agendador._atender(devidos)
+
+    vencimento = hoje + timedelta(days=3)
+    assert agendador._proximos[enfileirado.id].date() == vencimento
+    assert agendador._proximos[renovado.id].date() == vencimento
+    # Continua elegível: nova tentativa ainda hoje, depois da espera
+    nova_tentativa = agendador._proximos[nao_enfileirado.id]
+    assert nova_tentativa.date() == hoje
+    assert nova_tentativa >= antes + timedelta(seconds=modulo.ESPERA_NOVA_TENTATIVA)
+
+
+def test_erro_no_disparo_tenta_de_novo(agendador):
+    cliente = criar_cliente(data_vencimento=date.today())
+    devidos = devidos_agora(agendador)
+    assert devidos == [cliente.id]
+
+    def disparar(ids):
+        raise RuntimeError('ponte fora do ar')
+
+    agendador.disparar = disparar
+    agendador._atender(devidos)
+
+    assert agendador._proximos[cliente.id].date() == date.today()
+
+
+def test_nada_enfileirado_tenta_de_novo(agendador):
+    cliente = criar_cliente(data_vencimento=date.today())
+    devidos = devidos_agora(agendador)
+
+    agendador.disparar = lambda ids: []
+    agendador._atender(devidos)
+    assert agendador._proximos[cliente.id].date() == date.today()
+
+    # Enfileirado na nova tentativa: o vencimento era o último aviso
+    with agendador._cond:
+        agendador._proximos.pop(cliente.id)
+    agendador.disparar = lambda ids: list(ids)
+    agendador._atender(devidos)
+    assert cliente.id not in agendador._proximos
@@ -0,0 +1,134 @@
+"""
+Arquivamento mensal de logs: cada mês é gravado uma vez, e a listagem por
+intervalo de datas intercala arquivo e tabela sem perder nem repetir logs
+nas bordas das páginas
+"""
+import random
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import insert
+from src.models.user import db
+from src.models.fila_envio import FilaEnvio
+from src.models.log_mensagem import LogMensagem
+from src.services import arquivo_logs
+from tests.conftest import criar_cliente
+
+AGORA = datetime.utcnow().replace(microsecond=0)
+
+
+@pytest.fixture
+def logs(app):
+    """Logs espalhados por ~5 meses, alguns com o mesmo instante"""
+    gerador = random.Random(3)
+    clientes = [criar_cliente(nome_completo=f'Cliente {indice}', telefone=f'119{indice:08d}')
+                for indice in range(3)]
+    linhas = []
+    for indice in range(120):
+        data_criacao = AGORA - timedelta(days=gerador.randint(0, 150), minutes=gerador.randint(0, 600))
+        linhas.append({
+            'cliente_id': gerador.choice(clientes).id,
+            'telefone_destino': '5511900000000',
+            'mensagem': f'Mensagem {indice}',
+            'status': gerador.choice(['enviada', 'enviada', 'falha']),
+            'tipo_notificacao': 'automatica',
+            'tentativas': 1,
+            'data_criacao': data_criacao
+        })
+    # Empates em data_criacao: a ordem segue pelo id
+    linhas += [dict(linhas[0], mensagem=f'Empate {indice}') for indice in range(3)]
+    db.session.execute(insert(LogMensagem), linhas)
+    db.session.commit()
+    return clientes
+
+
+def todas_as_chaves():
+    return sorted(
+        ((log.data_criacao, log.id) for log in LogMensagem.query.all()),
+        reverse=True
+    )
+
+
+def test_cada_mes_gravado_uma_vez(logs, monkeypatch):
+    limite = AGORA - timedelta(days=40)
+    esperados = {}
+    for log in LogMensagem.query.filter(LogMensagem.data_criacao < limite):
+        mes = log.data_criacao.strftime('%Y-%m')
+        esperados[mes] = esperados.get(mes, 0) + 1
+    # Log antigo ainda na fila de envio não sai da tabela
+    preso = LogMensagem.query.filter(LogMensagem.data_criacao < limite).first()
+    db.session.add(FilaEnvio(cliente_id=preso.cliente_id, log_mensagem_id=preso.id,
+                             telefone_destino=preso.telefone_destino, mensagem=preso.mensagem))
+    db.session.commit()
+    preso_id = preso.id
+    esperados[preso.data_criacao.strftime('%Y-%m')] -= 1
+
+    gravacoes = []
+    gravar = arquivo_logs._gravar_mes
+    monkeypatch.setattr(arquivo_logs, '_gravar_mes', lambda mes, registros: (gravacoes.append(mes),
+                                                                             gravar(mes, registros)))
+
+    # Lotes pequenos: vários lotes por mês e lotes que cruzam a virada do mês
+    movidos = arquivo_logs.arquivar(dias=40, tamanho_lote=7)
+
+    assert movidos == {mes: quantidade for mes, quantidade in esperados.items() if quantidade}
+    assert sorted(gravacoes) == sorted(movidos)
+    assert [log.id for log in LogMensagem.query.filter(LogMensagem.data_criacao < limite)] == [preso_id]
+    for mes, quantidade in movidos.items():
+        registros = arquivo_logs.ler_mes(mes)
+        assert len(registros) == quantidade
+        assert registros[0]['cliente_nome'].startswith('Cliente ')
+
+    # Nova execução sem nada para arquivar não regrava os meses
+    assert arquivo_logs.arquivar(dias=40, tamanho_lote=7) == {}
+    assert sorted(gravacoes) == sorted(movidos)
+
+
+@pytest.mark.parametrize('por_pagina', [1, 7, 50])
+def test_listagem_por_intervalo_intercala_arquivo_e_tabela(client, logs, por_pagina):
+    esperado = [log_id for _, log_id in todas_as_chaves()]
+    arquivo_logs.arquivar(dias=40, tamanho_lote=9)
+    assert LogMensagem.query.count() < len(esperado)
+
+    intervalo = {
+        'data_inicio': (AGORA - timedelta(days=200)).strftime('%Y-%m-%d'),
+        'data_fim': AGORA.strftime('%Y-%m-%d'),
+        'per_page': por_pagina
+    }
+
+    # Por página
+    por_numero = []
+    page = 1
+    while True:
+        resposta = client.get('/api/logs', query_string=dict(intervalo, page=page)).get_json()
+        assert resposta['total'] == len(esperado)
+        assert len(resposta['logs']) <= por_pagina
+        por_numero += [log['id'] for log in resposta['logs']]
+        if not resposta['has_next']:
+            break
+        page += 1
+    assert por_numero == esperado
+
+    # Por cursor
+    por_cursor = []
+    cursor = ''
+    while True:
+        resposta = client.get('/api/logs', query_string=dict(intervalo, cursor=cursor)).get_json()
+        assert len(resposta['logs']) <= por_pagina
+        por_cursor += [log['id'] for log in resposta['logs']]
+        if not resposta['has_next']:
+            break
+        cursor = resposta['next_cursor']
+    assert por_cursor == esperado
+
+
+def test_cache_de_meses_limitado(logs, monkeypatch):
+    monkeypatch.setattr(arquivo_logs, '_cache', arquivo_logs.OrderedDict())
+    monkeypatch.setattr(arquivo_logs, 'MESES_EM_CACHE', 2)
+    movidos = arquivo_logs.arquivar(dias=1)
+    assert len(movidos) > 2
+
+    for mes in movidos:
+        arquivo_logs.ler_mes(mes)
+
+    assert len(arquivo_logs._cache) == 2
+    assert list(arquivo_logs._cache) == [arquivo_logs._caminho(mes) for mes in sorted(movidos)[-2:]]
@@ -0,0 +1,111 @@
+"""
+Equivalência entre a consulta de avisos pendentes (Cliente.buscar_avisos_pendentes)
+e as regras por cliente que ela substituiu
+"""
+from datetime import date, datetime, timedelta
+from src.models.user import db
+from src.models.cliente import Cliente
+from src.models.renovacao import Renovacao
+from tests.conftest import criar_cliente
+
+
+def avisos_pelas_regras():
+    """Regras da rota /clientes/avisos-pendentes antes da consulta única"""
+    avisos = {}
+    for cliente in Cliente.query.filter_by(ativo=True).all():
+        if cliente.precisa_aviso_antecedencia() and not cliente.foi_renovado_recentemente():
+            if cliente.pode_enviar_mensagem():
+                avisos[cliente.id] = 'antecedencia'
+        elif cliente.vence_hoje() and not cliente.foi_renovado_recentemente():
+            if cliente.pode_enviar_mensagem():
+                avisos[cliente.id] = 'vencimento'
+    return avisos
+
+
+def renovar(cliente, data_renovacao):
+    db.session.add(Renovacao(
+        cliente_id=cliente.id,
+        data_renovacao=data_renovacao,
+        data_vencimento_anterior=cliente.data_vencimento,
+        data_vencimento_nova=cliente.data_vencimento + timedelta(days=30),
+        dias_renovados=30,
+        valor_pago=30.0
+    ))
+    db.session.commit()
+
+
+def test_consulta_equivale_as_regras_por_cliente(app):
+    hoje = date.today()
+    agora = datetime.utcnow()
+    casos = {}
+
+    # Vencimento hoje e aviso de antecedência (D-3), com os vizinhos da janela
+    casos['vence_hoje'] = criar_cliente(data_vencimento=hoje)
+    casos['antecedencia'] = criar_cliente(data_vencimento=hoje + timedelta(days=3))
+    casos['antecedencia_menos_1'] = criar_cliente(data_vencimento=hoje + timedelta(days=2))
+    casos['antecedencia_mais_1'] = criar_cliente(data_vencimento=hoje + timedelta(days=4))
+    casos['venceu_ontem'] = criar_cliente(data_vencimento=hoje - timedelta(days=1))
+    casos['vence_amanha'] = criar_cliente(data_vencimento=hoje + timedelta(days=1))
+    casos['antecedencia_zero'] = criar_cliente(data_vencimento=hoje, dias_aviso_antecedencia=0)
+    casos['antecedencia_negativa'] = criar_cliente(data_vencimento=hoje - timedelta(days=1), dias_aviso_antecedencia=-1)
+    casos['sem_antecedencia'] = criar_cliente(data_vencimento=hoje, dias_aviso_antecedencia=None)
+    casos['antecedencia_longa'] = criar_cliente(data_vencimento=hoje + timedelta(days=30), dias_aviso_antecedencia=30)
+
+    # Aviso ou cliente inativo
+    casos['aviso_inativo_antecedencia'] = criar_cliente(data_vencimento=hoje + timedelta(days=3), aviso_ativo=False)
+    casos['aviso_inativo_vence_hoje'] = criar_cliente(data_vencimento=hoje, aviso_ativo=False)
+    casos['cliente_inativo'] = criar_cliente(data_vencimento=hoje, ativo=False)
+    casos['cliente_inativo_antecedencia'] = criar_cliente(data_vencimento=hoje + timedelta(days=3), ativo=False)
+
+    # Renovações: hoje e ontem bloqueiam o aviso, anteontem não
+    for nome, dias in (('renovado_hoje', 0), ('renovado_ontem', 1), ('renovado_anteontem', 2)):
+        casos[nome] = criar_cliente(data_vencimento=hoje)
+        renovar(casos[nome], hoje - timedelta(days=dias))
+    casos['renovado_ontem_antecedencia'] = criar_cliente(data_vencimento=hoje + timedelta(days=3))
+    renovar(casos['renovado_ontem_antecedencia'], hoje - timedelta(days=1))
+
+    # Janela de 2 horas contra spam
+    casos['enviado_1h59'] = criar_cliente(
+        data_vencimento=hoje, ultima_mensagem_enviada=agora - timedelta(hours=1, minutes=59))
+    casos['enviado_2h01'] = criar_cliente(
+        data_vencimento=hoje, ultima_mensagem_enviada=agora - timedelta(hours=2, minutes=1))
+    casos['antecedencia_enviado_1h59'] = criar_cliente(
+        data_vencimento=hoje + timedelta(days=3), ultima_mensagem_enviada=agora - timedelta(hours=1, minutes=59))
+    casos['antecedencia_enviado_2h01'] = criar_cliente(
+        data_vencimento=hoje + timedelta(days=3), ultima_mensagem_enviada=agora - timedelta(hours=2, minutes=1))
+
+    db.session.expire_all()
+    esperado = avisos_pelas_regras()
+    consulta = {cliente.id: tipo for cliente, tipo in Cliente.buscar_avisos_pendentes(hoje)}
+
+    assert consulta == esperado
+
+    # As regras antigas são a referência; conferir que os casos de borda
+    # caíram do lado certo para o teste não passar por engano
+    ids = {nome: cliente.id for nome, cliente in casos.items()}
+    assert esperado == {
+        ids['vence_hoje']: 'vencimento',
+        ids['antecedencia']: 'antecedencia',
+        ids['antecedencia_zero']: 'antecedencia',
+        ids['antecedencia_negativa']: 'antecedencia',
+        ids['sem_antecedencia']: 'vencimento',
+        ids['antecedencia_longa']: 'antecedencia',
+        ids['aviso_inativo_vence_hoje']: 'vencimento',
+        ids['renovado_anteontem']: 'vencimento',
+        ids['enviado_2h01']: 'vencimento',
+        ids['antecedencia_enviado_2h01']: 'antecedencia',
+    }
+
+
+def test_consulta_restrita_aos_clientes_informados(app):
+    hoje = date.today()
+    primeiro = criar_cliente(data_vencimento=hoje)
+    segundo = criar_cliente(data_vencimento=hoje + timedelta(days=3))
+    criar_cliente(data_vencimento=hoje)
+
+    avisos = Cliente.buscar_avisos_pendentes(hoje, cliente_ids=[primeiro.id, segundo.id])
+
+    assert [(cliente.id, tipo) for cliente, tipo in avisos] == [
+        (primeiro.id, 'vencimento'),
+        (segundo.id, 'antecedencia')
+    ]
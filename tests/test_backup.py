@@ -0,0 +1,167 @@
+"""
+Backups: o completo seguido dos incrementais reproduz o banco, inclusive as
+exclusões; arquivo corrompido é recusado antes de alterar o banco; a
+restauração espera os envios em andamento e não deixa gravações pendentes
+caírem no banco restaurado
+"""
+import gzip
+import os
+import threading
+from datetime import datetime
+import pytest
+from sqlalchemy import select
+from src.models.user import db
+from src.models.cliente import Cliente
+from src.models.versao_recurso import VersaoRecurso
+from src.services import backup
+from src.services.escritor_lote import escritor_lote
+from src.services.whatsapp_service import whatsapp_service
+from tests.conftest import criar_cliente
+
+
+def estado_clientes():
+    db.session.expire_all()
+    return {cliente.id: (cliente.nome_completo, cliente.valor_plano) for cliente in Cliente.query}
+
+
+def versoes():
+    return dict(db.session.execute(select(VersaoRecurso.recurso, VersaoRecurso.versao)).all())
+
+
+@pytest.fixture
+def cadeia(app):
+    """Completo com três clientes e um incremental com uma alteração, uma exclusão e uma inclusão"""
+    ana = criar_cliente(nome_completo='Ana Souza', telefone='11911111111')
+    bruno = criar_cliente(nome_completo='Bruno Lima', telefone='11922222222')
+    carla = criar_cliente(nome_completo='Carla Dias', telefone='11933333333')
+    VersaoRecurso.incrementar('clientes')
+    db.session.commit()
+    completo = backup.completo()
+    no_completo = estado_clientes()
+
+    ana.valor_plano = 45.0
+    db.session.delete(bruno)
+    criar_cliente(nome_completo='Daniel Rocha', telefone='11944444444')
+    incremental = backup.incremental()
+    no_incremental = estado_clientes()
+
+    # Mudanças posteriores, que a restauração deve desfazer
+    db.session.delete(db.session.get(Cliente, carla.id))
+    criar_cliente(nome_completo='Elisa Prado', telefone='11955555555')
+    return completo, no_completo, incremental, no_incremental
+
+
+def test_restaurar_completo_e_incremental(client, cadeia):
+    completo, no_completo, incremental, no_incremental = cadeia
+
+    assert backup.restaurar(incremental['nome']) == [completo['nome'], incremental['nome']]
+    assert estado_clientes() == no_incremental
+    nomes = sorted(nome for nome, _ in no_incremental.values())
+    assert nomes == ['Ana Souza', 'Carla Dias', 'Daniel Rocha']
+
+    # O índice de busca acompanha o banco restaurado
+    response = client.get('/api/clientes', query_string={'q': 'Bruno'})
+    assert response.get_json()['clientes'] == []
+    response = client.get('/api/clientes', query_string={'q': 'Daniel'})
+    assert [item['nome_completo'] for item in response.get_json()['clientes']] == ['Daniel Rocha']
+
+    assert backup.restaurar(completo['nome']) == [completo['nome']]
+    assert estado_clientes() == no_completo
+
+
+def test_linha_excluida_continua_excluida(cadeia):
+    _, no_completo, incremental, no_incremental = cadeia
+    excluido = next(id_cliente for id_cliente in no_completo if id_cliente not in no_incremental)
+
+    backup.restaurar(incremental['nome'])
+
+    assert db.session.get(Cliente, excluido) is None
+
+
+def test_arquivo_corrompido_e_recusado(app, cadeia):
+    completo, _, incremental, _ = cadeia
+    antes = estado_clientes()
+    caminho = os.path.join(app.config['DIRETORIO_BACKUPS'], completo['nome'])
+    with open(caminho, 'r+b') as arquivo:
+        arquivo.seek(os.path.getsize(caminho) // 2)
+        byte = arquivo.read(1)
+        arquivo.seek(-1, os.SEEK_CUR)
+        arquivo.write(bytes([byte[0] ^ 0xFF]))
+
+    assert not backup.verificar(completo['nome'])
+    # O incremental depende do completo corrompido: a cadeia inteira é recusada
+    with pytest.raises(backup.ErroBackup, match='corrompido'):
+        backup.restaurar(incremental['nome'])
+    assert estado_clientes() == antes
+
+
+def test_arquivo_adulterado_com_gzip_valido_e_recusado(app, cadeia):
+    _, _, incremental, _ = cadeia
+    caminho = os.path.join(app.config['DIRETORIO_BACKUPS'], incremental['nome'])
+    with gzip.open(caminho, 'rt', encoding='utf-8') as arquivo:
+        conteudo = arquivo.read()
+    with gzip.open(caminho, 'wt', encoding='utf-8') as arquivo:
+        arquivo.write(conteudo.replace('Daniel Rocha', 'Daniel Rocho'))
+
+    with pytest.raises(backup.ErroBackup):
+        backup.restaurar(incremental['nome'])
+
+
+def test_versoes_de_cache_avancam(cadeia):
+    _, _, incremental, _ = cadeia
+    antes = versoes()
+
+    backup.restaurar(incremental['nome'])
+
+    depois = versoes()
+    # O backup tem versões menores que as atuais; ETags já emitidas não podem voltar a valer
+    assert all(depois[recurso] > versao for recurso, versao in antes.items())
+
+
+def test_gravacoes_pendentes_nao_caem_no_banco_restaurado(app, cadeia, monkeypatch):
+    _, _, incremental, no_incremental = cadeia
+    monkeypatch.setattr(escritor_lote, 'app', app)
+    # Intervalo longo: só a descarga da restauração grava o buffer
+    monkeypatch.setattr(escritor_lote, 'intervalo', 60)
+    id_cliente = next(iter(no_incremental))
+    escritor_lote.marcar_mensagem_enviada(id_cliente, datetime.utcnow())
+
+    try:
+        backup.restaurar(incremental['nome'])
+        assert escritor_lote.pendentes() == 0
+        db.session.expire_all()
+        assert db.session.get(Cliente, id_cliente).ultima_mensagem_enviada is None
+    finally:
+        escritor_lote.parar()
+
+
+def test_restauracao_espera_o_lote_em_andamento(app, cadeia):
+    _, _, incremental, no_incremental = cadeia
+    assert whatsapp_service._iniciar_lote()
+    restaurados = []
+
+    def restaurar():
+        with app.app_context():
+            restaurados.extend(backup.restaurar(incremental['nome']))
+
+    thread = threading.Thread(target=restaurar)
+    thread.start()
+    try:
+        thread.join(0.3)
+        assert thread.is_alive() and not restaurados
+    finally:
+        whatsapp_service._terminar_lote()
+    thread.join(10)
+
+    assert len(restaurados) == 2
+    assert estado_clientes() == no_incremental
+    # Sem pausas pendentes, os trabalhadores voltam a reivindicar lotes
+    assert whatsapp_service._iniciar_lote(espera=0)
+    whatsapp_service._terminar_lote()
+
+
+def test_trabalhadores_nao_reivindicam_lotes_durante_a_pausa():
+    with whatsapp_service.pausado():
+        assert not whatsapp_service._iniciar_lote(espera=0.05)
+    assert whatsapp_service._iniciar_lote(espera=0)
+    whatsapp_service._terminar_lote()
@@ -0,0 +1,163 @@
+"""
+Busca textual: os índices FTS5 acompanham inserções, alterações e exclusões,
+os resultados vêm por relevância, texto com operadores ou aspas nunca vira
+erro 500 e a busca nos logs se limita aos JANELA_RELEVANCIA mais recentes
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import insert
+from src.models.user import db
+from src.models.log_mensagem import LogMensagem
+from src.services import busca
+from tests.conftest import criar_cliente
+
+
+def buscar_clientes(client, texto, **parametros):
+    response = client.get('/api/clientes', query_string=dict(parametros, q=texto))
+    assert response.status_code == 200
+    return [item['nome_completo'] for item in response.get_json()['clientes']]
+
+
+def buscar_logs(client, texto, **parametros):
+    response = client.get('/api/logs', query_string=dict(parametros, q=texto))
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_indice_acompanha_insercao_alteracao_e_exclusao(client):
+    cliente = criar_cliente(nome_completo='João Silva', telefone='11911112222')
+    assert buscar_clientes(client, 'joao sil') == ['João Silva']
+    assert buscar_clientes(client, '11911112222') == ['João Silva']
+
+    cliente.nome_completo = 'Joana Prado'
+    db.session.commit()
+    assert buscar_clientes(client, 'silva') == []
+    assert buscar_clientes(client, 'prado') == ['Joana Prado']
+
+    # Pela API, com o comentário indexado
+    response = client.put(f'/api/clientes/{cliente.id}', json={'comentarios': 'Pagou por transferência'})
+    assert response.status_code == 200
+    assert buscar_clientes(client, 'transferencia') == ['Joana Prado']
+
+    db.session.delete(cliente)
+    db.session.commit()
+    assert buscar_clientes(client, 'prado') == []
+    assert buscar_clientes(client, 'transferencia') == []
+
+
+def test_indice_dos_logs_acompanha_as_alteracoes(client):
+    cliente = criar_cliente()
+    log = LogMensagem(cliente_id=cliente.id, telefone_destino='5511987654321',
+                      mensagem='Seu plano vence amanhã', status='pendente')
+    db.session.add(log)
+    db.session.commit()
+    assert buscar_logs(client, 'vence')['total'] == 1
+
+    # Mudança de status não mexe no índice; o erro passa a ser buscável
+    log.status = 'falha'
+    log.erro_detalhes = 'Número sem WhatsApp'
+    db.session.commit()
+    assert [item['id'] for item in buscar_logs(client, 'vence', status='falha')['logs']] == [log.id]
+    assert buscar_logs(client, 'whatsapp')['total'] == 1
+
+    db.session.delete(log)
+    db.session.commit()
+    assert buscar_logs(client, 'vence')['total'] == 0
+
+
+def test_reconstruir_refaz_o_indice(client):
+    criar_cliente(nome_completo='Maria Souza')
+    db.session.execute(db.text("INSERT INTO clientes_fts(clientes_fts) VALUES ('delete-all')"))
+    db.session.commit()
+    assert buscar_clientes(client, 'maria') == []
+
+    busca.reconstruir()
+    db.session.commit()
+    assert buscar_clientes(client, 'maria') == ['Maria Souza']
+
+
+def test_resultados_por_relevancia(client):
+    criar_cliente(nome_completo='Ana Lima', telefone='11900000001', comentarios='Indicada pela Carla')
+    criar_cliente(nome_completo='Carla Dias', telefone='11900000002')
+    criar_cliente(nome_completo='Bruno Costa', telefone='11900000003')
+
+    # O nome pesa mais que o comentário
+    assert buscar_clientes(client, 'carla') == ['Carla Dias', 'Ana Lima']
+    # Todas as palavras são obrigatórias
+    assert buscar_clientes(client, 'carla dias') == ['Carla Dias']
+
+
+def test_logs_por_relevancia(client):
+    cliente = criar_cliente()
+    db.session.add_all([
+        LogMensagem(cliente_id=cliente.id, telefone_destino='5511987654321', status='falha',
+                    mensagem='Lembrete de pagamento', erro_detalhes='Timeout no pagamento'),
+        LogMensagem(cliente_id=cliente.id, telefone_destino='5511987654321', status='enviada',
+                    mensagem='Pagamento confirmado, obrigado'),
+        LogMensagem(cliente_id=cliente.id, telefone_destino='5511987654321', status='enviada',
+                    mensagem='Plano renovado'),
+    ])
+    db.session.commit()
+
+    resposta = buscar_logs(client, 'pagamento')
+    assert resposta['total'] == 2
+    assert [item['mensagem'] for item in resposta['logs']] == ['Lembrete de pagamento',
+                                                               'Pagamento confirmado, obrigado']
+
+
+@pytest.mark.parametrize('texto, encontrados', [
+    # Pontuação e aspas são separadores
+    ('-ana', ['Ana Lima']), ('^ana', ['Ana Lima']), ('ana*', ['Ana Lima']), ('"ana', ['Ana Lima']),
+    ('ana"', ['Ana Lima']), ('"ana lima"', ['Ana Lima']), ('(ana', ['Ana Lima']), ('ana + lima', ['Ana Lima']),
+    # Operadores e nomes de coluna viram palavras comuns, que também precisam casar
+    ('NEAR(ana lima)', []), ('ana OR bruno', []), ('ana AND', []), ('NOT ana', []),
+    ('nome_completo:ana', []), ('{nome_completo}: ana', []), ("d'ana", []),
+])
+def test_operadores_e_aspas_sao_texto(client, texto, encontrados):
+    criar_cliente(nome_completo='Ana Lima')
+    criar_cliente(nome_completo='Bruno Costa', telefone='11900000003')
+
+    assert buscar_clientes(client, texto) == encontrados
+    response = client.get('/api/logs', query_string={'q': texto})
+    assert response.status_code == 200
+    assert response.get_json()['logs'] == []
+
+
+@pytest.mark.parametrize('texto', ['', '   ', '"', '***', '()', '-'])
+def test_busca_sem_palavras_e_recusada(client, texto):
+    for caminho in ('/api/clientes', '/api/logs'):
+        response = client.get(caminho, query_string={'q': texto})
+        assert response.status_code == 400
+        assert 'erro' in response.get_json()
+
+
+def test_expressao():
+    assert busca.expressao('João  sil') == '"João"* "sil"*'
+    assert busca.expressao('a"b OR c') == '"a"* "b"* "OR"* "c"*'
+    with pytest.raises(busca.BuscaInvalida):
+        busca.expressao('"*"')
+
+
+def test_busca_nos_logs_limitada_aos_mais_recentes(client):
+    cliente = criar_cliente()
+    inicio = datetime.utcnow() - timedelta(days=1)
+    excedentes = 150
+    db.session.execute(insert(LogMensagem), [
+        {'cliente_id': cliente.id, 'telefone_destino': '5511987654321', 'mensagem': f'Aviso de vencimento {indice}',
+         'status': 'enviada', 'tentativas': 1, 'data_criacao': inicio + timedelta(seconds=indice)}
+        for indice in range(busca.JANELA_RELEVANCIA + excedentes)
+    ])
+    db.session.commit()
+    primeiro_recente = db.session.query(LogMensagem.id).order_by(LogMensagem.id).offset(excedentes).limit(1).scalar()
+
+    resposta = buscar_logs(client, 'vencimento', per_page=100, page=50)
+    assert resposta['total'] == busca.JANELA_RELEVANCIA
+    assert resposta['pages'] == 50
+    assert len(resposta['logs']) == 100
+    assert not resposta['has_next']
+    ids = busca.recentes(LogMensagem.query, 'logs_mensagem', LogMensagem.id, 'vencimento')
+    assert len(ids) == busca.JANELA_RELEVANCIA
+    assert min(ids) == primeiro_recente
+
+    # Um log antigo ainda é encontrado por um termo raro: a janela é das linhas que casam
+    assert [item['mensagem'] for item in buscar_logs(client, '"0"')['logs']] == ['Aviso de vencimento 0']
@@ -0,0 +1,134 @@
+"""
+Cliente HTTP da ponte Node contra uma ponte falsa local: novas tentativas
+com backoff, timeouts de conexão e leitura separados e POST sem repetição
+em erro de leitura
+"""
+import socket
+import time
+import pytest
+import requests
+from src.services.cliente_ponte import ClientePonteWhatsApp, falhou_antes_do_envio
+
+
+def criar_cliente(url, **opcoes):
+    opcoes.setdefault('jitter', 0)
+    return ClientePonteWhatsApp(url, **opcoes)
+
+
+def porta_livre():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_get_repetido_em_503_com_backoff(ponte_falsa):
+    ponte_falsa.programar('/status', (503, 0), (503, 0), (200, 0))
+    cliente = criar_cliente(ponte_falsa.url, fator_espera=0.1)
+
+    inicio = time.monotonic()
+    response = cliente.status()
+    duracao = time.monotonic() - inicio
+
+    assert response.status_code == 200
+    assert ponte_falsa.contar('/status') == 3
+    # urllib3 não espera antes da primeira repetição; a segunda espera
+    # fator_espera * 2
+    assert duracao >= 0.2
+    assert cliente.estatisticas()['/status']['repeticoes'] == 2
+
+
+def test_get_desiste_depois_das_tentativas(ponte_falsa):
+    ponte_falsa.programar('/health', (503, 0))
+    cliente = criar_cliente(ponte_falsa.url, tentativas=2, fator_espera=0)
+
+    response = cliente.saude()
+
+    assert response.status_code == 503
+    assert ponte_falsa.contar('/health') == 3
+    assert cliente.estatisticas()['/health']['erros'] == 1
+
+
+def test_get_repetido_em_timeout_de_leitura(ponte_falsa):
+    ponte_falsa.programar('/qr', (200, 0.5), (200, 0))
+    cliente = criar_cliente(ponte_falsa.url, tempo_leitura=0.2, fator_espera=0)
+
+    response = cliente.qr()
+
+    assert response.status_code == 200
+    assert ponte_falsa.contar('/qr') == 2
+
+
+def test_post_nao_repetido_em_timeout_de_leitura(ponte_falsa):
+    ponte_falsa.programar('/send-message', (200, 0.5))
+    cliente = criar_cliente(ponte_falsa.url, tempo_leitura_envio=0.2, fator_espera=0)
+
+    with pytest.raises(requests.exceptions.ReadTimeout) as erro:
+        cliente.enviar_mensagem('5511987654321@c.us', 'Olá')
+
+    # A ponte recebeu a mensagem uma única vez: repetir poderia duplicá-la
+    assert not falhou_antes_do_envio(erro.value)
+    time.sleep(0.4)
+    assert ponte_falsa.contar('/send-message') == 1
+    assert cliente.estatisticas()['/send-message']['erros'] == 1
+
+
+def test_post_nao_repetido_em_erro_do_servidor(ponte_falsa):
+    ponte_falsa.programar('/send-message', (503, 0), (200, 0))
+    cliente = criar_cliente(ponte_falsa.url, fator_espera=0)
+
+    response = cliente.enviar_mensagem('5511987654321@c.us', 'Olá')
+
+    assert response.status_code == 503
+    assert ponte_falsa.contar('/send-message') == 1
+
+
+def test_timeout_de_leitura_do_envio_separado_do_geral(ponte_falsa):
+    ponte_falsa.programar('/status', (200, 0.4))
+    ponte_falsa.programar('/send-message', (200, 0.4))
+    cliente = criar_cliente(ponte_falsa.url, tempo_leitura=0.2, tempo_leitura_envio=2,
+                            tentativas=0)
+
+    # O envio espera a ponte pelo tempo de leitura próprio...
+    assert cliente.enviar_mensagem('5511987654321@c.us', 'Olá').status_code == 200
+    # ...e as consultas, pelo tempo geral (o urllib3 embrulha o timeout de
+    # leitura em MaxRetryError quando as tentativas se esgotam)
+    with pytest.raises(requests.exceptions.RequestException, match='Read timed out'):
+        cliente.status()
+
+
+def test_timeouts_de_conexao_e_leitura_passados_separados(ponte_falsa):
+    cliente = criar_cliente(ponte_falsa.url, tempo_conexao=1.5, tempo_leitura=7, tempo_leitura_envio=20)
+    timeouts = []
+    requisitar = cliente.sessao.request
+
+    def registrar(metodo, url, **kwargs):
+        timeouts.append((metodo, kwargs['timeout']))
+        return requisitar(metodo, url, **kwargs)
+
+    cliente.sessao.request = registrar
+    cliente.status()
+    cliente.saude()
+    cliente.enviar_mensagem('5511987654321@c.us', 'Olá')
+
+    assert timeouts == [('GET', (1.5, 7)), ('GET', (1.5, 5)), ('POST', (1.5, 20))]
+
+
+def test_post_em_ponte_fora_do_ar_falha_na_conexao():
+    cliente = criar_cliente(f'http://127.0.0.1:{porta_livre()}', fator_espera=0)
+
+    # Erro de conexão: a mensagem não chegou à ponte e pode ir por outra sessão
+    with pytest.raises(requests.exceptions.ConnectionError) as erro:
+        cliente.enviar_mensagem('5511987654321@c.us', 'Olá')
+    assert falhou_antes_do_envio(erro.value)
+
+
+def test_conexao_reaproveitada_entre_chamadas(ponte_falsa):
+    cliente = criar_cliente(ponte_falsa.url)
+
+    for _ in range(5):
+        cliente.status()
+        cliente.enviar_mensagem('5511987654321@c.us', 'Olá')
+
+    portas = {porta for _, _, porta in ponte_falsa.chamadas}
+    assert len(ponte_falsa.chamadas) == 10
+    assert len(portas) == 1
@@ -0,0 +1,74 @@
+"""
+Cache de configurações: vale só para o banco em que foi carregado, é
+descartado depois do commit (e não antes) e ignora alterações desfeitas
+"""
+import threading
+from flask import Flask
+from src.models.user import db
+from src.models.configuracao import Configuracao
+from src.models.versao_recurso import APOS_COMMIT
+from src.database.migracoes import aplicar_migracoes
+
+
+def test_alteracao_visivel_logo_apos_o_commit(app):
+    Configuracao.set_configuracao('whatsapp_tamanho_lote', 10, tipo='integer')
+    assert Configuracao.get_configuracao('whatsapp_tamanho_lote') == 10
+
+    Configuracao.set_configuracao('whatsapp_tamanho_lote', 25, tipo='integer')
+    assert Configuracao.get_configuracao('whatsapp_tamanho_lote') == 25
+
+
+def test_leitura_antes_do_commit_nao_fica_em_cache(app):
+    """Um leitor que recarrega o cache entre o invalidar_cache() e o commit
+    não faz a alteração esperar INTERVALO_VERIFICACAO para aparecer"""
+    Configuracao.set_configuracao('whatsapp_tamanho_lote', 10, tipo='integer')
+    lidos = []
+
+    def ler():
+        with app.app_context():
+            lidos.append(Configuracao.get_configuracao('whatsapp_tamanho_lote'))
+            db.session.remove()
+
+    config = Configuracao.query.filter_by(chave='whatsapp_tamanho_lote').one()
+    config.set_valor_tipado(25)
+    Configuracao.invalidar_cache()
+    db.session.flush()
+
+    leitor = threading.Thread(target=ler)
+    leitor.start()
+    leitor.join(5)
+    db.session.commit()
+
+    assert lidos == [10]
+    assert Configuracao.get_configuracao('whatsapp_tamanho_lote') == 25
+
+
+def test_rollback_descarta_a_invalidacao(app):
+    Configuracao.set_configuracao('whatsapp_tamanho_lote', 10, tipo='integer')
+    Configuracao.invalidar_cache()
+    assert db.session.info[APOS_COMMIT]
+
+    db.session.rollback()
+
+    assert APOS_COMMIT not in db.session.info
+    assert Configuracao.get_configuracao('whatsapp_tamanho_lote') == 10
+
+
+def test_banco_novo_nao_herda_o_cache(app, tmp_path):
+    Configuracao.set_configuracao('whatsapp_tamanho_lote', 10, tipo='integer')
+    assert Configuracao.get_configuracao('whatsapp_tamanho_lote') == 10
+
+    # Mesmo número de versão, outro banco
+    outra = Flask(__name__)
+    outra.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'outro.db'}"
+    outra.config['DIRETORIO_ARQUIVO_LOGS'] = str(tmp_path / 'outro_arquivo_logs')
+    db.init_app(outra)
+    with outra.app_context():
+        db.create_all()
+        aplicar_migracoes()
+        Configuracao.set_configuracao('whatsapp_sessoes', 2, tipo='integer')
+
+        assert Configuracao.get_configuracao('whatsapp_tamanho_lote') is None
+        assert Configuracao.get_configuracao('whatsapp_sessoes') == 2
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,139 @@
+"""
+Dashboard: o cache só é servido enquanto as versões de clientes e renovações
+não mudam, inclusive quando foi calculado durante a transação de outra
+escrita, e o GET condicional responde 304 até a próxima escrita
+"""
+import threading
+from datetime import date, timedelta
+from datetime import time as hora
+import pytest
+from src.models.user import db
+from src.models.cliente import Cliente
+from src.services import dashboard
+from tests.conftest import criar_cliente
+
+HOJE = date.today()
+
+
+@pytest.fixture
+def calculos(app, monkeypatch):
+    """Conta as vezes em que o dashboard foi calculado, com o cache vazio"""
+    monkeypatch.setattr(dashboard, '_cache', {'chave': None, 'dados': None, 'calculado_em': 0.0})
+    chamadas = []
+    calcular = dashboard.calcular
+
+    def contar(hoje=None):
+        chamadas.append(hoje)
+        return calcular(hoje)
+
+    monkeypatch.setattr(dashboard, 'calcular', contar)
+    return chamadas
+
+
+def novo_cliente(client, **campos):
+    dados = {
+        'nome_completo': 'Cliente Novo', 'telefone': '11987650000', 'tipo_produto': 'IPTV',
+        'plano_contratado': 'Mensal', 'valor_plano': 30.0,
+        'data_vencimento': (HOJE + timedelta(days=2)).isoformat(), 'horario_envio': '09:00'
+    }
+    dados.update(campos)
+    response = client.post('/api/clientes', json=dados)
+    assert response.status_code == 201
+    return response.get_json()['cliente']['id']
+
+
+def test_dados_por_produto(client, calculos):
+    criar_cliente(tipo_produto='IPTV', data_vencimento=HOJE - timedelta(days=1), valor_plano=30.0)
+    criar_cliente(tipo_produto='IPTV', data_vencimento=HOJE + timedelta(days=3), valor_plano=35.0)
+    criar_cliente(tipo_produto='VPN', data_vencimento=HOJE + timedelta(days=30), valor_plano=15.0)
+    criar_cliente(tipo_produto='VPN', ativo=False)
+
+    dados = client.get('/api/clientes/dashboard').get_json()
+
+    assert dados['produtos']['IPTV'] == {
+        'tipo_produto': 'IPTV', 'clientes_ativos': 2, 'clientes_vencidos': 1,
+        'clientes_vencendo': 1, 'receita_total': 65.0, 'renovacoes_mes': 0
+    }
+    assert dados['produtos']['VPN']['clientes_ativos'] == 1
+    assert dados['produtos']['OUTROS']['clientes_ativos'] == 0
+    assert dados['totais']['clientes_ativos'] == 3
+    assert client.get('/api/clientes/dashboard/vpn').get_json() == dados['produtos']['VPN']
+
+
+def test_cache_reaproveitado_ate_a_proxima_escrita(client, calculos):
+    criar_cliente()
+    primeiro = dashboard.obter()
+    assert dashboard.obter() == primeiro
+    assert len(calculos) == 1
+
+    # A cópia devolvida pode ser alterada sem afetar o cache
+    primeiro['IPTV']['clientes_ativos'] = 99
+    assert dashboard.obter()['IPTV']['clientes_ativos'] == 1
+
+    novo_cliente(client)
+    assert dashboard.obter()['IPTV']['clientes_ativos'] == 2
+    assert len(calculos) == 2
+
+
+def test_tempo_de_vida_expirado_recalcula(app, calculos, monkeypatch):
+    dashboard.obter()
+    monkeypatch.setattr(dashboard, 'TEMPO_VIDA', 0)
+    dashboard.obter()
+    assert len(calculos) == 2
+
+
+def test_calculo_durante_escrita_nao_fica_valendo(app, calculos):
+    """Um leitor que calcula entre o invalidar() e o commit de outra escrita
+    guarda os dados antigos, mas com as versões antigas"""
+    criar_cliente()
+    lidos = []
+
+    def ler():
+        with app.app_context():
+            lidos.append(dashboard.obter()['IPTV']['clientes_ativos'])
+            db.session.remove()
+
+    db.session.add(Cliente(
+        nome_completo='Pendente', telefone='11900000001', tipo_produto='IPTV', plano_contratado='Mensal',
+        valor_plano=30.0, data_vencimento=HOJE, horario_envio=hora(9, 0), ativo=True
+    ))
+    dashboard.invalidar('clientes')
+    db.session.flush()
+
+    leitor = threading.Thread(target=ler)
+    leitor.start()
+    leitor.join(5)
+    db.session.commit()
+
+    assert lidos == [1]
+    assert dashboard.obter()['IPTV']['clientes_ativos'] == 2
+
+
+def test_get_condicional(client, calculos):
+    criar_cliente()
+    response = client.get('/api/clientes/dashboard')
+    etag = response.headers['ETag']
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    response = client.get('/api/clientes/dashboard', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    # O 304 não chega a calcular nem a ler o cache
+    assert len(calculos) == 1
+
+    # Cada URL tem o seu ETag
+    por_produto = client.get('/api/clientes/dashboard/IPTV')
+    assert por_produto.headers['ETag'] != etag
+    response = client.get('/api/clientes/dashboard/IPTV', headers={'If-None-Match': por_produto.headers['ETag']})
+    assert response.status_code == 304
+
+    novo_cliente(client)
+    response = client.get('/api/clientes/dashboard', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['totais']['clientes_ativos'] == 2
+
+
+def test_produto_invalido(client, calculos):
+    assert client.get('/api/clientes/dashboard/radio').status_code == 400
@@ -0,0 +1,85 @@
+"""
+Escritor em lote: descargas simultâneas gravam na ordem em que esvaziaram o
+buffer, sem que uma transição de status antiga sobrescreva a mais nova
+"""
+import threading
+import pytest
+from src.models.user import db
+from src.models.log_mensagem import LogMensagem
+from src.services.escritor_lote import EscritorLote
+from tests.conftest import criar_cliente
+
+
+class LockComPausa:
+    """Lock cuja primeira aquisição espera `liberar` antes de adquirir"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.esperando = threading.Event()
+        self.liberar = threading.Event()
+        self._primeira = True
+
+    def __enter__(self):
+        if self._primeira:
+            self._primeira = False
+            self.esperando.set()
+            self.liberar.wait(2)
+        self._lock.acquire()
+        return self
+
+    def __exit__(self, *excecao):
+        self._lock.release()
+
+
+@pytest.fixture
+def escritor(app):
+    escritor = EscritorLote(intervalo=60)
+    escritor.app = app
+    yield escritor
+    escritor.parar()
+
+
+@pytest.fixture
+def log(app):
+    cliente = criar_cliente()
+    log = LogMensagem(cliente_id=cliente.id, telefone_destino='5511987654321', mensagem='Olá',
+                      status='pendente', tipo_notificacao='automatica')
+    db.session.add(log)
+    db.session.commit()
+    return log.id
+
+
+def status(log_id):
+    db.session.expire_all()
+    return db.session.get(LogMensagem, log_id).status
+
+
+def test_descargas_simultaneas_gravam_em_ordem(escritor, log):
+    escritor._lock_gravacao = lock = LockComPausa()
+    escritor.atualizar_log(log, 'enviando')
+
+    # A primeira descarga para logo antes do lock de gravação...
+    primeira = threading.Thread(target=escritor.descarregar)
+    primeira.start()
+    assert lock.esperando.wait(2)
+
+    # ...e a segunda, com a transição mais nova, passa à frente
+    escritor.atualizar_log(log, 'enviada', tentativas=1)
+    segunda = threading.Thread(target=escritor.descarregar)
+    segunda.start()
+    segunda.join(0.5)
+    lock.liberar.set()
+    segunda.join(5)
+    primeira.join(5)
+
+    assert status(log) == 'enviada'
+    assert escritor.pendentes() == 0
+
+
+def test_descarregar_grava_o_buffer(escritor, log):
+    escritor.atualizar_log(log, 'falha', erro_detalhes='Sem conexão', tentativas=3)
+
+    assert escritor.pendentes() == 1
+    assert escritor.descarregar() == 1
+    assert escritor.descarregar() == 0
+    assert status(log) == 'falha'
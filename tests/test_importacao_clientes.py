@@ -0,0 +1,92 @@
+"""
+Importação de clientes em lote: formato legado de data/clientes.json, CSV
+com ';' e vírgula decimal, upsert pelo telefone normalizado e linhas
+repetidas no mesmo arquivo
+"""
+import json
+import os
+from datetime import date
+from src.models.cliente import Cliente
+from src.services import importacao_clientes
+from tests.conftest import criar_cliente
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def linha(**campos):
+    dados = {
+        'nome_completo': 'Cliente Importado',
+        'telefone': '(11) 98765-4321',
+        'tipo_produto': 'iptv',
+        'plano_contratado': 'Mensal',
+        'valor_plano': 30,
+        'data_vencimento': '2030-01-10',
+        'horario_envio': '09:00'
+    }
+    dados.update(campos)
+    return dados
+
+
+def test_arquivo_legado_pela_api(client):
+    with open(os.path.join(RAIZ, 'data', 'clientes.json'), encoding='utf-8') as arquivo:
+        legado = json.load(arquivo)
+
+    response = client.post('/api/clientes/bulk', json=legado)
+
+    resultado = response.get_json()
+    assert response.status_code == 200
+    assert (resultado['criados'], resultado['atualizados'], resultado['erros']) == (6, 0, [])
+
+    maria = Cliente.query.filter_by(telefone_normalizado='5511888776655').one()
+    assert (maria.nome_completo, maria.plano_contratado, maria.valor_plano) == ('Maria Santos', 'Básico', 25.0)
+    assert maria.aviso_ativo and maria.dias_aviso_antecedencia == 3
+    assert maria.horario_aviso.strftime('%H:%M') == '15:00'
+    pedro = Cliente.query.filter_by(telefone_normalizado='5511777665544').one()
+    assert pedro.aviso_ativo is False
+
+
+def test_csv_com_ponto_e_virgula_e_virgula_decimal(app):
+    texto = (
+        'nome_completo;telefone;tipo_produto;plano_contratado;valor_plano;data_vencimento;horario_envio;ativo\n'
+        'Ana;(21) 3456-7890;vpn;Anual;299,90;2030-03-01;08:30;sim\n'
+        'Bruno;11 91234-5678;OUTROS;Mensal;19,5;2030-03-02;18:00;não\n'
+    )
+
+    resultado = importacao_clientes.importar(importacao_clientes.ler_csv(texto))
+
+    assert (resultado['criados'], resultado['erros']) == (2, [])
+    ana = Cliente.query.filter_by(telefone_normalizado='552134567890').one()
+    assert (ana.tipo_produto, ana.valor_plano, ana.data_vencimento) == ('VPN', 299.90, date(2030, 3, 1))
+    assert Cliente.query.filter_by(telefone_normalizado='5511912345678').one().ativo is False
+
+
+def test_upsert_pelo_telefone_em_outro_formato(app):
+    existente = criar_cliente(telefone='11987654321', telefone_normalizado='5511987654321',
+                              comentarios='Antes')
+
+    resultado = importacao_clientes.importar([
+        linha(telefone='+55 (11) 98765-4321', plano_contratado='Trimestral', valor_plano='80,00')
+    ])
+
+    assert (resultado['criados'], resultado['atualizados']) == (0, 1)
+    assert resultado['ids'] == [existente.id]
+    cliente = Cliente.query.filter_by(telefone_normalizado='5511987654321').one()
+    assert (cliente.plano_contratado, cliente.valor_plano) == ('Trimestral', 80.0)
+    # Campos opcionais ausentes na linha não são apagados
+    assert cliente.comentarios == 'Antes'
+
+
+def test_linhas_repetidas_no_mesmo_arquivo(app):
+    resultado = importacao_clientes.importar([
+        linha(nome_completo='Primeira'),
+        linha(nome_completo='Outra', telefone='11 97777-0000'),
+        linha(nome_completo='Repetida', telefone='5511987654321'),
+        linha(nome_completo='Sem telefone', telefone='123'),
+    ])
+
+    assert resultado['criados'] == 2
+    assert resultado['erros'] == [
+        {'linha': 3, 'telefone': '5511987654321', 'erro': 'Telefone repetido na importação (linha 1)'},
+        {'linha': 4, 'telefone': '123', 'erro': 'Telefone inválido'},
+    ]
+    assert Cliente.query.filter_by(telefone_normalizado='5511987654321').one().nome_completo == 'Primeira'
@@ -0,0 +1,67 @@
+"""
+Planos das consultas frequentes (EXPLAIN QUERY PLAN): nenhuma varre uma
+tabela inteira e as mais quentes usam o índice feito para elas, com o banco
+vazio e com estatísticas (ANALYZE) de um banco povoado
+"""
+from datetime import date, datetime, timedelta
+from datetime import time as hora
+import pytest
+from sqlalchemy import insert
+from src.models.user import db
+from src.models.cliente import Cliente
+from src.models.log_mensagem import LogMensagem
+from src.models.renovacao import Renovacao
+from src.database.migracoes import verificar_planos
+
+# Consulta -> índice que ela deve usar
+INDICES_ESPERADOS = {
+    'avisos pendentes': 'ix_clientes_ativo_vencimento',
+    'listagem de clientes por cursor': 'ix_clientes_vencimento',
+    'cliente por telefone': 'ix_clientes_telefone_normalizado',
+    'listagem de clientes por produto': 'ix_clientes_ativo_produto_vencimento',
+    'logs do cliente': 'ix_logs_mensagem_cliente_criacao',
+    'listagem de logs': 'ix_logs_mensagem_criacao',
+}
+
+
+def povoar(clientes=1000):
+    hoje = date.today()
+    db.session.execute(insert(Cliente), [
+        {'nome_completo': f'Cliente {indice}', 'telefone': f'119{indice:08d}',
+         'telefone_normalizado': f'55119{indice:08d}', 'tipo_produto': ('IPTV', 'VPN', 'OUTROS')[indice % 3],
+         'plano_contratado': 'Mensal', 'valor_plano': 30.0,
+         'data_vencimento': hoje + timedelta(days=indice % 120 - 30), 'horario_envio': hora(9, 0),
+         'aviso_ativo': True, 'dias_aviso_antecedencia': 1 + indice % 7, 'ativo': indice % 10 != 0}
+        for indice in range(clientes)
+    ])
+    db.session.execute(insert(Renovacao), [
+        {'cliente_id': 1 + indice % clientes, 'data_renovacao': hoje - timedelta(days=indice % 365),
+         'data_vencimento_anterior': hoje, 'data_vencimento_nova': hoje, 'dias_renovados': 30, 'valor_pago': 30.0}
+        for indice in range(clientes)
+    ])
+    db.session.execute(insert(LogMensagem), [
+        {'cliente_id': 1 + indice % clientes, 'telefone_destino': '5511900000000', 'mensagem': 'Aviso',
+         'status': ('enviada', 'falha')[indice % 2], 'tipo_notificacao': 'automatica', 'tentativas': 1,
+         'data_criacao': datetime.utcnow() - timedelta(minutes=indice)}
+        for indice in range(clientes * 2)
+    ])
+    db.session.commit()
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+
+@pytest.fixture(params=['vazio', 'com estatisticas'])
+def planos(app, request):
+    if request.param == 'com estatisticas':
+        povoar()
+    return {nome: (plano, varreduras) for nome, plano, varreduras in verificar_planos()}
+
+
+def test_nenhuma_consulta_frequente_varre_a_tabela(planos):
+    assert {nome: varreduras for nome, (_, varreduras) in planos.items() if varreduras} == {}
+
+
+@pytest.mark.parametrize('consulta, indice', INDICES_ESPERADOS.items())
+def test_consultas_quentes_usam_o_indice(planos, consulta, indice):
+    plano, _ = planos[consulta]
+    assert any(f'INDEX {indice} ' in detalhe or detalhe.endswith(f'INDEX {indice}') for detalhe in plano), plano
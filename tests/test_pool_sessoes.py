@@ -0,0 +1,151 @@
+"""
+Pool de sessões: a mensagem só passa para outra sessão quando a primeira
+certamente não a enviou; envio incerto fica como falha, sem reenvio; sessões
+removidas do pool têm o processo da ponte encerrado
+"""
+import socket
+import subprocess
+import sys
+import pytest
+from src.models.configuracao import Configuracao
+from src.services import fila_envio
+from src.services.cliente_ponte import ClientePonteWhatsApp
+from src.services.pool_sessoes import PoolSessoes
+from src.services.whatsapp_service import WhatsAppService
+from tests.conftest import PonteFalsa
+
+NUMERO = '5511987654321'
+
+
+def porta_livre():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def servico(app, monkeypatch):
+    # Os erros vão para logs/whatsapp.log, fora do diretório do teste
+    monkeypatch.setattr(WhatsAppService, '_log_erro', lambda self, mensagem: None)
+    servico = WhatsAppService()
+    servico.init_app(app)
+    servico.pool.configurar(2)
+    yield servico
+    for sessao in servico.pool.sessoes:
+        sessao.fechar()
+
+
+@pytest.fixture
+def pontes(servico):
+    """Uma ponte falsa por sessão; a primeira é a dona do número no anel"""
+    falsas = [PonteFalsa(), PonteFalsa()]
+    preferida = servico.pool.sessao_preferida(NUMERO + '@c.us')
+    outra = next(sessao for sessao in servico.pool.sessoes if sessao is not preferida)
+    for sessao, ponte in zip([preferida, outra], falsas):
+        sessao.ponte = ClientePonteWhatsApp(ponte.url, tempo_leitura_envio=0.3, tentativas=0, jitter=0)
+        sessao.conectado = True
+    yield preferida, outra, falsas
+    for ponte in falsas:
+        ponte.fechar()
+
+
+def test_ponte_fora_do_ar_passa_para_a_proxima_sessao(servico, pontes):
+    preferida, outra, (_, ponte_outra) = pontes
+    preferida.ponte = ClientePonteWhatsApp(f'http://127.0.0.1:{porta_livre()}', tentativas=0, jitter=0)
+
+    assert servico._enviar_para_ponte(NUMERO, 'Olá') == (True, None, False)
+    assert ponte_outra.contar('/send-message') == 1
+    assert not preferida.saudavel
+    assert (preferida.falhas, outra.enviadas, outra.redirecionadas) == (1, 1, 1)
+
+
+def test_whatsapp_desconectado_passa_para_a_proxima_sessao(servico, pontes):
+    # A ponte recusa o pedido (400) e o status confirma a desconexão
+    preferida, outra, (ponte_preferida, ponte_outra) = pontes
+    ponte_preferida.programar('/send-message', (400, 0))
+    ponte_preferida.programar('/status', (503, 0))
+
+    assert servico._enviar_para_ponte(NUMERO, 'Olá') == (True, None, False)
+    assert ponte_outra.contar('/send-message') == 1
+    assert not preferida.saudavel
+
+
+@pytest.mark.parametrize('resposta', [(200, 1), (500, 0)], ids=['timeout de leitura', 'erro 5xx'])
+def test_envio_incerto_nao_e_reenviado(servico, pontes, resposta):
+    preferida, outra, (ponte_preferida, ponte_outra) = pontes
+    ponte_preferida.programar('/send-message', resposta)
+
+    sucesso, erro, incerto = servico._enviar_para_ponte(NUMERO, 'Olá')
+
+    assert (sucesso, incerto) == (False, True)
+    assert 'Envio incerto' in erro
+    assert ponte_preferida.contar('/send-message') == 1
+    assert ponte_outra.contar('/send-message') == 0
+    # A falha fica na sessão, que continua no anel
+    assert preferida.saudavel
+    assert (preferida.falhas, outra.enviadas) == (1, 0)
+
+
+def test_falha_incerta_da_fila_nao_volta_para_nova_tentativa(servico, pontes, monkeypatch):
+    preferida, _, (ponte_preferida, _) = pontes
+    ponte_preferida.programar('/send-message', (500, 0), (400, 0))
+    falhas = []
+    monkeypatch.setattr(fila_envio, 'registrar_falha',
+                        lambda item, erro, max_tentativas=3: falhas.append((item, max_tentativas)))
+    monkeypatch.setattr(fila_envio, 'concluir', lambda item: None)
+
+    class Item:
+        telefone_destino = NUMERO
+        mensagem = 'Olá'
+
+    # Taxa alta: a falha zera os tokens do limitador e o segundo envio não
+    # deve esperar um minuto
+    for chave in ('whatsapp_taxa_mensagens_minuto', 'whatsapp_taxa_minima', 'whatsapp_taxa_maxima'):
+        Configuracao.set_configuracao(chave, 6000, tipo='integer', categoria='whatsapp')
+    incerto, recusado = Item(), Item()
+    servico.executando = True
+    servico._enviar_lote([incerto, recusado])
+
+    # Erro 5xx: sai da fila como falha; 400 com a ponte conectada: segue o
+    # número normal de tentativas
+    assert falhas == [(incerto, 0), (recusado, 3)]
+
+
+def processo_node_falso(ignorar_sigterm=False):
+    codigo = 'import time\n'
+    if ignorar_sigterm:
+        codigo += 'import signal; signal.signal(signal.SIGTERM, signal.SIG_IGN); print("pronto", flush=True)\n'
+    codigo += 'time.sleep(60)\n'
+    return subprocess.Popen([sys.executable, '-c', codigo], stdout=subprocess.PIPE)
+
+
+def test_sessoes_removidas_tem_o_processo_encerrado():
+    pool = PoolSessoes()
+    pool.configurar(3)
+    processos = [processo_node_falso() for _ in pool.sessoes]
+    for sessao, processo in zip(pool.sessoes, processos):
+        sessao.processo = processo
+
+    pool.configurar(1)
+
+    assert pool.sessoes[0].processo is processos[0]
+    assert processos[0].poll() is None
+    assert processos[1].poll() is not None and processos[2].poll() is not None
+    pool.sessoes[0].parar()
+    assert processos[0].poll() is not None
+
+
+def test_processo_que_ignora_sigterm_e_morto():
+    sessao = PoolSessoes().configurar(1)[0]
+    sessao.processo = processo_node_falso(ignorar_sigterm=True)
+    sessao.processo.stdout.readline()
+
+    sessao.parar(tempo_limite=0.2)
+
+    assert sessao.processo is None
+    assert not sessao.conectado
+
+
+def test_inicializar_configuracoes_cria_whatsapp_sessoes(client):
+    assert client.post('/api/configuracoes/inicializar').status_code == 200
+    assert Configuracao.get_configuracao('whatsapp_sessoes') == 1
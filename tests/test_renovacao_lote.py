@@ -0,0 +1,118 @@
+"""
+Renovação em lote: o mesmo resultado de POST /clientes/<id>/renovar para
+clientes vencidos, em dia e vencendo hoje, inclusive nos resumos diários
+"""
+from datetime import date, timedelta
+import pytest
+from src.models.user import db
+from src.models.cliente import Cliente
+from src.models.renovacao import Renovacao
+from src.models.resumo_diario import ResumoRenovacaoDiario
+from tests.conftest import criar_cliente
+
+HOJE = date.today()
+
+# (deslocamento do vencimento em dias, produto, valor do plano, ativo, dias renovados, valor pago)
+CASOS = [
+    (-40, 'IPTV', 30.0, False, 30, None),
+    (-1, 'IPTV', 30.0, True, 90, 80.0),
+    (0, 'VPN', 15.0, True, 30, None),
+    (5, 'VPN', 15.0, True, 365, 150.0),
+    (200, 'IPTV', 35.0, True, 180, None),
+]
+
+
+def criar_clientes(prefixo):
+    clientes = []
+    for indice, (deslocamento, produto, valor_plano, ativo, _, _) in enumerate(CASOS):
+        clientes.append(criar_cliente(
+            nome_completo=f'{prefixo} {indice}', telefone=f'1191111{indice:04d}',
+            data_vencimento=HOJE + timedelta(days=deslocamento), tipo_produto=produto,
+            valor_plano=valor_plano, ativo=ativo
+        ).id)
+    return clientes
+
+
+def item(cliente_id, dias, valor_pago):
+    dados = {'cliente_id': cliente_id, 'dias_renovacao': dias, 'observacoes': 'Pix'}
+    if valor_pago is not None:
+        dados['valor_pago'] = valor_pago
+    return dados
+
+
+def resultado(cliente_ids):
+    """Estado de cada cliente e da sua renovação, sem ids nem instantes"""
+    db.session.expire_all()
+    linhas = []
+    for cliente_id in cliente_ids:
+        cliente = db.session.get(Cliente, cliente_id)
+        renovacao = Renovacao.query.filter_by(cliente_id=cliente_id).one()
+        linhas.append((
+            cliente.data_vencimento, cliente.ativo,
+            renovacao.data_renovacao, renovacao.data_vencimento_anterior, renovacao.data_vencimento_nova,
+            renovacao.dias_renovados, renovacao.valor_pago, renovacao.observacoes
+        ))
+    return linhas
+
+
+def resumo():
+    db.session.expire_all()
+    return sorted(
+        (linha.dia, linha.tipo_produto, linha.dias_renovados, linha.quantidade, linha.receita)
+        for linha in ResumoRenovacaoDiario.query
+    )
+
+
+def test_lote_igual_a_renovacao_individual(client):
+    individuais = criar_clientes('Individual')
+    em_lote = criar_clientes('Lote')
+    assert resumo() == []
+
+    for cliente_id, (_, _, _, _, dias, valor_pago) in zip(individuais, CASOS):
+        response = client.post(f'/api/clientes/{cliente_id}/renovar', json=item(cliente_id, dias, valor_pago))
+        assert response.status_code == 200
+    resumo_individual = resumo()
+
+    db.session.query(ResumoRenovacaoDiario).delete()
+    db.session.commit()
+    response = client.post('/api/clientes/renovar-lote', json=[
+        item(cliente_id, dias, valor_pago) for cliente_id, (_, _, _, _, dias, valor_pago) in zip(em_lote, CASOS)
+    ])
+    assert response.status_code == 200
+    assert response.get_json()['total'] == len(CASOS)
+
+    assert resultado(em_lote) == resultado(individuais)
+    assert resumo() == resumo_individual
+
+
+def test_vencimentos_renovados(client):
+    cliente_ids = criar_clientes('Lote')
+    client.post('/api/clientes/renovar-lote', json=[
+        item(cliente_id, dias, valor_pago) for cliente_id, (_, _, _, _, dias, valor_pago) in zip(cliente_ids, CASOS)
+    ])
+
+    esperado = [
+        (max(HOJE, HOJE + timedelta(days=deslocamento)) + timedelta(days=dias), True)
+        for deslocamento, _, _, _, dias, _ in CASOS
+    ]
+    assert [linha[:2] for linha in resultado(cliente_ids)] == esperado
+    # Receita: o valor pago ou, sem ele, o valor do plano
+    assert resumo() == sorted([
+        (HOJE, 'IPTV', 30, 1, 30.0), (HOJE, 'IPTV', 90, 1, 80.0), (HOJE, 'IPTV', 180, 1, 35.0),
+        (HOJE, 'VPN', 30, 1, 15.0), (HOJE, 'VPN', 365, 1, 150.0),
+    ])
+
+
+@pytest.mark.parametrize('itens', [
+    [{'cliente_id': 1, 'dias_renovacao': 45}],
+    [{'cliente_id': 1, 'dias_renovacao': 30}, {'cliente_id': 999, 'dias_renovacao': 30}],
+])
+def test_lote_invalido_nao_grava_nada(client, itens):
+    criar_clientes('Lote')
+
+    response = client.post('/api/clientes/renovar-lote', json=itens)
+
+    assert response.status_code == 400
+    assert Renovacao.query.count() == 0
+    assert resumo() == []
+    assert db.session.get(Cliente, 1).data_vencimento == HOJE + timedelta(days=CASOS[0][0])
@@ -0,0 +1,76 @@
+"""
+Taxa de envio configurada: whatsapp_intervalo_mensagens e
+whatsapp_taxa_mensagens_minuto são o mesmo ritmo e vale o alterado por último
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from src.models.user import db
+from src.models.configuracao import Configuracao
+from src.services.limitador_taxa import LimitadorTaxa
+from src.services.whatsapp_service import WhatsAppService
+
+
+def definir(chave, valor, alterada_em):
+    Configuracao.set_configuracao(chave, valor, tipo='integer', categoria='whatsapp')
+    config = Configuracao.query.filter_by(chave=chave).first()
+    config.data_atualizacao = alterada_em
+    Configuracao.invalidar_cache()
+    db.session.commit()
+
+
+def test_vale_a_configuracao_alterada_por_ultimo(app):
+    servico = WhatsAppService()
+    agora = datetime.utcnow()
+
+    definir('whatsapp_intervalo_mensagens', 5, agora - timedelta(minutes=1))
+    definir('whatsapp_taxa_mensagens_minuto', 20, agora)
+    assert servico.taxa_configurada() == 20
+
+    # Mudar o intervalo na tela do WhatsApp passa a valer
+    definir('whatsapp_intervalo_mensagens', 10, agora + timedelta(minutes=1))
+    assert servico.taxa_configurada() == 6
+
+
+def test_intervalo_sem_taxa_configurada(app):
+    definir('whatsapp_intervalo_mensagens', 15, datetime.utcnow())
+    assert WhatsAppService().taxa_configurada() == 4
+
+
+def test_taxa_lida_do_cache(app):
+    agora = datetime.utcnow()
+    definir('whatsapp_intervalo_mensagens', 5, agora - timedelta(minutes=1))
+    definir('whatsapp_taxa_mensagens_minuto', 20, agora)
+    servico = WhatsAppService()
+    assert servico.taxa_configurada() == 20
+
+    consultas = []
+
+    def registrar(conexao, cursor, instrucao, *args):
+        consultas.append(instrucao)
+
+    event.listen(db.engine, 'before_cursor_execute', registrar)
+    try:
+        for _ in range(10):
+            assert servico.taxa_configurada() == 20
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', registrar)
+    assert not any('configuracoes' in consulta for consulta in consultas)
+
+
+def test_intervalo_longo_baixa_o_piso_do_limitador(app):
+    definir('whatsapp_intervalo_mensagens', 60, datetime.utcnow())
+    servico = WhatsAppService()
+
+    limitador = servico._criar_limitador()
+    assert limitador.estado()['taxa_por_minuto'] == 1
+
+
+def test_nova_taxa_descarta_a_aprendida():
+    limitador = LimitadorTaxa(taxa_por_minuto=12, taxa_maxima=30)
+    limitador.taxa_atual = 25
+
+    limitador.configurar(taxa_maxima=30)
+    assert limitador.taxa_atual == 25
+
+    limitador.configurar(taxa_maxima=30, taxa_por_minuto=6)
+    assert limitador.taxa_atual == 6
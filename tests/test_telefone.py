@@ -0,0 +1,139 @@
+"""
+Normalização de telefones: 55 + DDD + número para números nacionais, os
+dígitos como estão para os que já trazem o código do país e None só para o
+que não tem como ser enviado
+"""
+import json
+import os
+from datetime import date, timedelta
+import pytest
+from src.models.user import db
+from src.models.cliente import Cliente
+from src.models.configuracao import Configuracao
+from src.models.template_mensagem import TemplateMensagem
+from src.database import migracoes
+from src.services import fila_envio, telefone
+from src.services.agendador_envio import DIAS_SEMANA
+from src.services.whatsapp_service import WhatsAppService
+from tests.conftest import criar_cliente
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('numero, esperado', [
+    # Fixo com e sem código do país: mesma chave
+    ('(21) 3456-7890', '552134567890'),
+    ('+55 21 3456-7890', '552134567890'),
+    ('0 21 3456-7890', '552134567890'),
+    # 10 dígitos são DDD + número; o DDD não é trocado por 11
+    ('1187654321', '551187654321'),
+    ('(11) 98765-4321', '5511987654321'),
+    ('+55 11 98765 4321', '5511987654321'),
+    ('0055 11 98765 4321', '5511987654321'),
+    # DDD 55 (RS) sem código do país
+    ('55987654321', '5555987654321'),
+    # Sem validação do plano de numeração: celular antigo, sem o 9
+    ('11 8877-6655', '551188776655'),
+    ('5511888776655', '5511888776655'),
+    # Sem '+', 11 dígitos são sempre DDD + número
+    ('14155551234', '5514155551234'),
+    # Outros países, curtos, longos e vazios
+    ('+1 415 555 1234', None),
+    ('001 415 555 1234', None),
+    ('12345', None),
+    ('(01) 3456-7890', None),
+    ('5511987654321000', None),
+    ('', None),
+    (None, None),
+])
+def test_normalizar(numero, esperado):
+    assert telefone.normalizar(numero) == esperado
+
+
+@pytest.mark.parametrize('numero', ['(21) 3456-7890', '1187654321', '+55 11 98765 4321', '55987654321'])
+def test_normalizar_e_idempotente(numero):
+    normalizado = telefone.normalizar(numero)
+    assert telefone.normalizar(normalizado) == normalizado
+
+
+def test_clientes_do_arquivo_legado_continuam_com_jid():
+    with open(os.path.join(RAIZ, 'data', 'clientes.json'), encoding='utf-8') as arquivo:
+        clientes = json.load(arquivo)['clientes']
+
+    for cliente in clientes:
+        # O mesmo identificador que o envio antigo usava
+        assert telefone.jid(cliente['telefone']) == cliente['telefone'] + '@c.us'
+
+
+def test_jid():
+    assert telefone.jid('(11) 98765-4321') == '5511987654321@c.us'
+    assert telefone.jid('+1 415 555 1234') is None
+    assert telefone.jid('') is None
+
+
+def test_filtro_por_telefone(client):
+    fixo = criar_cliente(telefone='(21) 3456-7890', telefone_normalizado='552134567890')
+    criar_cliente(telefone='sem número', telefone_normalizado=None)
+
+    response = client.get('/api/clientes', query_string={'telefone': '+55 21 3456-7890'})
+    assert [item['id'] for item in response.get_json()['clientes']] == [fixo.id]
+
+    # Telefone inválido não vira filtro por telefone_normalizado IS NULL
+    response = client.get('/api/clientes', query_string={'telefone': '12345'})
+    assert response.status_code == 400
+
+
+def test_migracao_recalcula_telefones(app):
+    # Valores gravados pela normalização antiga
+    fixo = criar_cliente(telefone='(21) 3456-7890', telefone_normalizado='55112134567890')
+    exterior = criar_cliente(telefone='+1 415 555 1234', telefone_normalizado='5514155551234')
+    celular = criar_cliente(telefone='11987654321', telefone_normalizado='5511987654321')
+    legado = criar_cliente(telefone='5511888776655', telefone_normalizado='5511888776655')
+    fila_envio.enfileirar_lote([{
+        'cliente_id': fixo.id, 'telefone_destino': '55112134567890', 'mensagem': 'Olá'
+    }])
+    db.session.commit()
+    db.session.execute(db.text('DELETE FROM schema_migracoes WHERE versao = 7'))
+    db.session.commit()
+
+    assert [versao for versao, _ in migracoes.aplicar_migracoes()] == [7]
+
+    db.session.expire_all()
+    assert db.session.get(Cliente, fixo.id).telefone_normalizado == '552134567890'
+    assert db.session.get(Cliente, exterior.id).telefone_normalizado is None
+    assert db.session.get(Cliente, celular.id).telefone_normalizado == '5511987654321'
+    assert db.session.get(Cliente, legado.id).telefone_normalizado == '5511888776655'
+    assert fila_envio.numeros_na_fila() == {'552134567890'}
+
+
+def test_aviso_de_telefone_invalido_nao_e_enfileirado(app, monkeypatch):
+    # O aviso descartado é registrado em logs/whatsapp.log, fora do diretório do teste
+    monkeypatch.setattr(WhatsAppService, '_log_erro', lambda self, mensagem: None)
+    Configuracao.set_configuracao('whatsapp_horario_inicio', '00:00')
+    Configuracao.set_configuracao('whatsapp_horario_fim', '23:59')
+    Configuracao.set_configuracao('whatsapp_dias_funcionamento', DIAS_SEMANA, tipo='json')
+    db.session.add(TemplateMensagem(
+        nome='Vencimento IPTV', tipo_produto='IPTV', tipo_template='vencimento',
+        conteudo='Olá {nome}, seu plano vence em {dias} dias.', padrao=True, ativo=True
+    ))
+    db.session.commit()
+    vencimento = date.today() + timedelta(days=3)
+    valido = criar_cliente(data_vencimento=vencimento, telefone_normalizado='5511987654321')
+    invalido = criar_cliente(data_vencimento=vencimento, telefone='+1 415 555 1234')
+
+    servico = WhatsAppService()
+    servico.init_app(app)
+    servico.conectado = True
+
+    # Os dois ficam resolvidos para hoje, mas só o válido vai para a fila
+    assert sorted(servico.processar_avisos_automaticos()) == sorted([valido.id, invalido.id])
+    assert fila_envio.clientes_na_fila() == {valido.id}
+
+
+def test_envio_para_telefone_invalido_nao_chega_a_ponte(app):
+    servico = WhatsAppService()
+    servico.init_app(app)
+
+    assert servico._enviar_para_ponte('+1 415 555 1234', 'Olá') == (False, 'Telefone inválido: +1 415 555 1234', False)
+    sessao = servico.pool.sessoes[0]
+    assert (sessao.enviadas, sessao.falhas) == (0, 0)